@@ -65,6 +65,9 @@ class DepartmentAdmin(admin.ModelAdmin):
         (None, {
             'fields': ('name', 'description')
         }),
+        ('Alertes', {
+            'fields': ('late_rate_alert', 'absence_alert')
+        }),
     )
 
 @admin.register(Schedule)
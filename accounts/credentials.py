@@ -0,0 +1,104 @@
+# accounts/credentials.py
+"""
+Index des identifiants de pointage (nfc_id, face_id, pk employé) partagé
+entre workers via Redis :
+
+    credential:<kind>:<valeur>  -> {'employee_id', 'name', 'status'}
+    credential:employee:<pk>    -> clés d'index de l'employé
+
+L'index est construit une fois depuis la base puis tenu à jour par les
+signaux de Employee et User ; une résolution ne touche pas MySQL.
+"""
+from django.core.cache import cache
+
+from accounts.models import Employee
+from core import metrics
+
+KINDS = ('pk', 'nfc', 'face')
+LOADED_KEY = 'credential:loaded'
+REBUILD_CHUNK_SIZE = 2000
+
+metrics.register('credential.hit', 'credential.miss', 'credential.rebuild')
+
+
+def _key(kind, value):
+    return f'credential:{kind}:{value}'
+
+
+def _employee_key(employee_id):
+    return f'credential:employee:{employee_id}'
+
+
+def _entries(employee_id, nfc_id, face_id, name, status):
+    entry = {'employee_id': employee_id, 'name': name, 'status': status}
+    entries = {_key('pk', employee_id): entry}
+    if nfc_id:
+        entries[_key('nfc', nfc_id)] = entry
+    if face_id:
+        entries[_key('face', face_id)] = entry
+    return entries
+
+
+def rebuild():
+    """Reconstruit l'index complet depuis la base"""
+    batch = {}
+    for pk, nfc_id, face_id, status, first_name, last_name in Employee.objects.values_list(
+        'pk', 'nfc_id', 'face_id', 'status', 'user__first_name', 'user__last_name'
+    ).iterator(chunk_size=REBUILD_CHUNK_SIZE):
+        entries = _entries(pk, nfc_id, face_id, f'{first_name} {last_name}'.strip(), status)
+        batch.update(entries)
+        batch[_employee_key(pk)] = list(entries)
+        if len(batch) >= REBUILD_CHUNK_SIZE:
+            cache.set_many(batch, timeout=None)
+            batch = {}
+    if batch:
+        cache.set_many(batch, timeout=None)
+
+    cache.set(LOADED_KEY, True, timeout=None)
+    metrics.incr('credential.rebuild')
+
+
+def resolve(kind, value):
+    """Retourne {'employee_id', 'name', 'status'} pour un identifiant, ou None"""
+    if kind not in KINDS or value in (None, ''):
+        return None
+
+    key = _key(kind, value)
+    found = cache.get_many([key, LOADED_KEY])
+    if LOADED_KEY not in found:
+        rebuild()
+        found = {key: cache.get(key)}
+
+    entry = found.get(key)
+    metrics.incr('credential.hit' if entry else 'credential.miss')
+    return entry
+
+
+def lookup(employee_ids):
+    """Entrées de plusieurs employés par pk, en une lecture : {pk: entrée}"""
+    keys = {_key('pk', employee_id): employee_id for employee_id in employee_ids}
+    found = cache.get_many([*keys, LOADED_KEY])
+    if LOADED_KEY not in found:
+        rebuild()
+        found = cache.get_many(list(keys))
+    return {keys[key]: entry for key, entry in found.items() if key in keys}
+
+
+def refresh_employee(employee):
+    """Remplace les entrées d'un employé (appelé par les signaux)"""
+    entries = _entries(
+        employee.pk,
+        employee.nfc_id,
+        employee.face_id,
+        employee.user.get_full_name(),
+        employee.status
+    )
+    stale = set(cache.get(_employee_key(employee.pk)) or []) - set(entries)
+    if stale:
+        cache.delete_many(stale)
+    cache.set_many({**entries, _employee_key(employee.pk): list(entries)}, timeout=None)
+
+
+def remove_employee(employee_id):
+    keys = cache.get(_employee_key(employee_id)) or [_key('pk', employee_id)]
+    cache.delete_many([*keys, _employee_key(employee_id)])
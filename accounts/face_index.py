@@ -0,0 +1,211 @@
+# accounts/face_index.py
+"""
+Index d'identification faciale 1:N.
+
+Les empreintes normalisées sont rangées dans une matrice contiguë
+(embeddings.npy, capacité x dimension) avec les ids employés associés
+(ids.npy, 0 = emplacement libre). Les deux fichiers sont mappés en mémoire
+en lecture seule par chaque worker gunicorn, qui partagent ainsi les mêmes
+pages. Un enrôlement écrit une ligne en place ; lorsque la capacité est
+atteinte les fichiers sont recréés deux fois plus grands puis remplacés
+atomiquement, et les lecteurs les rouvrent en détectant le nouvel inode.
+"""
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+INITIAL_CAPACITY = 1024
+SEARCH_BLOCK_ROWS = 8192
+
+
+class FaceIndex:
+    def __init__(self, directory, dim, dtype='float32'):
+        self.directory = Path(directory)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._matrix = None
+        self._ids = None
+        self._inode = None
+        self._lock = threading.Lock()
+
+    @property
+    def matrix_path(self):
+        return self.directory / 'embeddings.npy'
+
+    @property
+    def ids_path(self):
+        return self.directory / 'ids.npy'
+
+    def normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim or not np.all(np.isfinite(vector)):
+            raise ValueError(f'Embedding must contain {self.dim} finite values')
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            raise ValueError('Embedding must not be a zero vector')
+        return vector / norm
+
+    # Lecture
+
+    def _open(self):
+        """Retourne (matrice, ids) mappés, rouverts si les fichiers ont été remplacés"""
+        try:
+            inode = os.stat(self.ids_path).st_ino
+        except FileNotFoundError:
+            return None, None
+
+        if inode != self._inode:
+            with self._lock:
+                if inode != self._inode:
+                    self._ids = np.load(self.ids_path, mmap_mode='r')
+                    self._matrix = np.load(self.matrix_path, mmap_mode='r')
+                    self._inode = inode
+        return self._matrix, self._ids
+
+    def search(self, probes):
+        """
+        Recherche par lot : un produit matriciel (capacité x dim) . (dim x k).
+        Retourne (ids, scores) du meilleur candidat pour chaque sonde.
+        """
+        matrix, ids = self._open()
+        probes = np.stack([self.normalize(probe) for probe in probes])
+        if matrix is None:
+            return np.zeros(len(probes), dtype=np.int64), np.zeros(len(probes), dtype=np.float32)
+
+        size = min(len(ids), len(matrix))
+        if self.dtype == np.float32:
+            scores = np.dot(matrix[:size], probes.T)
+        else:
+            # float16 : pas de BLAS, conversion en float32 par blocs
+            scores = np.empty((size, len(probes)), dtype=np.float32)
+            for start in range(0, size, SEARCH_BLOCK_ROWS):
+                block = matrix[start:start + SEARCH_BLOCK_ROWS]
+                scores[start:start + len(block)] = np.dot(block.astype(np.float32), probes.T)
+        best = np.argmax(scores, axis=0)
+        return np.asarray(ids[best], dtype=np.int64), scores[best, np.arange(len(probes))]
+
+    def identify(self, probe, threshold):
+        """Retourne (employee_id, score) du meilleur candidat au-dessus du seuil, ou None"""
+        ids, scores = self.search([probe])
+        if ids[0] == 0 or scores[0] < threshold:
+            return None
+        return int(ids[0]), float(scores[0])
+
+    # Écriture (sérialisée entre processus par un verrou fichier)
+
+    @contextmanager
+    def _write_lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_files(self, matrix, ids):
+        """Écrit de nouveaux fichiers puis les substitue atomiquement (matrice d'abord)"""
+        for path, data in ((self.matrix_path, matrix), (self.ids_path, ids)):
+            tmp_path = path.with_suffix('.tmp.npy')
+            target = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=data.dtype, shape=data.shape)
+            target[:] = data
+            target.flush()
+            del target
+            os.replace(tmp_path, path)
+
+    def _load_for_write(self):
+        if not self.ids_path.exists():
+            self._write_files(
+                np.zeros((INITIAL_CAPACITY, self.dim), dtype=self.dtype),
+                np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+            )
+        return np.load(self.matrix_path, mmap_mode='r+'), np.load(self.ids_path, mmap_mode='r+')
+
+    def enroll(self, employee_id, vector):
+        vector = self.normalize(vector)
+        with self._write_lock():
+            matrix, ids = self._load_for_write()
+            rows = np.flatnonzero(ids == employee_id)
+            if rows.size:
+                row = rows[0]
+            else:
+                free = np.flatnonzero(ids == 0)
+                if not free.size:
+                    row = len(ids)
+                    capacity = len(ids) * 2
+                    grown_matrix = np.zeros((capacity, self.dim), dtype=self.dtype)
+                    grown_matrix[:row] = matrix
+                    grown_ids = np.zeros(capacity, dtype=np.int64)
+                    grown_ids[:row] = ids
+                    del matrix, ids
+                    self._write_files(grown_matrix, grown_ids)
+                    matrix, ids = self._load_for_write()
+                else:
+                    row = free[0]
+
+            # Le vecteur est écrit avant l'id : un lecteur ne voit jamais
+            # un id associé à une ligne incomplète lors d'un ajout.
+            matrix[row] = vector
+            matrix.flush()
+            ids[row] = employee_id
+            ids.flush()
+
+    def remove(self, employee_id):
+        if not self.ids_path.exists():
+            return
+        with self._write_lock():
+            matrix, ids = self._load_for_write()
+            rows = np.flatnonzero(ids == employee_id)
+            if rows.size:
+                ids[rows] = 0
+                ids.flush()
+                matrix[rows] = 0
+                matrix.flush()
+
+    def rebuild(self, items):
+        """Recrée l'index depuis une liste de (employee_id, vecteur)"""
+        items = list(items)
+        capacity = INITIAL_CAPACITY
+        while capacity < len(items):
+            capacity *= 2
+
+        matrix = np.zeros((capacity, self.dim), dtype=self.dtype)
+        ids = np.zeros(capacity, dtype=np.int64)
+        for row, (employee_id, vector) in enumerate(items):
+            matrix[row] = self.normalize(vector)
+            ids[row] = employee_id
+
+        with self._write_lock():
+            self._write_files(matrix, ids)
+
+
+_index = None
+
+
+def get_face_index():
+    global _index
+    directory = Path(settings.FACE_INDEX_DIR)
+    if _index is None or _index.directory != directory:
+        _index = FaceIndex(directory, settings.FACE_EMBEDDING_DIM, settings.FACE_INDEX_DTYPE)
+    return _index
+
+
+def rebuild_from_database():
+    """Recrée l'index à partir des FaceEmbedding enregistrés"""
+    from accounts.models import FaceEmbedding
+
+    items = FaceEmbedding.objects.values_list('employee_id', 'vector').iterator(chunk_size=2000)
+    get_face_index().rebuild((employee_id, from_bytes(vector)) for employee_id, vector in items)
+
+
+def to_bytes(vector):
+    return get_face_index().normalize(vector).tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(bytes(data), dtype=np.float32)
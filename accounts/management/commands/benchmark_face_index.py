@@ -0,0 +1,44 @@
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from accounts.face_index import FaceIndex
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence d'identification 1:N sur un index facial synthétique"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=50000)
+        parser.add_argument('--dim', type=int, default=128)
+        parser.add_argument('--dtype', default='float32', choices=['float32', 'float16'])
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        size, dim = options['size'], options['dim']
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((size, dim), dtype=np.float32)
+
+        with tempfile.TemporaryDirectory() as directory:
+            index = FaceIndex(directory, dim, options['dtype'])
+            started = time.perf_counter()
+            index.rebuild(zip(range(1, size + 1), vectors))
+            self.stdout.write(f'Index de {size} empreintes construit en {time.perf_counter() - started:.2f}s')
+
+            targets = rng.integers(0, size, options['queries'])
+            latencies, correct = [], 0
+            for target in targets:
+                probe = vectors[target] + rng.normal(0, 0.1, dim).astype(np.float32)
+                started = time.perf_counter()
+                match = index.identify(probe, threshold=0.5)
+                latencies.append((time.perf_counter() - started) * 1000)
+                correct += bool(match and match[0] == target + 1)
+
+        latencies = np.array(latencies)
+        self.stdout.write(self.style.SUCCESS(
+            f'p50={np.percentile(latencies, 50):.2f}ms '
+            f'p99={np.percentile(latencies, 99):.2f}ms '
+            f'précision={correct / len(targets):.1%}'
+        ))
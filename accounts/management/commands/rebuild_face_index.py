@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts import face_index
+from accounts.models import FaceEmbedding
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index facial mappé en mémoire depuis la base"
+
+    def handle(self, *args, **options):
+        face_index.rebuild_from_database()
+        self.stdout.write(self.style.SUCCESS(
+            f'{FaceEmbedding.objects.count()} empreintes indexées'
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_faceembedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('employee', 'Employee'), ('schedule', 'Schedule'), ('revoked', 'Revoked credential')], max_length=10)),
+                ('object_id', models.CharField(max_length=150)),
+                ('deleted', models.BooleanField(default=False)),
+                ('payload', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
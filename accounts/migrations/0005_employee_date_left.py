@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_syncchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='date_left',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:34
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_employee_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='absence_alert',
+            field=models.PositiveIntegerField(blank=True, help_text="Alerte au-delà de ce nombre d'absences", null=True),
+        ),
+        migrations.AddField(
+            model_name='department',
+            name='late_rate_alert',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Alerte au-delà de ce taux de retards (%)', null=True, validators=[django.core.validators.MaxValueValidator(100)]),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:12
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def backfill_versions(apps, schema_editor):
+    # Les changements existants gardent leur id comme version
+    SyncChange = apps.get_model('accounts', 'SyncChange')
+    SyncVersion = apps.get_model('accounts', 'SyncVersion')
+    SyncChange.objects.update(version=F('id'))
+    SyncVersion.objects.create(pk=1, value=SyncChange.objects.aggregate(value=Max('id'))['value'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_department_alert_thresholds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncchange',
+            name='version',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='SyncVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
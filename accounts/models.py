@@ -56,6 +56,15 @@ class Department(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Seuils d'alerte du tableau de bord (vides : ALERT_LATE_RATE / ALERT_ABSENCES)
+    late_rate_alert = models.PositiveSmallIntegerField(
+        null=True, blank=True, validators=[MaxValueValidator(100)],
+        help_text='Alerte au-delà de ce taux de retards (%)'
+    )
+    absence_alert = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Alerte au-delà de ce nombre d'absences"
+    )
     
     def __str__(self):
         return self.name
@@ -81,6 +90,8 @@ class Employee(models.Model):
     date_of_birth = models.DateField()
     date_joined = models.DateField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ACTIVE')
+    # Date de départ, renseignée au passage en INACTIVE
+    date_left = models.DateField(null=True, blank=True)
     
     # Authentication methods
     nfc_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
@@ -89,6 +100,13 @@ class Employee(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Pagination par curseur (core.pagination)
+            models.Index(fields=['created_at', 'id'], name='employee_created_id_idx'),
+            models.Index(fields=['date_joined', 'id'], name='employee_joined_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.employee_id} - {self.user.get_full_name()}"
 
@@ -109,4 +127,43 @@ class Schedule(models.Model):
     end_time = models.TimeField()
     
     class Meta:
-        unique_together = ['employee', 'day_of_week']
\ No newline at end of file
+        unique_together = ['employee', 'day_of_week']
+
+class FaceEmbedding(models.Model):
+    """Empreinte faciale (vecteur float32 normalisé) utilisée pour l'identification 1:N"""
+    employee = models.OneToOneField(
+        Employee,
+        on_delete=models.CASCADE,
+        related_name='face_embedding'
+    )
+    vector = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Face embedding - {self.employee_id}"
+
+class SyncChange(models.Model):
+    """
+    Journal des modifications synchronisées vers les terminaux.
+    version est attribuée après le commit (accounts.sync.assign_versions),
+    dans l'ordre des commits : une ligne sans version n'est pas encore lue.
+    """
+    KINDS = [
+        ('employee', 'Employee'),
+        ('schedule', 'Schedule'),
+        ('revoked', 'Revoked credential')
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.CharField(max_length=150)
+    deleted = models.BooleanField(default=False)
+    payload = models.JSONField(null=True, blank=True)
+    version = models.BigIntegerField(null=True, blank=True, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.version} - {self.kind}:{self.object_id}"
+
+class SyncVersion(models.Model):
+    """Compteur des versions de SyncChange (une seule ligne, verrouillée à l'attribution)"""
+    value = models.BigIntegerField(default=0)
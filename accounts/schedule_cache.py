@@ -0,0 +1,129 @@
+# accounts/schedule_cache.py
+"""
+Cache des plannings hebdomadaires par employé.
+
+Un planning est un tuple de 7 créneaux (lundi..dimanche), chacun None ou
+(start_time, end_time). Lecture : LRU local au processus, puis clé Redis
+versionnée, puis base de données. Les signaux de Schedule changent la
+version de l'employé, ce qui invalide toutes les copies.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from accounts.models import Schedule
+from core import metrics
+
+LOCAL_MAX_ENTRIES = 20000
+WEEK_TTL = 7 * 24 * 3600
+
+EMPTY_WEEK = (None,) * 7
+
+metrics.register(
+    'schedule_cache.local_hit',
+    'schedule_cache.redis_hit',
+    'schedule_cache.miss',
+    'schedule_cache.invalidation'
+)
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def _version_key(employee_id):
+    return f'schedule:version:{employee_id}'
+
+
+def _week_key(employee_id, version):
+    return f'schedule:week:{employee_id}:{version}'
+
+
+def _versions(employee_ids):
+    keys = {_version_key(pk): pk for pk in employee_ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+
+    # Version absente (jamais créée ou évincée) : en créer une nouvelle,
+    # ce qui garantit qu'aucune ancienne copie ne sera relue.
+    for pk in employee_ids:
+        if pk not in versions:
+            version = uuid.uuid4().hex
+            if not cache.add(_version_key(pk), version, timeout=None):
+                version = cache.get(_version_key(pk), version)
+            versions[pk] = version
+    return versions
+
+
+def _remember(employee_id, version, week):
+    with _lock:
+        _local[employee_id] = (version, week)
+        _local.move_to_end(employee_id)
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def get_weekly_schedules(employee_ids):
+    """Retourne {employee_id: planning de 7 créneaux} pour les employés demandés"""
+    employee_ids = set(employee_ids)
+    if not employee_ids:
+        return {}
+
+    versions = _versions(employee_ids)
+    weeks = {}
+    for pk, version in versions.items():
+        entry = _local.get(pk)
+        if entry and entry[0] == version:
+            weeks[pk] = entry[1]
+
+    local_hits = len(weeks)
+    missing = {pk: versions[pk] for pk in employee_ids if pk not in weeks}
+
+    if missing:
+        keys = {_week_key(pk, version): pk for pk, version in missing.items()}
+        for key, week in cache.get_many(keys).items():
+            pk = keys[key]
+            weeks[pk] = week
+            _remember(pk, missing.pop(pk), week)
+
+    redis_hits = len(weeks) - local_hits
+
+    if missing:
+        slots = {pk: [None] * 7 for pk in missing}
+        for pk, day, start_time, end_time in Schedule.objects.filter(
+            employee_id__in=missing
+        ).values_list('employee_id', 'day_of_week', 'start_time', 'end_time'):
+            slots[pk][day] = (start_time, end_time)
+
+        to_store = {}
+        for pk, version in missing.items():
+            week = tuple(slots[pk])
+            weeks[pk] = week
+            to_store[_week_key(pk, version)] = week
+            _remember(pk, version, week)
+        cache.set_many(to_store, timeout=WEEK_TTL)
+
+    if local_hits:
+        metrics.incr('schedule_cache.local_hit', local_hits)
+    if redis_hits:
+        metrics.incr('schedule_cache.redis_hit', redis_hits)
+    if missing:
+        metrics.incr('schedule_cache.miss', len(missing))
+    return weeks
+
+
+def get_weekly_schedule(employee_id):
+    return get_weekly_schedules([employee_id]).get(employee_id, EMPTY_WEEK)
+
+
+def get_day_slot(employee_id, day_of_week):
+    """Créneau (start_time, end_time) de l'employé pour un jour, ou None"""
+    return get_weekly_schedule(employee_id)[day_of_week]
+
+
+def invalidate(employee_id):
+    cache.set(_version_key(employee_id), uuid.uuid4().hex, timeout=None)
+    with _lock:
+        _local.pop(employee_id, None)
+    metrics.incr('schedule_cache.invalidation')
@@ -1,9 +1,10 @@
 # accounts/serializers.py
-from datetime import timezone
+from django.utils import timezone
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from accounts.models import Employee ,Department
 
+from attendance import department_stats
 from attendance.models import Attendance
 from leave.models import Leave,LeaveBalance
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
@@ -216,24 +217,23 @@ class DepartmentDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Department
-        fields = ('id', 'name', 'description', 'employee_count', 'attendance_rate', 'created_at')
+        fields = (
+            'id', 'name', 'description', 'employee_count', 'attendance_rate', 'created_at',
+            'late_rate_alert', 'absence_alert'
+        )
+
+    def _stats(self, obj):
+        # Fournisseur partagé par tous les départements sérialisés (une requête)
+        today = timezone.localdate()
+        return department_stats.from_context(self.context, today).get(obj.pk, today)
 
     def get_employee_count(self, obj):
-        return Employee.objects.filter(department=obj, status='ACTIVE').count()
+        return self._stats(obj)['total_employees']
 
     def get_attendance_rate(self, obj):
-        total_employees = self.get_employee_count(obj)
-        if total_employees == 0:
-            return 0
-        present_employees = Employee.objects.filter(
-            department=obj,
-            status='ACTIVE',
-            attendance__status__in=['PRESENT', 'LATE'],
-            attendance__date=timezone.now().date()
-        ).count()
-        return round((present_employees / total_employees) * 100, 1) if total_employees > 0 else 0
+        return self._stats(obj)['attendance_rate']
 
 class DepartmentCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Department
-        fields = ('id', 'name', 'description')
\ No newline at end of file
+        fields = ('id', 'name', 'description', 'late_rate_alert', 'absence_alert')
\ No newline at end of file
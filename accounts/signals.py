@@ -0,0 +1,105 @@
+# accounts/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts import credentials, face_index, schedule_cache, sync
+from accounts.models import Employee, FaceEmbedding, Schedule, User
+from attendance import report_cache
+
+
+@receiver([post_save, post_delete], sender=Schedule)
+def invalidate_schedule_cache(sender, instance, **kwargs):
+    schedule_cache.invalidate(instance.employee_id)
+
+
+@receiver(post_save, sender=Schedule)
+def record_schedule_change(sender, instance, **kwargs):
+    sync.record_schedule(instance)
+
+
+@receiver(post_delete, sender=Schedule)
+def record_schedule_deletion(sender, instance, **kwargs):
+    sync.record_schedule(instance, deleted=True)
+
+
+@receiver(pre_save, sender=Employee)
+def remember_employee(sender, instance, **kwargs):
+    # Valeurs avant modification : identifiants retirés pour les terminaux,
+    # effectif pour les agrégats de présence
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Employee.objects.filter(pk=instance.pk).values(
+            'nfc_id', 'face_id', 'status', 'department_id', 'date_joined', 'date_left'
+        ).first()
+
+    # Date de départ, pour la série d'effectif des rapports
+    if instance.status == 'INACTIVE' and not instance.date_left:
+        instance.date_left = timezone.localdate()
+    elif instance.status != 'INACTIVE':
+        instance.date_left = None
+
+
+@receiver(post_save, sender=Employee)
+def record_employee_change(sender, instance, **kwargs):
+    sync.record_employee(instance, getattr(instance, '_previous', None))
+
+
+@receiver(post_delete, sender=Employee)
+def record_employee_deletion(sender, instance, **kwargs):
+    sync.record_employee_deleted(instance)
+
+
+@receiver(post_save, sender=Employee)
+def refresh_employee_credentials(sender, instance, **kwargs):
+    credentials.refresh_employee(instance)
+
+
+@receiver(post_delete, sender=Employee)
+def remove_employee_credentials(sender, instance, **kwargs):
+    credentials.remove_employee(instance.pk)
+
+
+# Champs de l'utilisateur repris par les terminaux
+USER_SYNC_FIELDS = {'first_name', 'last_name', 'is_active'}
+
+
+@receiver(post_save, sender=User)
+def refresh_user_credentials(sender, instance, created, update_fields=None, **kwargs):
+    # Le nom affiché au pointage vient de l'utilisateur ; une connexion
+    # (last_login seul) ne change rien pour les terminaux
+    if update_fields is not None and not USER_SYNC_FIELDS & set(update_fields):
+        return
+    employee = getattr(instance, 'employee', None) if not created else None
+    if employee is not None:
+        credentials.refresh_employee(employee)
+        sync.record_employee(employee)
+
+
+# Champs de l'utilisateur affichés dans les rapports
+USER_REPORT_FIELDS = ('first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_user_name(sender, instance, update_fields=None, **kwargs):
+    instance._previous_name = None
+    if instance.pk and (update_fields is None or set(USER_REPORT_FIELDS) & set(update_fields)):
+        instance._previous_name = User.objects.filter(pk=instance.pk).values_list(*USER_REPORT_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_reports_on_rename(sender, instance, **kwargs):
+    # Les rapports en cache affichent l'ancien nom jusqu'au changement de version
+    previous = getattr(instance, '_previous_name', None)
+    if previous and previous != tuple(getattr(instance, field) for field in USER_REPORT_FIELDS):
+        report_cache.bump_all()
+
+
+@receiver(post_save, sender=FaceEmbedding)
+def enroll_face_embedding(sender, instance, **kwargs):
+    face_index.get_face_index().enroll(instance.employee_id, face_index.from_bytes(instance.vector))
+
+
+@receiver(post_delete, sender=FaceEmbedding)
+def remove_face_embedding(sender, instance, **kwargs):
+    face_index.get_face_index().remove(instance.employee_id)
@@ -0,0 +1,164 @@
+# accounts/sync.py
+"""
+Flux de synchronisation différentielle des terminaux.
+
+Chaque écriture sur Employee, Schedule ou un identifiant retiré ajoute une
+ligne SyncChange. Un terminal demande les changements depuis sa dernière
+version (?since=<version>) et tient ainsi en local les identifiants et
+plannings nécessaires à la validation d'un scan.
+
+La version n'est pas l'id : un id est réservé à l'insertion, et une
+transaction plus ancienne peut valider après une plus récente déjà lue par
+un terminal. Les versions sont attribuées après le commit, sous le verrou
+du compteur SyncVersion (assign_versions), et relues avant chaque lecture
+du flux : une ligne validée reçoit toujours une version supérieure à celles
+déjà servies.
+"""
+from django.db import transaction
+
+from accounts.models import Employee, Schedule, SyncChange, SyncVersion
+
+# Nombre maximal de changements renvoyés par page
+PAGE_SIZE = 5000
+CREDENTIAL_FIELDS = (('nfc', 'nfc_id'), ('face', 'face_id'))
+
+
+def employee_payload(employee):
+    return {
+        'id': employee.pk,
+        'employee_id': employee.employee_id,
+        'name': employee.user.get_full_name(),
+        'status': employee.status,
+        'nfc_id': employee.nfc_id,
+        'face_id': employee.face_id,
+    }
+
+
+def schedule_payload(schedule):
+    return {
+        'id': schedule.pk,
+        'employee_id': schedule.employee_id,
+        'day_of_week': schedule.day_of_week,
+        'start_time': schedule.start_time.isoformat(),
+        'end_time': schedule.end_time.isoformat(),
+    }
+
+
+def _revocations(values):
+    return [
+        SyncChange(kind='revoked', object_id=f'{kind}:{value}', payload={'kind': kind, 'value': value})
+        for kind, value in values if value
+    ]
+
+
+def record_employee(employee, previous=None):
+    """
+    Journalise un employé créé ou modifié. previous contient les anciens
+    identifiants (nfc_id, face_id) : ceux qui ont changé sont retirés.
+    """
+    changes = [SyncChange(kind='employee', object_id=str(employee.pk), payload=employee_payload(employee))]
+    if previous:
+        changes += _revocations(
+            (kind, previous[field]) for kind, field in CREDENTIAL_FIELDS
+            if previous[field] != getattr(employee, field)
+        )
+    _record(changes)
+
+
+def record_employee_deleted(employee):
+    changes = [SyncChange(kind='employee', object_id=str(employee.pk), deleted=True)]
+    changes += _revocations((kind, getattr(employee, field)) for kind, field in CREDENTIAL_FIELDS)
+    _record(changes)
+
+
+def record_schedule(schedule, deleted=False):
+    _record([SyncChange(
+        kind='schedule',
+        object_id=str(schedule.pk),
+        deleted=deleted,
+        payload=None if deleted else schedule_payload(schedule)
+    )])
+
+
+def _record(changes):
+    SyncChange.objects.bulk_create(changes)
+    transaction.on_commit(assign_versions)
+
+
+def assign_versions():
+    """
+    Numérote, dans l'ordre des id, les changements validés sans version.
+    Retourne le nombre de lignes numérotées.
+    """
+    if not SyncChange.objects.filter(version__isnull=True).exists():
+        return 0
+    with transaction.atomic():
+        counter, _ = SyncVersion.objects.select_for_update().get_or_create(pk=1)
+        pending = list(SyncChange.objects.filter(version__isnull=True).order_by('id').only('id'))
+        for change in pending:
+            counter.value += 1
+            change.version = counter.value
+        SyncChange.objects.bulk_update(pending, ['version'], batch_size=1000)
+        counter.save(update_fields=['value'])
+    return len(pending)
+
+
+def current_version():
+    return SyncChange.objects.filter(version__isnull=False).order_by('-version').values_list('version', flat=True).first() or 0
+
+
+def snapshot():
+    """
+    État complet pour un terminal sans version (since=0). La version est lue
+    avant l'état : un changement concurrent sera renvoyé au prochain appel,
+    les changements étant idempotents côté terminal.
+    """
+    assign_versions()
+    version = current_version()
+    employees = Employee.objects.select_related('user').only(
+        'employee_id', 'status', 'nfc_id', 'face_id', 'user__first_name', 'user__last_name'
+    )
+    return {
+        'version': version,
+        'full': True,
+        'has_more': False,
+        'employees': [employee_payload(employee) for employee in employees.iterator(chunk_size=2000)],
+        'schedules': [schedule_payload(schedule) for schedule in Schedule.objects.iterator(chunk_size=2000)],
+        'revoked': [],
+        'deleted': {'employees': [], 'schedules': []},
+    }
+
+
+def changes_since(since, limit=PAGE_SIZE):
+    """
+    Changements de version > since, au plus limit lignes. Seule la dernière
+    version d'un même objet est renvoyée.
+    """
+    assign_versions()
+    rows = list(
+        SyncChange.objects.filter(version__gt=since).order_by('version')
+        .values_list('version', 'kind', 'object_id', 'deleted', 'payload')[:limit]
+    )
+
+    latest = {}
+    for _, kind, object_id, deleted, payload in rows:
+        latest.pop((kind, object_id), None)
+        latest[(kind, object_id)] = (deleted, payload)
+
+    result = {
+        'version': rows[-1][0] if rows else since,
+        'full': False,
+        'has_more': len(rows) == limit,
+        'employees': [],
+        'schedules': [],
+        'revoked': [],
+        'deleted': {'employees': [], 'schedules': []},
+    }
+    for (kind, object_id), (deleted, payload) in latest.items():
+        if kind == 'revoked':
+            result['revoked'].append(payload)
+        elif deleted:
+            result['deleted'][f'{kind}s'].append(int(object_id))
+        else:
+            result[f'{kind}s'].append(payload)
+    return result
@@ -1,3 +1,269 @@
-from django.test import TestCase
+import tempfile
+from datetime import date, time
 
-# Create your tests here.
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts import credentials, face_index, schedule_cache
+from accounts.models import Schedule, SyncChange
+from attendance.tests import CacheTestCase, make_employee
+from core import metrics
+
+
+class ScheduleCacheTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('gina')
+        self.schedule = Schedule.objects.create(
+            employee=self.employee,
+            day_of_week=0,
+            start_time=time(8, 30),
+            end_time=time(17, 0)
+        )
+
+    def test_week_is_served_from_cache_after_first_load(self):
+        week = schedule_cache.get_weekly_schedule(self.employee.pk)
+        self.assertEqual(week[0], (time(8, 30), time(17, 0)))
+        self.assertIsNone(week[1])
+
+        with self.assertNumQueries(0):
+            schedule_cache.get_weekly_schedule(self.employee.pk)
+        counters = metrics.read('schedule_cache.local_hit', 'schedule_cache.miss')
+        self.assertEqual(counters, {'schedule_cache.local_hit': 1, 'schedule_cache.miss': 1})
+
+    def test_schedule_save_and_delete_invalidate_cache(self):
+        schedule_cache.get_weekly_schedule(self.employee.pk)
+
+        self.schedule.start_time = time(9, 0)
+        self.schedule.save()
+        self.assertEqual(schedule_cache.get_day_slot(self.employee.pk, 0)[0], time(9, 0))
+
+        self.schedule.delete()
+        self.assertIsNone(schedule_cache.get_day_slot(self.employee.pk, 0))
+        self.assertEqual(metrics.read('schedule_cache.invalidation')['schedule_cache.invalidation'], 3)
+
+
+class CredentialIndexTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('hugo', nfc_id='NFC-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee.user)
+
+    def validate(self, auth_type, data):
+        return self.client.post('/api/attendance/validate/', {'type': auth_type, 'data': data}, format='json')
+
+    def test_nfc_scan_resolves_without_queries(self):
+        credentials.resolve('pk', self.employee.pk)
+
+        with self.assertNumQueries(0):
+            response = self.validate('NFC', {'nfc_id': 'NFC-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['employee_id'], self.employee.pk)
+        self.assertEqual(response.data['name'], 'Hugo Test')
+
+    def test_index_is_rebuilt_when_missing(self):
+        cache.clear()
+
+        self.assertEqual(credentials.resolve('nfc', 'NFC-1')['employee_id'], self.employee.pk)
+        self.assertIsNone(credentials.resolve('nfc', 'unknown'))
+
+    def test_index_follows_employee_and_user_changes(self):
+        self.employee.nfc_id = 'NFC-2'
+        self.employee.face_id = 'FACE-2'
+        self.employee.save()
+        self.assertIsNone(credentials.resolve('nfc', 'NFC-1'))
+        self.assertEqual(credentials.resolve('face', 'FACE-2')['employee_id'], self.employee.pk)
+
+        self.employee.user.first_name = 'Hugues'
+        self.employee.user.save()
+        self.assertEqual(credentials.resolve('nfc', 'NFC-2')['name'], 'Hugues Test')
+
+        pk = self.employee.pk
+        self.employee.delete()
+        self.assertIsNone(credentials.resolve('pk', pk))
+
+    def test_inactive_employee_is_rejected(self):
+        self.employee.status = 'INACTIVE'
+        self.employee.save()
+
+        response = self.validate('NFC', {'nfc_id': 'NFC-1'})
+        self.assertEqual(response.status_code, 403)
+
+
+class FaceIdentificationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.index_dir = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(FACE_INDEX_DIR=self.index_dir.name, FACE_EMBEDDING_DIM=4)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.addCleanup(self.index_dir.cleanup)
+
+        self.admin = make_employee('ines')
+        self.admin.user.is_staff = True
+        self.admin.user.save()
+        self.employee = make_employee('jules')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin.user)
+
+    def enroll(self, employee, embedding):
+        return self.client.put(
+            f'/api/employees/{employee.pk}/face-id/',
+            {'embedding': embedding},
+            format='json'
+        )
+
+    def identify(self, embedding):
+        return self.client.post('/api/face/identify/', {'embedding': embedding}, format='json')
+
+    def test_enrolled_employee_is_identified(self):
+        self.assertEqual(self.enroll(self.employee, [1, 0, 0, 0]).status_code, 200)
+        self.assertEqual(self.enroll(self.admin, [0, 1, 0, 0]).status_code, 200)
+
+        response = self.identify([0.9, 0.1, 0, 0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['employee_id'], self.employee.pk)
+        self.assertEqual(response.data['name'], 'Jules Test')
+
+        self.assertEqual(self.identify([0, 0, 1, 0]).status_code, 404)
+
+    def test_re_enrollment_replaces_embedding(self):
+        self.enroll(self.employee, [1, 0, 0, 0])
+        self.enroll(self.employee, [0, 0, 0, 1])
+
+        self.assertEqual(self.identify([1, 0, 0, 0]).status_code, 404)
+        self.assertEqual(self.identify([0, 0, 0, 1]).data['employee_id'], self.employee.pk)
+
+    def test_index_grows_past_initial_capacity(self):
+        index = face_index.FaceIndex(self.index_dir.name, 4)
+        for employee_id in range(1, face_index.INITIAL_CAPACITY + 1):
+            index.enroll(employee_id, [1, 0, 0, 0])
+        index.enroll(face_index.INITIAL_CAPACITY + 1, [0, 0, 1, 0])
+
+        self.assertEqual(index.identify([0, 0, 1, 0], 0.99)[0], face_index.INITIAL_CAPACITY + 1)
+        self.assertEqual(len(index._open()[1]), face_index.INITIAL_CAPACITY * 2)
+
+    def test_invalid_embedding_is_rejected(self):
+        self.assertEqual(self.enroll(self.employee, [1, 0]).status_code, 400)
+        self.assertEqual(self.identify([0, 0, 0, 0]).status_code, 400)
+
+
+class SyncChangesTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('karim', nfc_id='NFC-K')
+        self.schedule = Schedule.objects.create(
+            employee=self.employee, day_of_week=0, start_time=time(9), end_time=time(17)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee.user)
+
+    def sync(self, since):
+        return self.client.get('/api/sync/changes/', {'since': since})
+
+    def test_full_snapshot_when_since_is_zero(self):
+        response = self.sync(0)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['full'])
+        self.assertEqual(response.data['version'], SyncChange.objects.latest('version').version)
+        self.assertEqual(response.data['employees'][0]['nfc_id'], 'NFC-K')
+        self.assertEqual(response.data['schedules'][0]['start_time'], '09:00:00')
+
+    def test_delta_returns_only_latest_changes(self):
+        version = self.sync(0).data['version']
+        self.assertEqual(self.sync(version).data['employees'], [])
+
+        self.employee.nfc_id = 'NFC-K2'
+        self.employee.save()
+        self.employee.status = 'INACTIVE'
+        self.employee.save()
+        schedule_pk = self.schedule.pk
+        self.schedule.delete()
+
+        response = self.sync(version)
+        self.assertFalse(response.data['full'])
+        self.assertEqual(len(response.data['employees']), 1)
+        self.assertEqual(response.data['employees'][0]['status'], 'INACTIVE')
+        self.assertEqual(response.data['employees'][0]['nfc_id'], 'NFC-K2')
+        self.assertEqual(response.data['revoked'], [{'kind': 'nfc', 'value': 'NFC-K'}])
+        self.assertEqual(response.data['deleted']['schedules'], [schedule_pk])
+        self.assertEqual(self.sync(response.data['version']).data['employees'], [])
+
+    def test_paging_with_limit(self):
+        version = self.sync(0).data['version']
+        make_employee('lina')
+        make_employee('marc')
+
+        response = self.client.get('/api/sync/changes/', {'since': version, 'limit': 1})
+        self.assertTrue(response.data['has_more'])
+        self.assertEqual(len(response.data['employees']), 1)
+
+        response = self.client.get('/api/sync/changes/', {'since': response.data['version']})
+        self.assertFalse(response.data['has_more'])
+
+    def test_invalid_since(self):
+        self.assertEqual(self.sync('abc').status_code, 400)
+
+    def test_change_committed_late_is_not_skipped(self):
+        # Id réservé par une transaction qui valide après une plus récente
+        gap = SyncChange.objects.create(kind='employee', object_id='0').pk
+        SyncChange.objects.filter(pk=gap).delete()
+        version = self.sync(0).data['version']
+        self.employee.nfc_id = 'NFC-K2'
+        self.employee.save()
+        version = self.sync(version).data['version']
+
+        late = make_employee('lina')
+        SyncChange.objects.filter(kind='employee', object_id=str(late.pk)).update(id=gap, version=None)
+
+        response = self.sync(version)
+        self.assertEqual([row['id'] for row in response.data['employees']], [late.pk])
+        self.assertGreater(response.data['version'], version)
+
+    def test_login_does_not_record_a_change(self):
+        count = SyncChange.objects.count()
+        self.employee.user.last_login = timezone.now()
+        self.employee.user.save(update_fields=['last_login'])
+        self.assertEqual(SyncChange.objects.count(), count)
+
+        self.employee.user.first_name = 'Karim'
+        self.employee.user.save(update_fields=['first_name'])
+        self.assertEqual(SyncChange.objects.count(), count + 1)
+
+    def test_versions_are_assigned_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_employee('lina')
+        self.assertFalse(SyncChange.objects.filter(version__isnull=True).exists())
+
+
+class EmployeeManagementPaginationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = make_employee('nora', date_joined=date(2021, 1, 1))
+        self.admin.user.is_staff = True
+        self.admin.user.save()
+        for name in ('olga', 'paul', 'quentin'):
+            make_employee(name)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin.user)
+
+    def names(self, ordering=None):
+        params = {'page_size': 2}
+        if ordering:
+            params['ordering'] = ordering
+        response = self.client.get('/api/employee-management/', params)
+        names = [row['user']['username'] for row in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            names += [row['user']['username'] for row in response.data['results']]
+        return names
+
+    def test_default_ordering_is_latest_joined_first(self):
+        self.assertEqual(self.names(), ['nora', 'quentin', 'paul', 'olga'])
+
+    def test_ordering_parameter(self):
+        self.assertEqual(self.names('employee_id'), ['nora', 'olga', 'paul', 'quentin'])
+        # Tri non autorisé : tri par défaut
+        self.assertEqual(self.names('department__name'), ['nora', 'quentin', 'paul', 'olga'])
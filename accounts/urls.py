@@ -16,6 +16,8 @@ from .views import (
     CreateEmployeeBasicInfoView,
     UpdateEmployeeNFCView,
     UpdateEmployeeFaceIDView,
+    IdentifyFaceView,
+    SyncChangesView,
     ValidateNFCIDView,
     DepartmentListCreateView,
     DepartmentDetailView,
@@ -50,5 +52,7 @@ urlpatterns = [
     path('employees/<int:employee_id>/nfc/', UpdateEmployeeNFCView.as_view(), name='update-employee-nfc'),
     path('employees/<int:employee_id>/face-id/', UpdateEmployeeFaceIDView.as_view(), name='update-employee-face'),
     path('employees/validate-nfc/', ValidateNFCIDView.as_view(), name='validate-nfc'),
+    path('face/identify/', IdentifyFaceView.as_view(), name='identify-face'),
+    path('sync/changes/', SyncChangesView.as_view(), name='sync-changes'),
     
 ]
\ No newline at end of file
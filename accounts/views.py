@@ -8,7 +8,13 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
-from accounts.models import Employee
+from accounts.models import Employee, FaceEmbedding
+from accounts import credentials, face_index, sync
+from accounts.renderers import MessagePackRenderer, msgpack
+from core.pagination import CreatedAtKeysetPagination, KeysetPagination
+from attendance.department_stats import DepartmentStatsProvider
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
 from django.db import transaction
 from attendance.models import Attendance
 from leave.models import Leave,LeaveBalance
@@ -100,6 +106,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
+    pagination_class = CreatedAtKeysetPagination
 
     @action(detail=True, methods=['post'])
     def nfc(self, request, pk=None):
@@ -143,7 +150,7 @@ def get_employee_dashboard(request):
     - Dernières demandes de congés
     """
     employee = request.user.employee
-    today = timezone.now().date()
+    today = timezone.localdate()
     current_year = today.year
     first_day_of_month = today.replace(day=1)
     last_day_of_month = (first_day_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
@@ -211,7 +218,7 @@ def get_leave_balance(request):
     Vue pour obtenir uniquement le solde des congés
     """
     employee = request.user.employee
-    current_year = timezone.now().year
+    current_year = timezone.localdate().year
 
     balances = LeaveBalance.objects.filter(
         employee=employee,
@@ -234,7 +241,7 @@ def get_attendance_status(request):
     Vue pour obtenir le statut de présence du jour
     """
     employee = request.user.employee
-    today = timezone.now().date()
+    today = timezone.localdate()
 
     try:
         attendance = Attendance.objects.get(
@@ -260,7 +267,10 @@ def get_attendance_status(request):
 class EmployeeManagementViewSet(viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     permission_classes = [IsAuthenticated, IsAdminUser]
-    
+    pagination_class = KeysetPagination
+    # Tris acceptés par ?ordering= (champs non nuls, départagés par l'id)
+    ordering_fields = ('date_joined', 'created_at', 'employee_id', 'user__first_name', 'user__last_name')
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return EmployeeManagementCreateSerializer
@@ -289,13 +299,14 @@ class EmployeeManagementViewSet(viewsets.ModelViewSet):
         if status_param:
             queryset = queryset.filter(status=status_param)
 
-        # Tri
-        ordering = self.request.query_params.get('ordering', '-date_joined')
-        if ordering:
-            queryset = queryset.order_by(ordering)
-
         return queryset
 
+    def get_keyset_ordering(self):
+        ordering = self.request.query_params.get('ordering', '-date_joined')
+        if ordering.lstrip('-') not in self.ordering_fields:
+            ordering = '-date_joined'
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
+
     @action(detail=True, methods=['post'])
     def activate(self, request, pk=None):
         employee = self.get_object()
@@ -436,14 +447,86 @@ class UpdateEmployeeFaceIDView(APIView):
                 'error': 'Employé non trouvé'
             }, status=status.HTTP_404_NOT_FOUND)
 
+        # Empreinte faciale optionnelle : enrôlement incrémental dans l'index
+        embedding = request.data.get('embedding')
+        if embedding is not None:
+            try:
+                vector = face_index.to_bytes(embedding)
+            except (TypeError, ValueError) as e:
+                return Response({
+                    'embedding': [str(e)]
+                }, status=status.HTTP_400_BAD_REQUEST)
+
         serializer = EmployeeFaceIDSerializer(employee, data=request.data)
         if serializer.is_valid():
             serializer.save()
+            if embedding is not None:
+                FaceEmbedding.objects.update_or_create(
+                    employee=employee,
+                    defaults={'vector': vector}
+                )
             return Response({
                 'message': 'Face ID enregistré avec succès'
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class IdentifyFaceView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            match = face_index.get_face_index().identify(
+                request.data.get('embedding'),
+                settings.FACE_MATCH_THRESHOLD
+            )
+        except (TypeError, ValueError) as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        entry = credentials.resolve('pk', match[0]) if match else None
+        if entry is None:
+            return Response({
+                'error': 'Aucun employé reconnu'
+            }, status=status.HTTP_404_NOT_FOUND)
+        if entry['status'] == 'INACTIVE':
+            return Response({
+                'error': 'Employee is inactive'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        return Response({
+            'employee_id': entry['employee_id'],
+            'name': entry['name'],
+            'score': round(match[1], 4)
+        })
+
+class SyncChangesView(APIView):
+    """
+    Flux de synchronisation des terminaux : ?since=<version> renvoie les
+    changements postérieurs (état complet si since=0). Le terminal applique
+    les identifiants retirés avant les employés puis rappelle avec la
+    version reçue tant que has_more est vrai.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer] + ([MessagePackRenderer] if msgpack else [])
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', sync.PAGE_SIZE)), sync.PAGE_SIZE)
+        except ValueError:
+            return Response({
+                'error': 'since et limit doivent être des entiers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({
+                'error': 'since et limit doivent être positifs'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if since == 0:
+            return Response(sync.snapshot())
+        return Response(sync.changes_since(since, limit))
+
 class ValidateNFCIDView(APIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
 
@@ -487,7 +570,9 @@ class DepartmentListCreateView(APIView):
             else:
                 queryset = queryset.order_by(ordering)
 
-        serializer = DepartmentDetailSerializer(queryset, many=True)
+        serializer = DepartmentDetailSerializer(queryset, many=True, context={
+            'department_stats': DepartmentStatsProvider(timezone.localdate())
+        })
         return Response(serializer.data)
 
     def post(self, request):
@@ -578,7 +663,7 @@ class DepartmentStatsView(APIView):
         employee_count = department.employee_set.filter(status='ACTIVE').count()
         
         # Stats de présence
-        today = timezone.now().date()
+        today = timezone.localdate()
         present_count = department.employee_set.filter(
             attendance__date=today,
             attendance__status__in=['PRESENT', 'LATE']
@@ -0,0 +1,93 @@
+# attendance/absences.py
+"""
+Matérialisation des absences : pour un jour passé, une ligne Attendance
+ABSENT est créée pour chaque employé actif ce jour-là, planifié (Schedule
+du jour de la semaine), sans présence ni congé approuvé.
+
+La sélection est une seule requête (jointure sur Schedule, anti-jointures
+NOT EXISTS sur Attendance et Leave), lue par lots et écrite par
+bulk_create. Les agrégats du jour sont ensuite recalculés (rollup.rebuild,
+qui invalide aussi le cache des rapports et les compteurs live). Un
+pointage hors ligne reçu plus tard remplace l'absence.
+
+Ces lignes alimentent le compteur absent des agrégats, lu par le rapport
+journalier et les alertes. Les analyses, tendances, tableau de bord et
+statistiques par département gardent une absence déduite de l'effectif
+(headcount - présents - retards), qui compte aussi les employés non
+planifiés ou en congé et reste valable pour le jour en cours.
+"""
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from accounts.models import Employee
+from attendance import rollup
+from attendance.models import Attendance
+from leave.models import Leave
+
+CHUNK_SIZE = 2000
+
+
+def missing(date):
+    """pk des employés attendus ce jour-là sans présence ni congé approuvé"""
+    return Employee.objects.filter(
+        # Même définition de l'effectif que les agrégats
+        Q(status='ACTIVE') | Q(status='INACTIVE', date_left__isnull=False),
+        Q(date_left__isnull=True) | Q(date_left__gt=date),
+        date_joined__lte=date,
+        schedule__day_of_week=date.weekday(),
+    ).filter(
+        ~Exists(Attendance.objects.filter(employee=OuterRef('pk'), date=date)),
+        ~Exists(Leave.objects.filter(
+            employee=OuterRef('pk'), status='APPROVED', start_date__lte=date, end_date__gte=date
+        )),
+    ).order_by('pk').values_list('pk', flat=True)
+
+
+def materialize(date, chunk_size=None):
+    """Crée les absences d'un jour passé. Retourne le nombre de lignes créées"""
+    if date >= timezone.localdate():
+        raise ValueError('Seuls les jours passés sont matérialisés')
+    size = chunk_size or CHUNK_SIZE
+    created = 0
+    chunk = []
+    for employee_id in missing(date).iterator(chunk_size=size):
+        chunk.append(Attendance(employee_id=employee_id, date=date, status='ABSENT', attendance_type=None))
+        if len(chunk) >= size:
+            created += _insert(date, chunk)
+            chunk = []
+    created += _insert(date, chunk)
+    if created:
+        rollup.rebuild(date, date)
+    return created
+
+
+def _insert(date, rows):
+    # Un pointage arrivé depuis la sélection l'emporte : sa ligne n'est ni
+    # écrasée (ignore_conflicts) ni comptée
+    if not rows:
+        return 0
+    taken = set(Attendance.objects.filter(
+        date=date, employee_id__in=[row.employee_id for row in rows]
+    ).values_list('employee_id', flat=True))
+    rows = [row for row in rows if row.employee_id not in taken]
+    Attendance.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def materialize_range(start, end):
+    """Absences de chaque jour passé de la période : {date: lignes créées}"""
+    end = min(end, timezone.localdate() - timedelta(days=1))
+    results = {}
+    day = start
+    while day <= end:
+        results[day] = materialize(day)
+        day += timedelta(days=1)
+    return results
+
+
+def materialize_recent(days):
+    """Les days derniers jours révolus (rattrapage des nuits manquées)"""
+    yesterday = timezone.localdate() - timedelta(days=1)
+    return materialize_range(yesterday - timedelta(days=days - 1), yesterday)
@@ -0,0 +1,212 @@
+# attendance/analytics.py
+"""
+Moteur d'analyse : un nombre fixe de requêtes GROUP BY (par date, par
+date x département, par employé) quel que soit l'effectif, assemblées dans
+la forme de réponse des vues d'analyse et des rapports asynchrones.
+"""
+import calendar
+import heapq
+from datetime import date as date_cls, timedelta
+
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from accounts.models import Department, Employee
+from attendance import rollup
+from attendance.department_stats import DepartmentStatsProvider
+from attendance.serializers import DepartmentAttendanceAnalyticsSerializer, EmployeeAttendanceAnalyticsSerializer
+
+# Taille des classements meilleurs / moins bons taux de présence
+RANKING_SIZE = 5
+# Période maximale d'une tendance (en jours)
+TRENDS_MAX_DAYS = 731
+
+
+def rate(present, late, total):
+    return round(((present + late) / total * 100), 1) if total > 0 else 0
+
+
+def format_duration(seconds):
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    return f"{hours}h {minutes}min"
+
+
+def department_breakdown(provider, departments, day):
+    """Statistiques de chaque département pour un jour, lues dans le fournisseur partagé"""
+    return DepartmentAttendanceAnalyticsSerializer(
+        departments,
+        many=True,
+        context={'date': day, 'department_stats': provider}
+    ).data
+
+
+def employee_stats(employees, start, end):
+    """
+    Statistiques de présence de chaque employé sur la période, calculées en
+    une requête annotée (agrégats conditionnels, durée sommée en base).
+    Retourne (employés, {pk: statistiques}).
+    """
+    period = Q(attendance__date__range=(start, end))
+    worked = ExpressionWrapper(
+        F('attendance__check_out') - F('attendance__check_in'),
+        output_field=DurationField()
+    )
+    employees = list(employees.annotate(
+        total_days=Count('attendance', filter=period),
+        present_days=Count('attendance', filter=period & Q(attendance__status='PRESENT')),
+        late_days=Count('attendance', filter=period & Q(attendance__status='LATE')),
+        worked=Sum(worked, filter=period & Q(attendance__check_out__gt=F('attendance__check_in')))
+    ))
+
+    stats = {}
+    for employee in employees:
+        worked_seconds = int(employee.worked.total_seconds()) if employee.worked else 0
+        present, late = employee.present_days, employee.late_days
+        stats[employee.pk] = {
+            'present_days': present,
+            'late_days': late,
+            'absent_days': employee.total_days - (present + late),
+            'attendance_rate': rate(present, late, employee.total_days),
+            'total_work_hours': format_duration(worked_seconds),
+            'total_work_seconds': worked_seconds
+        }
+    return employees, stats
+
+
+def monthly(year, month, department_id=None):
+    """Réponse de MonthlyAnalyticsView"""
+    _, last_day = calendar.monthrange(year, month)
+    start, end = date_cls(year, month, 1), date_cls(year, month, last_day)
+    today = timezone.localdate()
+
+    departments = Department.objects.all()
+    if department_id:
+        departments = departments.filter(id=department_id)
+    departments = list(departments)
+
+    summaries = rollup.summaries(start, end)
+    provider = DepartmentStatsProvider(start, end, summaries)
+
+    daily_stats = []
+    for day, totals in rollup.by_date(summaries).items():
+        total_employees = totals['headcount']
+        if day <= today and total_employees > 0:
+            present, late = totals['present'], totals['late']
+            daily_stats.append({
+                'date': day,
+                'total_present': present,
+                'total_late': late,
+                'total_absent': total_employees - (present + late),
+                'attendance_rate': rate(present, late, total_employees),
+                'department_breakdown': department_breakdown(provider, departments, day)
+            })
+
+    employees, stats = employee_stats(
+        Employee.objects.filter(status='ACTIVE').select_related('user', 'department'),
+        start,
+        end
+    )
+
+    # Sélection des k meilleurs / moins bons taux, seuls ces employés sont sérialisés
+    def key(employee):
+        return stats[employee.pk]['attendance_rate']
+
+    best = heapq.nlargest(RANKING_SIZE, employees, key=key)
+    worst = heapq.nsmallest(RANKING_SIZE, employees, key=key)[::-1] if len(employees) > RANKING_SIZE else []
+    context = {'stats': stats, 'year': year, 'month': month}
+
+    return {
+        'year': year,
+        'month': month,
+        'daily_stats': daily_stats,
+        'best_attendance': EmployeeAttendanceAnalyticsSerializer(best, many=True, context=context).data,
+        'worst_attendance': EmployeeAttendanceAnalyticsSerializer(worst, many=True, context=context).data
+    }
+
+
+def department_rates(summaries):
+    """Taux moyen de chaque département sur les lignes d'agrégats, du meilleur au moins bon"""
+    departments = []
+    for row in summaries.filter(department__isnull=False).values(
+        'department_id', 'department__name'
+    ).annotate(**rollup.SUMS).order_by('department_id'):
+        # Effectif cumulé sur la période : un employé compte une fois par jour
+        total_possible = row['headcount']
+        if total_possible > 0:
+            departments.append({
+                'department': row['department__name'],
+                'average_attendance': rate(row['present'], row['late'], total_possible)
+            })
+    return sorted(departments, key=lambda x: x['average_attendance'], reverse=True)
+
+
+def trends(days):
+    """Réponse de AttendanceTrendsAnalyticsView sur les days derniers jours"""
+    end_date = timezone.localdate()
+    start_date = end_date - timedelta(days=days)
+    summaries = rollup.summaries(start_date, end_date)
+
+    trends_data = []
+    for current_date, totals in rollup.by_date(summaries).items():
+        total_employees = totals['headcount']
+        if total_employees > 0:
+            present = totals['present']
+            late = totals['late']
+            trends_data.append({
+                'date': current_date,
+                'attendance_rate': rate(present, late, total_employees),
+                'present': present,
+                'late': late,
+                'absent': total_employees - (present + late),
+                'headcount': total_employees
+            })
+
+    return {
+        'period': {
+            'start_date': start_date,
+            'end_date': end_date,
+            'days': days
+        },
+        'daily_trends': trends_data,
+        'department_trends': department_rates(summaries)
+    }
+
+
+def yearly(year, department_id=None):
+    """Bilan annuel : compteurs par mois et taux moyen par département"""
+    start, end = date_cls(year, 1, 1), date_cls(year, 12, 31)
+    today = timezone.localdate()
+    summaries = rollup.summaries(start, end)
+    if department_id:
+        summaries = summaries.filter(department_id=department_id)
+
+    months = {}
+    for day, totals in rollup.by_date(summaries).items():
+        if day <= today and totals['headcount'] > 0:
+            values = months.setdefault(day.month, {'working_days': 0, 'headcount': 0, 'present': 0, 'late': 0})
+            values['working_days'] += 1
+            for field in ('headcount', 'present', 'late'):
+                values[field] += totals[field]
+
+    monthly_stats = []
+    for month, values in sorted(months.items()):
+        present, late, headcount = values['present'], values['late'], values['headcount']
+        monthly_stats.append({
+            'month': month,
+            'working_days': values['working_days'],
+            'present': present,
+            'late': late,
+            'absent': headcount - (present + late),
+            'attendance_rate': rate(present, late, headcount)
+        })
+
+    present = sum(values['present'] for values in months.values())
+    late = sum(values['late'] for values in months.values())
+    headcount = sum(values['headcount'] for values in months.values())
+    return {
+        'year': year,
+        'attendance_rate': rate(present, late, headcount),
+        'monthly_stats': monthly_stats,
+        'department_stats': department_rates(summaries)
+    }
@@ -0,0 +1,71 @@
+# attendance/department_stats.py
+"""
+Statistiques de présence de tous les départements pour une date ou une
+période, lues en une requête sur les agrégats journaliers au premier accès.
+Un même fournisseur est partagé par les sérialiseurs via leur contexte
+(clé 'department_stats').
+"""
+from attendance import rollup
+
+COUNTERS = ('headcount', 'present', 'late')
+
+
+def _stats(headcount, present, late):
+    return {
+        'total_employees': headcount,
+        'present_count': present,
+        'late_count': late,
+        'absent_count': headcount - (present + late),
+        'attendance_rate': round(((present + late) / headcount * 100), 1) if headcount > 0 else 0
+    }
+
+
+class DepartmentStatsProvider:
+    def __init__(self, start, end=None, summaries=None):
+        self.start = start
+        self.end = end or start
+        # Lignes d'agrégats déjà préparées par l'appelant (rollup.summaries)
+        self.summaries = summaries
+        self._rows = None
+
+    @property
+    def rows(self):
+        """{(date, département): {headcount, present, late}}"""
+        if self._rows is None:
+            summaries = self.summaries
+            if summaries is None:
+                summaries = rollup.summaries(self.start, self.end)
+            self._rows = {
+                (row.pop('date'), row.pop('department_id')): row
+                for row in summaries.filter(
+                    department__isnull=False
+                ).values('date', 'department_id', *COUNTERS)
+            }
+        return self._rows
+
+    def get(self, department_id, date=None):
+        """
+        Statistiques d'un département pour une date de la période, ou sur
+        toute la période (comptes cumulés, effectif moyen).
+        """
+        if date is not None:
+            row = self.rows.get((date, department_id))
+            return _stats(*(row[field] for field in COUNTERS)) if row else _stats(0, 0, 0)
+
+        totals = dict.fromkeys(COUNTERS, 0)
+        for (_, row_department), row in self.rows.items():
+            if row_department == department_id:
+                for field in COUNTERS:
+                    totals[field] += row[field]
+        stats = _stats(totals['headcount'], totals['present'], totals['late'])
+        days = (self.end - self.start).days + 1
+        stats['total_employees'] = round(totals['headcount'] / days)
+        return stats
+
+
+def from_context(context, date):
+    """Fournisseur du contexte d'un sérialiseur, créé pour date s'il manque"""
+    provider = context.get('department_stats')
+    if provider is None or not provider.start <= date <= provider.end:
+        provider = context['department_stats'] = DepartmentStatsProvider(date)
+    return provider
@@ -0,0 +1,174 @@
+# attendance/export.py
+"""
+Export de l'historique de présence pour la paie, en flux (CSV ou XLSX).
+
+Les lignes sont lues par paquets (values_list avec le nom et le département
+joints) et écrites au fur et à mesure : la mémoire reste constante quel que
+soit le nombre de lignes et l'en-tête part avant la première requête.
+Le XLSX est un zip produit au fil de l'eau (feuille en chaînes inline, sans
+styles) pour ne pas dépendre d'un écrivain qui bufferise le classeur.
+"""
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import Q
+from django.utils import timezone
+
+# Lignes lues par aller-retour base et écrites par paquet
+CHUNK_SIZE = 2000
+
+HEADER = (
+    'employee_id', 'employee_name', 'department', 'date',
+    'check_in', 'check_out', 'worked_hours', 'attendance_type', 'status'
+)
+FIELDS = (
+    'employee__employee_id', 'employee__user__first_name', 'employee__user__last_name',
+    'employee__department__name', 'date', 'check_in', 'check_out', 'attendance_type', 'status'
+)
+
+
+def _time(value):
+    return timezone.localtime(value).strftime('%H:%M:%S') if value else ''
+
+
+def _row(employee_id, first_name, last_name, department, date,
+         check_in, check_out, attendance_type, status):
+    worked = ''
+    if check_in and check_out and check_out > check_in:
+        worked = round((check_out - check_in).total_seconds() / 3600, 2)
+    return (
+        employee_id, f'{first_name} {last_name}'.strip(), department or '', date.isoformat(),
+        _time(check_in), _time(check_out), worked, attendance_type, status
+    )
+
+
+def batches(queryset, size=None):
+    """
+    Lignes d'export (tuples dans l'ordre de HEADER) par paquets de size,
+    triées par (date, id). Chaque paquet est une requête reprenant après la
+    dernière ligne lue : le pilote MySQL chargerait sinon tout le résultat.
+    """
+    size = size or CHUNK_SIZE
+    queryset = queryset.order_by('date', 'pk')
+    last = None
+    while True:
+        page = queryset
+        if last:
+            page = page.filter(Q(date__gt=last['date']) | Q(date=last['date'], pk__gt=last['pk']))
+        rows = list(page.values_list('pk', *FIELDS)[:size])
+        if rows:
+            yield [_row(*row[1:]) for row in rows]
+        if len(rows) < size:
+            return
+        last = {'pk': rows[-1][0], 'date': rows[-1][5]}
+
+
+class _Buffer:
+    """Fichier en écriture seule dont le contenu est vidé à chaque paquet"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self.parts[0][:0].join(self.parts) if self.parts else b''
+        self.parts = []
+        return data
+
+
+def csv_stream(batches):
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    yield buffer.drain()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.drain()
+
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Attendance" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+# Caractères de contrôle interdits en XML
+_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _cell(value):
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(_ILLEGAL.sub("", str(value)))}</t></is></c>'
+
+
+def _xml_rows(rows):
+    return ''.join(f'<row>{"".join(_cell(value) for value in row)}</row>' for row in rows).encode()
+
+
+def xlsx_stream(batches):
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in (
+            ('[Content_Types].xml', CONTENT_TYPES),
+            ('_rels/.rels', ROOT_RELS),
+            ('xl/workbook.xml', WORKBOOK),
+            ('xl/_rels/workbook.xml.rels', WORKBOOK_RELS),
+        ):
+            archive.writestr(name, content)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xml_rows([HEADER]))
+            for batch in batches:
+                sheet.write(_xml_rows(batch))
+                yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
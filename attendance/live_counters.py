@@ -0,0 +1,258 @@
+# attendance/live_counters.py
+"""
+Compteurs de présence du jour dans Redis, lus par le tableau de bord sans
+requête MySQL.
+
+    live:day:<date>     -> hash "<département>:<champ>" -> valeur
+                           (département "-" : employés sans département),
+                           "_built" une fois le jour chargé depuis la base
+    live:departments    -> hash id -> nom des départements (et "_built")
+    live:feed           -> canal pub/sub des pointages et des compteurs
+                           modifiés (flux SSE, attendance.live_stream)
+
+Chaque delta appliqué aux agrégats journaliers (rollup.apply / shift) est
+répercuté par HINCRBY. Un jour absent ou incomplet est rechargé depuis
+les agrégats ; reconcile() recharge périodiquement le jour courant.
+Sans Redis (cache local), les lectures passent par les agrégats.
+"""
+import json
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from accounts.models import Department
+from attendance import rollup
+
+logger = logging.getLogger(__name__)
+
+DAY_KEY = 'live:day:{}'
+DEPARTMENTS_KEY = 'live:departments'
+FEED_CHANNEL = 'live:feed'
+BUILT = '_built'
+NO_DEPARTMENT = '-'
+# Les jours sont conservés une semaine et demie (série hebdomadaire)
+DAY_TTL = 10 * 24 * 3600
+WINDOW_DAYS = 7
+
+_client = None
+
+
+def get_client():
+    """Client Redis du cache par défaut, ou None si le cache n'est pas Redis"""
+    global _client
+    if _client is None:
+        from django_redis import get_redis_connection
+        try:
+            _client = get_redis_connection('default')
+        except NotImplementedError:
+            _client = False
+    return _client or None
+
+
+def set_client(client):
+    global _client
+    _client = client
+
+
+def _field(department_id, name):
+    return f'{NO_DEPARTMENT if department_id is None else department_id}:{name}'
+
+
+def incr(dates, department_id, changes):
+    """
+    Ajoute changes aux compteurs des jours donnés (sans effet hors fenêtre)
+    et publie les nouvelles valeurs sur le canal du flux live.
+    """
+    client = get_client()
+    changes = {field: value for field, value in changes.items() if value}
+    today = timezone.localdate()
+    dates = [date for date in dates if today - timedelta(days=WINDOW_DAYS) <= date <= today]
+    if client is None or not changes or not dates:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for date in dates:
+            key = DAY_KEY.format(date.isoformat())
+            for name, value in changes.items():
+                pipe.hincrby(key, _field(department_id, name), value)
+            pipe.expire(key, DAY_TTL)
+        results = iter(pipe.execute())
+        pipe = client.pipeline(transaction=False)
+        for date in dates:
+            # Valeurs absolues : un abonné en retard ne garde que la dernière
+            counters = {name: int(next(results)) for name in changes}
+            next(results)
+            pipe.publish(FEED_CHANNEL, _event(
+                'counters', date=date.isoformat(), department=department_id, counters=counters
+            ))
+        pipe.execute()
+    except RedisError:
+        # Le pointage ne doit pas échouer pour le tableau de bord
+        logger.warning('Compteurs live non mis à jour', exc_info=True)
+
+
+def _event(event_type, **payload):
+    return json.dumps({'type': event_type, **payload})
+
+
+def publish(event_type, **payload):
+    """Publie un événement sur le canal du flux live (sans effet sans Redis)"""
+    client = get_client()
+    if client is None:
+        return
+    try:
+        client.publish(FEED_CHANNEL, _event(event_type, **payload))
+    except RedisError:
+        logger.warning('Événement live non publié', exc_info=True)
+
+
+def rebuild(dates, client=None):
+    """Recharge les compteurs de jours depuis les agrégats. Retourne {date: {département: compteurs}}"""
+    client = client or get_client()
+    days = _from_summaries(dates)
+    if client is not None:
+        pipe = client.pipeline()
+        for date, departments in days.items():
+            mapping = {BUILT: 1}
+            for department_id, values in departments.items():
+                for name, value in values.items():
+                    mapping[_field(department_id, name)] = value
+            key = DAY_KEY.format(date.isoformat())
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, DAY_TTL)
+        pipe.execute()
+    return days
+
+
+def _from_summaries(dates):
+    """Compteurs des jours passés lus dans les agrégats (une lecture pour tous les jours)"""
+    days = {date: {} for date in dates}
+    if dates:
+        rows = rollup.summaries(min(dates), max(dates)).filter(date__in=dates)
+        for row in rows.values('date', 'department_id', *rollup.FIELDS):
+            days[row.pop('date')][row.pop('department_id')] = row
+    return days
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _built(raw):
+    return BUILT in raw or BUILT.encode() in raw
+
+
+def _parse(raw):
+    counters = {}
+    for key, value in raw.items():
+        key = _decode(key)
+        if key == BUILT:
+            continue
+        department, name = key.rsplit(':', 1)
+        department_id = None if department == NO_DEPARTMENT else int(department)
+        counters.setdefault(department_id, dict.fromkeys(rollup.FIELDS, 0))[name] = int(value)
+    return counters
+
+
+def rebuild_departments(client=None):
+    client = client or get_client()
+    names = dict(Department.objects.values_list('id', 'name'))
+    if client is not None:
+        pipe = client.pipeline()
+        pipe.delete(DEPARTMENTS_KEY)
+        pipe.hset(DEPARTMENTS_KEY, mapping={BUILT: 1, **names})
+        pipe.execute()
+    return names
+
+
+def set_department(department_id, name=None):
+    """Nom d'un département créé, renommé (ou supprimé si name est None)"""
+    client = get_client()
+    if client is None:
+        return
+    try:
+        if name is None:
+            client.hdel(DEPARTMENTS_KEY, department_id)
+        else:
+            client.hset(DEPARTMENTS_KEY, department_id, name)
+    except RedisError:
+        logger.warning('Nom de département non mis à jour', exc_info=True)
+
+
+def read(dates, names=True):
+    """
+    Compteurs des jours donnés et noms des départements :
+    ({date: {département: compteurs}}, {id: nom}, ou None si names est
+    faux). Les jours futurs sont vides ; un jour inconnu de Redis est
+    rechargé depuis la base.
+    """
+    today = timezone.localdate()
+    past = [date for date in dates if date <= today]
+    client = get_client()
+    raw_days = raw_names = None
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for date in past:
+                pipe.hgetall(DAY_KEY.format(date.isoformat()))
+            pipe.hgetall(DEPARTMENTS_KEY)
+            *raw_days, raw_names = pipe.execute()
+        except RedisError:
+            logger.warning('Compteurs live illisibles, lecture des agrégats', exc_info=True)
+            client = None
+    if client is None:
+        return (
+            {**{date: {} for date in dates}, **_from_summaries(past)},
+            dict(Department.objects.values_list('id', 'name')) if names else None
+        )
+
+    days = {date: {} for date in dates}
+    missing = []
+    for date, raw in zip(past, raw_days):
+        if _built(raw):
+            days[date] = _parse(raw)
+        else:
+            missing.append(date)
+    days.update(rebuild(missing, client) if missing else {})
+
+    return days, _names(raw_names, client) if names else None
+
+
+def _names(raw, client):
+    if not _built(raw):
+        return rebuild_departments(client)
+    return {int(_decode(key)): _decode(value) for key, value in raw.items() if _decode(key) != BUILT}
+
+
+def department_names():
+    """Noms des départements {id: nom}, depuis Redis si possible"""
+    client = get_client()
+    if client is not None:
+        try:
+            return _names(client.hgetall(DEPARTMENTS_KEY), client)
+        except RedisError:
+            logger.warning('Noms des départements illisibles, lecture de la base', exc_info=True)
+    return dict(Department.objects.values_list('id', 'name'))
+
+
+def discard(dates):
+    """Oublie les compteurs de ces jours, rechargés à la prochaine lecture"""
+    client = get_client()
+    today = timezone.localdate()
+    keys = [
+        DAY_KEY.format(date.isoformat()) for date in dates
+        if today - timedelta(days=WINDOW_DAYS) <= date <= today
+    ]
+    if client is not None and keys:
+        client.delete(*keys)
+
+
+def reconcile():
+    """Recharge le jour courant et les noms depuis la base (tâche périodique)"""
+    today = timezone.localdate()
+    rebuild([today])
+    rebuild_departments()
+    return today.isoformat()
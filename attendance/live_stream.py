@@ -0,0 +1,307 @@
+# attendance/live_stream.py
+"""
+Flux live des tableaux de bord en Server-Sent Events, servi par
+l'application ASGI (core/asgi.py) sur STREAM_PATH.
+
+Chaque processus ouvre un seul abonnement Redis au canal
+live_counters.FEED_CHANNEL, partagé par tous les clients connectés : aucun
+client ne lit la base en boucle. Chaque client a sa file (Subscriber) :
+les compteurs y sont fusionnés par (jour, département) et les pointages
+bornés, un client lent reçoit donc les dernières valeurs au lieu d'un
+arriéré sans limite.
+
+    event: counters   {"date", "department", "counters": {champ: valeur}}
+    event: punch      {"action", "employee", "department", "status", "timestamp"}
+    event: dropped    {"count"} pointages perdus par un client trop lent
+
+L'application est servie hors de la pile de middlewares Django : la
+politique CORS de django-cors-headers (CORS_ALLOWED_ORIGINS...) y est
+appliquée ici. Un EventSource ne peut pas envoyer d'en-tête Authorization :
+le navigateur demande d'abord un ticket à usage unique et de courte durée
+(issue_ticket, POST /api/dashboard/stream/ticket/) passé en ?ticket=, pour
+ne pas exposer le jeton d'accès dans les journaux d'accès et des proxys.
+"""
+import asyncio
+import json
+import logging
+import re
+import secrets
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import sync_to_async
+from corsheaders.conf import conf as cors
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from attendance import live_counters
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/dashboard/stream/'
+TICKET_KEY = 'stream:ticket:{}'
+# Pointages gardés par client avant d'abandonner les plus anciens
+MAX_PENDING_EVENTS = 100
+# Regroupement des envois et commentaire de maintien de connexion (secondes)
+FLUSH_INTERVAL = 0.5
+KEEPALIVE_INTERVAL = 15
+# Délai avant reconnexion au canal, doublé à chaque échec (secondes)
+RECONNECT_DELAY = 2
+MAX_RECONNECT_DELAY = 60
+
+
+class Subscriber:
+    """File d'un client : compteurs fusionnés, pointages bornés"""
+
+    def __init__(self, max_events=MAX_PENDING_EVENTS):
+        self.counters = {}
+        self.events = deque()
+        self.max_events = max_events
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def put(self, event):
+        if event.get('type') == 'counters':
+            key = (event['date'], event['department'])
+            self.counters.setdefault(key, {}).update(event['counters'])
+        else:
+            if len(self.events) >= self.max_events:
+                self.events.popleft()
+                self.dropped += 1
+            self.events.append(event)
+        self.ready.set()
+
+    def drain(self):
+        """Événements en attente, dans l'ordre d'envoi, puis file vidée"""
+        events = list(self.events)
+        if self.dropped:
+            events.append({'type': 'dropped', 'count': self.dropped})
+        events.extend(
+            {'type': 'counters', 'date': date, 'department': department, 'counters': counters}
+            for (date, department), counters in self.counters.items()
+        )
+        self.events.clear()
+        self.counters = {}
+        self.dropped = 0
+        self.ready.clear()
+        return events
+
+
+def _connect():
+    return aioredis.Redis.from_url(settings.REDIS_URL)
+
+
+class Broadcaster:
+    """Abonnement Redis du processus, redistribué aux clients connectés"""
+
+    def __init__(self, connect=_connect):
+        self.connect = connect
+        self.subscribers = set()
+        self.task = None
+
+    def subscribe(self):
+        subscriber = Subscriber()
+        self.subscribers.add(subscriber)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.listen())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self.task is not None:
+            # Plus de client : l'abonnement est fermé jusqu'au suivant
+            self.task.cancel()
+            self.task = None
+
+    def dispatch(self, event):
+        for subscriber in self.subscribers:
+            subscriber.put(event)
+
+    def receive(self, data):
+        """Redistribue un message du canal ; un message illisible est ignoré"""
+        try:
+            event = json.loads(data)
+        except ValueError:
+            logger.warning('Message illisible ignoré sur le flux live : %r', data[:200])
+            return
+        if not isinstance(event, dict):
+            logger.warning('Message inattendu ignoré sur le flux live : %r', event)
+            return
+        self.dispatch(event)
+
+    async def listen(self):
+        # La tâche ne s'arrête qu'à l'annulation : toute erreur relance
+        # l'abonnement, avec un délai doublé à chaque échec consécutif
+        delay = RECONNECT_DELAY
+        while True:
+            client = self.connect()
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(live_counters.FEED_CHANNEL)
+                async for message in pubsub.listen():
+                    delay = RECONNECT_DELAY
+                    if message['type'] == 'message':
+                        self.receive(message['data'])
+            except (RedisError, OSError):
+                logger.warning('Abonnement au flux live perdu, reconnexion', exc_info=True)
+            except Exception:
+                logger.exception('Erreur du flux live, reconnexion')
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except (RedisError, OSError):
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+broadcaster = Broadcaster()
+
+
+def issue_ticket(user_id):
+    """Ticket d'ouverture du flux, à usage unique, valable STREAM_TICKET_TTL secondes"""
+    ticket = secrets.token_urlsafe(32)
+    cache.set(TICKET_KEY.format(ticket), user_id, timeout=settings.STREAM_TICKET_TTL)
+    return ticket
+
+
+def consume_ticket(ticket):
+    """Vrai si le ticket est valide ; la suppression le rend inutilisable ensuite"""
+    return bool(ticket) and bool(cache.delete(TICKET_KEY.format(ticket)))
+
+
+def _header(scope, wanted):
+    for name, value in scope.get('headers', []):
+        if name == wanted:
+            return value.decode('latin-1')
+    return None
+
+
+def _authenticated(scope):
+    """Jeton JWT de l'en-tête Authorization (vérifié sans requête en base) ou ticket du flux"""
+    parts = (_header(scope, b'authorization') or '').split()
+    if len(parts) == 2 and parts[0] in settings.SIMPLE_JWT['AUTH_HEADER_TYPES']:
+        try:
+            AccessToken(parts[1])
+        except TokenError:
+            return False
+        return True
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('ticket')
+    return consume_ticket(values[0] if values else None)
+
+
+def _origin_allowed(origin):
+    """Même règle que corsheaders.middleware.CorsMiddleware"""
+    if cors.CORS_ALLOW_ALL_ORIGINS:
+        return True
+    url = urlsplit(origin)
+    return (
+        (origin == 'null' and origin in cors.CORS_ALLOWED_ORIGINS)
+        or any(
+            (allowed.scheme, allowed.netloc) == (url.scheme, url.netloc)
+            for allowed in map(urlsplit, cors.CORS_ALLOWED_ORIGINS)
+        )
+        or any(re.match(pattern, origin) for pattern in cors.CORS_ALLOWED_ORIGIN_REGEXES)
+    )
+
+
+def _cors_headers(scope, preflight=False):
+    origin = _header(scope, b'origin')
+    if not origin or not _origin_allowed(origin):
+        return [(b'vary', b'origin')]
+    allow_origin = '*' if cors.CORS_ALLOW_ALL_ORIGINS and not cors.CORS_ALLOW_CREDENTIALS else origin
+    headers = [(b'vary', b'origin'), (b'access-control-allow-origin', allow_origin.encode('latin-1'))]
+    if cors.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-credentials', b'true'))
+    if preflight:
+        headers += [
+            (b'access-control-allow-headers', ', '.join(cors.CORS_ALLOW_HEADERS).encode('latin-1')),
+            (b'access-control-allow-methods', b'GET, OPTIONS'),
+            (b'access-control-max-age', str(cors.CORS_PREFLIGHT_MAX_AGE).encode()),
+        ]
+    return headers
+
+
+def _format(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+async def _respond(scope, send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *_cors_headers(scope)],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+def _initial_events():
+    """Compteurs du jour à l'ouverture du flux (Redis, ou agrégats au premier chargement)"""
+    today = timezone.localdate()
+    days, _ = live_counters.read([today], names=False)
+    return [
+        {'type': 'counters', 'date': today.isoformat(), 'department': department, 'counters': counters}
+        for department, counters in days[today].items()
+    ]
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(scope, receive, send, broadcaster=broadcaster):
+    """Application ASGI du flux SSE"""
+    if scope['method'] == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 200, 'headers': _cors_headers(scope, True)})
+        return await send({'type': 'http.response.body', 'body': b''})
+    if scope['method'] != 'GET':
+        return await _respond(scope, send, 405, 'Method not allowed')
+    if not await sync_to_async(_authenticated)(scope):
+        return await _respond(scope, send, 401, 'Authentication credentials were not provided or are invalid')
+    if live_counters.get_client() is None:
+        return await _respond(scope, send, 503, 'Live feed unavailable')
+
+    subscriber = broadcaster.subscribe()
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                *_cors_headers(scope),
+            ],
+        })
+        initial = await sync_to_async(_initial_events)()
+        await send({
+            'type': 'http.response.body',
+            'body': b''.join(_format(event) for event in initial),
+            'more_body': True,
+        })
+        while not disconnected.done():
+            ready = asyncio.ensure_future(subscriber.ready.wait())
+            await asyncio.wait({ready, disconnected}, timeout=KEEPALIVE_INTERVAL,
+                               return_when=asyncio.FIRST_COMPLETED)
+            ready.cancel()
+            if disconnected.done():
+                break
+            if subscriber.ready.is_set():
+                # Les événements arrivés pendant l'attente sont fusionnés
+                await asyncio.sleep(FLUSH_INTERVAL)
+                body = b''.join(_format(event) for event in subscriber.drain())
+            else:
+                body = b': keepalive\n\n'
+            # send attend que le client lise : la file se fusionne pendant ce temps
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from attendance import absences
+
+
+class Command(BaseCommand):
+    help = "Crée les présences ABSENT des employés planifiés sans pointage ni congé approuvé"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Premier jour (YYYY-MM-DD), par défaut hier')
+        parser.add_argument('--end', help='Dernier jour (YYYY-MM-DD), par défaut hier')
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else yesterday
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else yesterday
+        except ValueError:
+            raise CommandError('Format de date invalide (YYYY-MM-DD)')
+
+        if start > end:
+            raise CommandError('--start doit précéder --end')
+        if end > yesterday:
+            raise CommandError("Seuls les jours révolus (jusqu'à hier) sont matérialisés")
+
+        results = absences.materialize_range(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(results.values())} absences créées sur {len(results)} jours ({start} - {end})'
+        ))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from attendance import retention
+
+
+class Command(BaseCommand):
+    help = "Supprime les QR codes temporaires expirés par plages de clés primaires"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.QR_PURGE_CHUNK_SIZE)
+        parser.add_argument('--sleep', type=float, default=settings.QR_PURGE_SLEEP,
+                            help='Pause entre deux plages (en secondes)')
+        parser.add_argument('--retention', type=int, default=settings.QR_PURGE_RETENTION,
+                            help='Conserver les codes expirés depuis moins de N secondes')
+        parser.add_argument('--max-seconds', type=float, default=None,
+                            help="Arrêter après N secondes (reprise au prochain passage)")
+
+    def handle(self, *args, **options):
+        report = retention.purge_qr_codes(
+            chunk_size=options['chunk_size'],
+            sleep=options['sleep'],
+            retention=options['retention'],
+            max_seconds=options['max_seconds']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['deleted']} QR codes supprimés en {report['chunks']} plages ({report['seconds']} s)"
+        ))
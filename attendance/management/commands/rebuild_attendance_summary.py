@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from attendance import rollup
+from attendance.models import Attendance
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats journaliers de présence (DailyAttendanceSummary)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Premier jour (YYYY-MM-DD), par défaut la première présence')
+        parser.add_argument('--end', help="Dernier jour (YYYY-MM-DD), par défaut aujourd'hui")
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else (
+                Attendance.objects.order_by('date').values_list('date', flat=True).first()
+            )
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('Format de date invalide (YYYY-MM-DD)')
+
+        if start is None:
+            self.stdout.write('Aucune présence enregistrée')
+            return
+        if start > end:
+            raise CommandError('--start doit précéder --end')
+
+        days = rollup.rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'{days} jours recalculés ({start} - {end})'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_syncchange'),
+        ('attendance', '0002_punchevent_attendance_date_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='temporaryqrcode',
+            index=models.Index(fields=['expiry'], name='qr_code_expiry_idx'),
+        ),
+    ]
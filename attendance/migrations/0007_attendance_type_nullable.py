@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+def clear_empty_types(apps, schema_editor):
+    # Absences matérialisées avec un type vide (hors des choix)
+    Attendance = apps.get_model('attendance', 'Attendance')
+    Attendance.objects.filter(attendance_type='').update(attendance_type=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_attendance_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendance',
+            name='attendance_type',
+            field=models.CharField(blank=True, choices=[('QR', 'QR Code'), ('NFC', 'NFC Card'), ('FACE', 'Face Recognition')], max_length=4, null=True),
+        ),
+        migrations.RunPython(clear_empty_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:15
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def drop_duplicated_days(apps, schema_editor):
+    # Jours comptés deux fois (lignes sans département en double) : les
+    # agrégats du jour sont supprimés puis recalculés à la prochaine lecture
+    DailyAttendanceSummary = apps.get_model('attendance', 'DailyAttendanceSummary')
+    dates = DailyAttendanceSummary.objects.filter(department__isnull=True).values('date').annotate(
+        rows=Count('id')
+    ).filter(rows__gt=1).values_list('date', flat=True)
+    DailyAttendanceSummary.objects.filter(date__in=list(dates)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_syncchange_version'),
+        ('attendance', '0007_attendance_type_nullable'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicated_days, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyattendancesummary',
+            constraint=models.UniqueConstraint(models.F('date'), django.db.models.functions.comparison.Coalesce(models.F('department'), models.Value(0)), name='summary_date_department_uniq'),
+        ),
+    ]
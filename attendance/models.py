@@ -2,7 +2,9 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime, timedelta
-from accounts.models import Employee
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from accounts.models import Department, Employee
 
 class Attendance(models.Model):
     ATTENDANCE_TYPES = [
@@ -19,15 +21,20 @@ class Attendance(models.Model):
     ]
 
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=timezone.localdate)
     check_in = models.DateTimeField(null=True, blank=True)
     check_out = models.DateTimeField(null=True, blank=True)
-    attendance_type = models.CharField(max_length=4, choices=ATTENDANCE_TYPES)
+    # Vide pour une absence matérialisée (aucun pointage)
+    attendance_type = models.CharField(max_length=4, choices=ATTENDANCE_TYPES, null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
     late_reason = models.TextField(blank=True)
     
     class Meta:
         unique_together = ['employee', 'date']
+        indexes = [
+            # Lectures par période (agrégats, export paie) et pagination par curseur
+            models.Index(fields=['date', 'id'], name='attendance_date_id_idx')
+        ]
 
 class TemporaryQRCode(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
@@ -38,5 +45,54 @@ class TemporaryQRCode(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     used_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expiry'], name='qr_code_expiry_idx')
+        ]
+
     def is_valid(self):
         return not self.is_used and self.expiry > datetime.now()
+
+class PunchEvent(models.Model):
+    """Pointage reçu d'un terminal, identifié par une clé d'idempotence client"""
+    ACTIONS = [
+        ('check-in', 'Check-in'),
+        ('check-out', 'Check-out')
+    ]
+
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    timestamp = models.DateTimeField()
+    result = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class DailyAttendanceSummary(models.Model):
+    """
+    Compteurs de présence agrégés par jour et par département (NULL : sans
+    département), tenus à jour par attendance.rollup.
+    """
+    date = models.DateField()
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, null=True, blank=True)
+    present = models.IntegerField(default=0)
+    late = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)
+    half_day = models.IntegerField(default=0)
+    on_leave = models.IntegerField(default=0)
+    headcount = models.IntegerField(default=0)
+    worked_seconds = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['date', 'department']
+        constraints = [
+            # unique_together ne couvre pas department NULL (NULL != NULL) ;
+            # index sur expression : pas d'index partiel sous MySQL
+            models.UniqueConstraint(
+                models.F('date'), Coalesce(models.F('department'), models.Value(0)),
+                name='summary_date_department_uniq'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.department_id}"
@@ -0,0 +1,282 @@
+# attendance/occupancy.py
+"""
+Index des employés présents sur site (check-in sans check-out), par
+département, dans Redis :
+
+    occupancy:<date>             -> set des départements occupés ("-" : sans
+                                    département) et "_built" une fois chargé
+    occupancy:<date>:<dept>      -> set des pk employés présents
+    occupancy:<date>:journal     -> liste des mouvements ("+<dept>:<pk>",
+                                    "-<dept>:<pk>") depuis le dernier chargement
+
+Tenu à jour par le moteur de pointage et les signaux de Attendance et
+Employee. Les lectures passent par un instantané en mémoire du processus
+(OCCUPANCY_SNAPSHOT_TTL secondes) : compter ne coûte rien, la liste
+d'appel ne charge que les présents (noms depuis accounts.credentials).
+Jusqu'à OCCUPANCY_CARRY_OVER_HOUR, les présents de la veille sans
+check-out (équipes de nuit) restent dans l'instantané du jour.
+
+Un jour inconnu de Redis est chargé depuis la base ; reconcile() le
+recharge pendant les heures ouvrées. Le chargement rejoue le journal des
+pointages arrivés pendant la lecture de la base et remplace l'index dans
+une transaction surveillée (WATCH) : aucun pointage concurrent n'est
+perdu. Sans Redis, l'instantané est lu dans la base.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from redis.exceptions import RedisError, WatchError
+
+from accounts import credentials
+from attendance import live_counters
+from attendance.models import Attendance
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = 'occupancy:{}'
+MEMBERS_KEY = 'occupancy:{}:{}'
+JOURNAL_KEY = 'occupancy:{}:journal'
+BUILT = '_built'
+NO_DEPARTMENT = '-'
+KEY_TTL = 2 * 24 * 3600
+REBUILD_ATTEMPTS = 3
+
+# Instantané du processus : (date, expiration, {département: frozenset(pk)})
+_snapshot = None
+
+
+def invalidate():
+    """Oublie l'instantané du processus (relu à la prochaine lecture)"""
+    global _snapshot
+    _snapshot = None
+
+
+def _token(department_id):
+    return NO_DEPARTMENT if department_id is None else str(department_id)
+
+
+def _department(token):
+    return None if token == NO_DEPARTMENT else int(token)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _days():
+    """Jours dont les présents comptent aujourd'hui : le jour courant et la veille"""
+    today = timezone.localdate()
+    return today, today - timedelta(days=1)
+
+
+def update(date, people):
+    """
+    Ajoute ou retire des employés des présents d'un jour (jour courant ou
+    veille). people : [(pk employé, département, présent)].
+    """
+    client = live_counters.get_client()
+    if client is None or date not in _days() or not people:
+        return
+    day = date.isoformat()
+    index, journal = INDEX_KEY.format(day), JOURNAL_KEY.format(day)
+    try:
+        pipe = client.pipeline(transaction=False)
+        # Journal d'abord : un rebuild() qui s'intercale est relancé par son WATCH
+        pipe.rpush(journal, *(
+            f'{"+" if present else "-"}{_token(department_id)}:{employee_id}'
+            for employee_id, department_id, present in people
+        ))
+        pipe.expire(journal, KEY_TTL)
+        for employee_id, department_id, present in people:
+            members = MEMBERS_KEY.format(day, _token(department_id))
+            if present:
+                pipe.sadd(members, employee_id)
+                pipe.sadd(index, _token(department_id))
+                pipe.expire(members, KEY_TTL)
+            else:
+                pipe.srem(members, employee_id)
+        pipe.expire(index, KEY_TTL)
+        pipe.execute()
+    except RedisError:
+        # Le pointage ne doit pas échouer pour l'index : reconcile() le corrige
+        logger.warning('Index de présence non mis à jour', exc_info=True)
+    invalidate()
+
+
+def move(employee_id, old_department_id, new_department_id):
+    """Suit le changement de département d'un employé présent (jour courant et veille)"""
+    client = live_counters.get_client()
+    if client is None:
+        return
+    try:
+        for date in _days():
+            day = date.isoformat()
+            old = MEMBERS_KEY.format(day, _token(old_department_id))
+            new = MEMBERS_KEY.format(day, _token(new_department_id))
+            if client.smove(old, new, employee_id):
+                journal = JOURNAL_KEY.format(day)
+                pipe = client.pipeline(transaction=False)
+                pipe.rpush(journal, f'-{_token(old_department_id)}:{employee_id}',
+                           f'+{_token(new_department_id)}:{employee_id}')
+                pipe.expire(journal, KEY_TTL)
+                pipe.sadd(INDEX_KEY.format(day), _token(new_department_id))
+                pipe.expire(new, KEY_TTL)
+                pipe.execute()
+    except RedisError:
+        logger.warning('Index de présence non mis à jour', exc_info=True)
+    invalidate()
+
+
+def _from_database(date):
+    present = {}
+    for employee_id, department_id in Attendance.objects.filter(
+        date=date, check_in__isnull=False, check_out__isnull=True
+    ).values_list('employee_id', 'employee__department_id'):
+        present.setdefault(department_id, set()).add(employee_id)
+    return {department_id: frozenset(members) for department_id, members in present.items()}
+
+
+def _replay(present, entries):
+    """Applique à des présents lus en base les mouvements du journal"""
+    present = {department_id: set(members) for department_id, members in present.items()}
+    for entry in entries:
+        entry = _decode(entry)
+        token, employee_id = entry[1:].rsplit(':', 1)
+        members = present.setdefault(_department(token), set())
+        if entry[0] == '+':
+            members.add(int(employee_id))
+        else:
+            members.discard(int(employee_id))
+    return {department_id: frozenset(members) for department_id, members in present.items() if members}
+
+
+def rebuild(date=None, client=None):
+    """
+    Recharge les présents d'un jour depuis la base, en rejouant les
+    pointages journalisés pendant la lecture. Le remplacement est relancé
+    si un pointage arrive avant son exécution.
+    """
+    date = date or timezone.localdate()
+    client = client or live_counters.get_client()
+    if client is None:
+        invalidate()
+        return _from_database(date)
+    day = date.isoformat()
+    index, journal = INDEX_KEY.format(day), JOURNAL_KEY.format(day)
+    for attempt in range(REBUILD_ATTEMPTS):
+        start = client.llen(journal)
+        present = _from_database(date)
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(journal)
+                present = _replay(present, pipe.lrange(journal, start, -1))
+                stale = [MEMBERS_KEY.format(day, _decode(token)) for token in pipe.smembers(index)]
+                pipe.multi()
+                pipe.delete(index, journal, *stale)
+                for department_id, members in present.items():
+                    key = MEMBERS_KEY.format(day, _token(department_id))
+                    pipe.sadd(key, *members)
+                    pipe.expire(key, KEY_TTL)
+                pipe.sadd(index, BUILT, *(_token(department_id) for department_id in present))
+                pipe.expire(index, KEY_TTL)
+                pipe.execute()
+                break
+            except WatchError:
+                continue
+    else:
+        # Index laissé tel quel : la prochaine réconciliation le recharge
+        logger.warning('Index de présence du %s non rechargé (pointages concurrents)', day)
+    invalidate()
+    return present
+
+
+def _read(date):
+    client = live_counters.get_client()
+    if client is None:
+        return _from_database(date)
+    try:
+        tokens = {_decode(token) for token in client.smembers(INDEX_KEY.format(date.isoformat()))}
+        if BUILT not in tokens:
+            return rebuild(date, client)
+        tokens.discard(BUILT)
+        pipe = client.pipeline(transaction=False)
+        for token in tokens:
+            pipe.smembers(MEMBERS_KEY.format(date.isoformat(), token))
+        present = {}
+        for token, members in zip(tokens, pipe.execute()):
+            if members:
+                present[_department(token)] = frozenset(int(member) for member in members)
+        return present
+    except RedisError:
+        logger.warning('Index de présence illisible, lecture de la base', exc_info=True)
+        return _from_database(date)
+
+
+def _carry_over():
+    """Vrai tant que les présents de la veille sans check-out comptent encore"""
+    return timezone.localtime().hour < settings.OCCUPANCY_CARRY_OVER_HOUR
+
+
+def _merge(present, carried):
+    present = dict(present)
+    for department_id, members in carried.items():
+        present[department_id] = present.get(department_id, frozenset()) | members
+    return present
+
+
+def _current():
+    today, yesterday = _days()
+    present = _read(today)
+    if _carry_over():
+        present = _merge(present, _read(yesterday))
+    return present
+
+
+def snapshot():
+    """Présents sur site par département : {département: frozenset(pk)}"""
+    global _snapshot
+    today = timezone.localdate()
+    now = time.monotonic()
+    if _snapshot is None or _snapshot[0] != today or _snapshot[1] <= now:
+        _snapshot = (today, now + settings.OCCUPANCY_SNAPSHOT_TTL, _current())
+    return _snapshot[2]
+
+
+def counts():
+    """Nombre de présents par département"""
+    return {department_id: len(members) for department_id, members in snapshot().items()}
+
+
+def roll_call(department_id=None):
+    """
+    Liste d'appel des présents, triée par département puis par nom :
+    [{'employee_id', 'name', 'department_id', 'department'}].
+    """
+    present = snapshot()
+    if department_id is not None:
+        present = {department_id: present.get(department_id, frozenset())}
+    entries = credentials.lookup(pk for members in present.values() for pk in members)
+    names = live_counters.department_names()
+    people = [
+        {
+            'employee_id': pk,
+            'name': entries[pk]['name'] if pk in entries else '',
+            'department_id': department,
+            'department': names.get(department, ''),
+        }
+        for department, members in present.items() for pk in members
+    ]
+    people.sort(key=lambda person: (person['department'], person['name'], person['employee_id']))
+    return people
+
+
+def reconcile():
+    """Recharge les présents du jour et de la veille depuis la base (tâche périodique)"""
+    today, yesterday = _days()
+    present = rebuild(today)
+    if _carry_over():
+        present = _merge(present, rebuild(yesterday))
+    return sum(len(members) for members in present.values())
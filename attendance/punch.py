@@ -0,0 +1,383 @@
+# attendance/punch.py
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+
+from accounts import schedule_cache
+from accounts.models import Employee
+from attendance import live_counters, occupancy, report_cache, rollup
+from attendance.models import Attendance, PunchEvent
+
+# Taille maximale d'un lot de pointages hors ligne
+MAX_BATCH_EVENTS = 10000
+# Taille des listes IN et des lots d'écriture
+CHUNK_SIZE = 1000
+# Écritures d'un lot rejouées après une présence créée en concurrence
+MAX_ATTEMPTS = 3
+
+
+class PunchError(Exception):
+    """Pointage refusé (message renvoyé au client et code HTTP)"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _employee_pk(employee_id):
+    try:
+        return int(employee_id)
+    except (TypeError, ValueError):
+        raise PunchError('Employee not found', status.HTTP_404_NOT_FOUND)
+
+
+def _check_in_sql():
+    """
+    Upsert du check-in : en cas de conflit sur (employee, date), seul un
+    check-in vide est rempli, la ligne existante reste inchangée sinon.
+    """
+    qn = connection.ops.quote_name
+    attendance = qn(Attendance._meta.db_table)
+
+    insert = (
+        f"INSERT INTO {attendance} "
+        f"({qn('employee_id')}, {qn('date')}, {qn('check_in')}, "
+        f"{qn('attendance_type')}, {qn('status')}, {qn('late_reason')}) "
+        f"VALUES (%s, %s, %s, %s, %s, '') "
+    )
+
+    if connection.vendor == 'mysql':
+        return insert + (
+            f"ON DUPLICATE KEY UPDATE "
+            f"{qn('attendance_type')} = IF({qn('check_in')} IS NULL, "
+            f"VALUES({qn('attendance_type')}), {qn('attendance_type')}), "
+            f"{qn('status')} = IF({qn('check_in')} IS NULL, "
+            f"VALUES({qn('status')}), {qn('status')}), "
+            f"{qn('check_in')} = IFNULL({qn('check_in')}, VALUES({qn('check_in')}))"
+        )
+
+    # SQLite / PostgreSQL
+    return insert + (
+        f"ON CONFLICT ({qn('employee_id')}, {qn('date')}) DO UPDATE SET "
+        f"{qn('attendance_type')} = CASE WHEN {attendance}.{qn('check_in')} IS NULL "
+        f"THEN excluded.{qn('attendance_type')} ELSE {attendance}.{qn('attendance_type')} END, "
+        f"{qn('status')} = CASE WHEN {attendance}.{qn('check_in')} IS NULL "
+        f"THEN excluded.{qn('status')} ELSE {attendance}.{qn('status')} END, "
+        f"{qn('check_in')} = COALESCE({attendance}.{qn('check_in')}, excluded.{qn('check_in')})"
+    )
+
+
+def classify(start_time, check_in_time):
+    """Statut d'un check-in par rapport à l'heure de début du planning"""
+    return 'LATE' if check_in_time > start_time else 'PRESENT'
+
+
+def _publish(action, attendance, timestamp):
+    """Pointage diffusé aux tableaux de bord connectés au flux live"""
+    live_counters.publish(
+        'punch',
+        action=action,
+        employee=attendance.employee_id,
+        department=attendance.department_id,
+        status=attendance.status,
+        timestamp=timestamp.isoformat(),
+    )
+
+
+def check_in(employee_id, attendance_type, now=None):
+    """
+    Enregistre un check-in en un seul upsert atomique, relit la ligne puis
+    met à jour l'agrégat du jour (4 requêtes : statut déjà compté, upsert,
+    relecture faute de RETURNING sous MySQL, agrégat). Le planning du jour
+    vient du cache des plannings. Deux terminaux concurrents ne peuvent plus
+    violer la contrainte unique (employee, date).
+    """
+    employee_pk = _employee_pk(employee_id)
+    # L'upsert brut ne passe pas par la validation du modèle
+    if attendance_type not in dict(Attendance.ATTENDANCE_TYPES):
+        raise PunchError('Invalid type')
+    now = now or timezone.now()
+    # Jour et heure du planning en heure locale (TIME_ZONE), comme Attendance.date
+    local = timezone.localtime(now)
+    today = local.date()
+
+    slot = schedule_cache.get_day_slot(employee_pk, today.weekday())
+    if slot is None:
+        if not Employee.objects.filter(pk=employee_pk).exists():
+            raise PunchError('Employee not found', status.HTTP_404_NOT_FOUND)
+        raise PunchError('No schedule found for today', status.HTTP_404_NOT_FOUND)
+
+    # Une ligne sans check-in peut déjà porter un statut compté (absence
+    # matérialisée, saisie manuelle) : il est retiré de l'agrégat
+    previous = Attendance.objects.filter(employee_id=employee_pk, date=today).values_list(
+        'status', 'check_in'
+    ).first()
+    if previous and previous[1] is not None:
+        raise PunchError('Already checked in today')
+
+    with connection.cursor() as cursor:
+        cursor.execute(_check_in_sql(), [
+            employee_pk,
+            connection.ops.adapt_datefield_value(today),
+            connection.ops.adapt_datetimefield_value(now),
+            attendance_type,
+            classify(slot[0], local.time()),
+        ])
+
+    attendance = Attendance.objects.annotate(
+        department_id=F('employee__department_id')
+    ).get(employee_id=employee_pk, date=today)
+    if attendance.check_in != now:
+        raise PunchError('Already checked in today')
+
+    old = rollup.contribution(previous[0], None, None) if previous else {}
+    rollup.apply(
+        today, attendance.department_id,
+        rollup.difference(rollup.contribution(attendance.status, None, None), old)
+    )
+    report_cache.bump(today)
+    occupancy.update(today, [(employee_pk, attendance.department_id, True)])
+    _publish('check-in', attendance, now)
+    return attendance
+
+
+def check_out(employee_id, now=None):
+    """Enregistre un check-out par un UPDATE conditionnel, relit la ligne et met à jour l'agrégat"""
+    employee_pk = _employee_pk(employee_id)
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+
+    attendances = Attendance.objects.filter(employee_id=employee_pk, date=today)
+    if attendances.filter(check_out__isnull=True).update(check_out=now):
+        attendance = attendances.annotate(department_id=F('employee__department_id')).get()
+        rollup.apply(today, attendance.department_id, rollup.contribution(None, attendance.check_in, now))
+        report_cache.bump(today)
+        occupancy.update(today, [(employee_pk, attendance.department_id, False)])
+        _publish('check-out', attendance, now)
+        return attendance
+
+    if attendances.exists():
+        raise PunchError('Already checked out today')
+    if not Employee.objects.filter(pk=employee_pk).exists():
+        raise PunchError('Employee not found', status.HTTP_404_NOT_FOUND)
+    raise PunchError('No check-in found for today', status.HTTP_404_NOT_FOUND)
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _parse_event(event):
+    """Valide un pointage hors ligne. Retourne (clé, employé, action, horodatage, type)"""
+    if not isinstance(event, dict):
+        raise ValueError('Invalid event')
+
+    key = event.get('idempotency_key')
+    if not key or not isinstance(key, str) or len(key) > 100:
+        raise ValueError('Invalid idempotency_key')
+
+    action = event.get('action')
+    if action not in ('check-in', 'check-out'):
+        raise ValueError('Invalid action')
+
+    try:
+        employee_pk = int(event.get('employee_id'))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid employee_id')
+
+    timestamp = event.get('timestamp')
+    timestamp = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+    if timestamp is None:
+        raise ValueError('Invalid timestamp')
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+
+    attendance_type = event.get('type', '')
+    if action == 'check-in' and attendance_type not in dict(Attendance.ATTENDANCE_TYPES):
+        raise ValueError('Invalid type')
+
+    # Heure locale : jour, jour de la semaine et retard comme pour check_in
+    return key, employee_pk, action, timezone.localtime(timestamp), attendance_type
+
+
+class _Conflict(Exception):
+    """Présence créée par un pointage concurrent pendant l'écriture du lot"""
+
+
+def _apply_events(parsed, processed, known_employees, weeks, results):
+    """
+    Applique les pointages du lot aux présences verrouillées (select_for_update)
+    et les écrit ; à appeler dans une transaction. Seuls les champs modifiés
+    sont réécrits. Retourne (présences touchées, leur part dans les agrégats
+    avant modification).
+    """
+    dates = {item[4].date() for item in parsed}
+    attendances = {}
+    for pks in _chunks(known_employees):
+        for attendance in Attendance.objects.select_for_update().filter(
+            employee_id__in=pks, date__in=dates
+        ).order_by('pk'):
+            attendances[(attendance.employee_id, attendance.date)] = attendance
+
+    created, changed, punch_events = {}, {}, []
+    # Part de chaque présence touchée dans les agrégats, avant modification
+    before = {}
+    for index, key, employee_pk, action, timestamp, attendance_type in sorted(parsed, key=lambda item: item[4]):
+        if key in processed:
+            results[index] = {'idempotency_key': key, 'status': 'duplicate', 'result': processed[key]}
+            continue
+        if employee_pk not in known_employees:
+            results[index] = {'idempotency_key': key, 'status': 'rejected', 'error': 'Employee not found'}
+            continue
+
+        day = timestamp.date()
+        attendance = attendances.get((employee_pk, day))
+        if attendance and (employee_pk, day) not in before:
+            before[(employee_pk, day)] = rollup.contribution(
+                attendance.status, attendance.check_in, attendance.check_out
+            )
+        error = None
+
+        if action == 'check-in':
+            slot = weeks[employee_pk][day.weekday()]
+            if slot is None:
+                error = 'No schedule found for today'
+            elif attendance and attendance.check_in:
+                error = 'Already checked in today'
+            else:
+                if attendance is None:
+                    attendance = Attendance(employee_id=employee_pk, date=day)
+                    attendances[(employee_pk, day)] = attendance
+                    created[(employee_pk, day)] = attendance
+                    before[(employee_pk, day)] = {}
+                elif attendance.pk:
+                    changed.setdefault(attendance.pk, set()).update(('check_in', 'attendance_type', 'status'))
+                attendance.check_in = timestamp
+                attendance.attendance_type = attendance_type
+                attendance.status = classify(slot[0], timestamp.time())
+        else:
+            if attendance is None:
+                error = 'No check-in found for today'
+            elif attendance.check_out:
+                error = 'Already checked out today'
+            else:
+                if attendance.pk:
+                    changed.setdefault(attendance.pk, set()).add('check_out')
+                attendance.check_out = timestamp
+
+        result = error or 'applied'
+        punch_events.append(PunchEvent(
+            idempotency_key=key,
+            employee_id=employee_pk,
+            action=action,
+            timestamp=timestamp,
+            result=result
+        ))
+        if error:
+            results[index] = {'idempotency_key': key, 'status': 'rejected', 'error': error}
+        else:
+            results[index] = {'idempotency_key': key, 'status': 'applied'}
+
+    # Une ligne insérée entre-temps par un pointage en ligne n'est pas écrasée
+    Attendance.objects.bulk_create(created.values(), batch_size=CHUNK_SIZE, ignore_conflicts=True)
+    for keys in _chunks(created):
+        for row in Attendance.objects.select_for_update().filter(
+            employee_id__in={employee_pk for employee_pk, _ in keys}, date__in={day for _, day in keys}
+        ).values('pk', 'employee_id', 'date', 'check_in', 'check_out', 'attendance_type', 'status'):
+            attendance = created.get((row['employee_id'], row['date']))
+            if attendance is None:
+                continue
+            if (row['check_in'], row['check_out'], row['attendance_type'], row['status']) != (
+                attendance.check_in, attendance.check_out, attendance.attendance_type, attendance.status
+            ):
+                raise _Conflict()
+            attendance.pk = row['pk']
+
+    # Un bulk_update par ensemble de champs modifiés
+    groups = {}
+    for pk, fields in changed.items():
+        groups.setdefault(tuple(sorted(fields)), []).append(pk)
+    by_pk = {attendance.pk: attendance for attendance in attendances.values() if attendance.pk}
+    for fields, pks in groups.items():
+        Attendance.objects.bulk_update([by_pk[pk] for pk in pks], fields, batch_size=CHUNK_SIZE)
+    PunchEvent.objects.bulk_create(punch_events, batch_size=CHUNK_SIZE, ignore_conflicts=True)
+    return attendances, before
+
+
+def ingest_events(events):
+    """
+    Rejoue un lot de pointages bufferisés par un terminal.
+    Les employés et clés déjà traitées sont chargés par requêtes IN, les
+    plannings par le cache des plannings. Dans une transaction, les présences
+    existantes sont verrouillées, les événements appliqués en mémoire dans
+    l'ordre chronologique puis écrits par bulk_create/bulk_update ; le lot est
+    rejoué si un pointage concurrent a créé une présence entre-temps.
+    Retourne un résultat par événement, dans l'ordre reçu.
+    """
+    results = [None] * len(events)
+    parsed = []
+    seen_keys = set()
+
+    for index, event in enumerate(events):
+        try:
+            key, employee_pk, action, timestamp, attendance_type = _parse_event(event)
+        except ValueError as e:
+            key = event.get('idempotency_key') if isinstance(event, dict) else None
+            results[index] = {'idempotency_key': key, 'status': 'invalid', 'error': str(e)}
+            continue
+
+        if key in seen_keys:
+            results[index] = {'idempotency_key': key, 'status': 'duplicate'}
+            continue
+        seen_keys.add(key)
+        parsed.append((index, key, employee_pk, action, timestamp, attendance_type))
+
+    # Clés déjà rejouées : renvoyer le résultat d'origine
+    processed = {}
+    for keys in _chunks(seen_keys):
+        processed.update(
+            PunchEvent.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', 'result')
+        )
+
+    employee_pks = {item[2] for item in parsed}
+    departments = {}
+    for pks in _chunks(employee_pks):
+        departments.update(Employee.objects.filter(pk__in=pks).values_list('pk', 'department_id'))
+    known_employees = set(departments)
+    weeks = schedule_cache.get_weekly_schedules(known_employees)
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                attendances, before = _apply_events(parsed, processed, known_employees, weeks, results)
+            break
+        except _Conflict:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise PunchError('Concurrent punches, retry the batch', status.HTTP_409_CONFLICT)
+
+    # Un UPDATE d'agrégat par (jour, département) touché
+    deltas = {}
+    for (employee_pk, day), old in before.items():
+        attendance = attendances[(employee_pk, day)]
+        new = rollup.contribution(attendance.status, attendance.check_in, attendance.check_out)
+        delta = deltas.setdefault((day, departments[employee_pk]), {})
+        for field, value in rollup.difference(new, old).items():
+            delta[field] = delta.get(field, 0) + value
+    for (day, department_id), delta in deltas.items():
+        rollup.apply(day, department_id, delta)
+    # Événements différés sur des jours passés
+    report_cache.bump(*(day for day, _ in deltas))
+    # update() ignore les jours autres que le jour courant et la veille
+    for touched in {day for _, day in before}:
+        occupancy.update(touched, [
+            (employee_pk, departments[employee_pk], bool(attendance.check_in and not attendance.check_out))
+            for (employee_pk, day), attendance in attendances.items()
+            if day == touched and (employee_pk, day) in before
+        ])
+
+    return results
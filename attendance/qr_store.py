@@ -0,0 +1,189 @@
+# attendance/qr_store.py
+import json
+import secrets
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from attendance.models import TemporaryQRCode
+
+# Durée de validité d'un QR code (en secondes)
+QR_CODE_TTL = 30
+
+
+@dataclass
+class QRToken:
+    code: str
+    employee_id: int
+    purpose: str
+    expiry: datetime
+
+
+class BaseQRTokenStore:
+    """Interface commune des backends de stockage des QR codes"""
+
+    def issue(self, employee, purpose='check-in', ttl=QR_CODE_TTL):
+        """Crée un nouveau code et invalide les codes actifs de l'employé"""
+        raise NotImplementedError
+
+    def consume(self, code):
+        """Consomme un code une seule fois. Retourne un QRToken ou None"""
+        raise NotImplementedError
+
+
+class DatabaseQRTokenStore(BaseQRTokenStore):
+    """Backend historique basé sur la table TemporaryQRCode"""
+
+    def issue(self, employee, purpose='check-in', ttl=QR_CODE_TTL):
+        now = timezone.now()
+
+        # Désactiver les anciens QR codes de l'employé
+        TemporaryQRCode.objects.filter(
+            employee=employee,
+            is_used=False,
+            expiry__gt=now
+        ).update(is_used=True)
+
+        qr_code = TemporaryQRCode.objects.create(
+            employee=employee,
+            code=str(uuid.uuid4()),
+            purpose=purpose,
+            expiry=now + timedelta(seconds=ttl),
+            is_used=False
+        )
+        return QRToken(qr_code.code, employee.pk, qr_code.purpose, qr_code.expiry)
+
+    def consume(self, code):
+        now = timezone.now()
+
+        # UPDATE conditionnel : une seule requête concurrente peut consommer le code
+        consumed = TemporaryQRCode.objects.filter(
+            code=code,
+            is_used=False,
+            expiry__gt=now
+        ).update(is_used=True, used_at=now)
+        if not consumed:
+            return None
+
+        qr_code = TemporaryQRCode.objects.only(
+            'code', 'employee_id', 'purpose', 'expiry'
+        ).get(code=code)
+        return QRToken(qr_code.code, qr_code.employee_id, qr_code.purpose, qr_code.expiry)
+
+
+class RedisQRTokenStore(BaseQRTokenStore):
+    """
+    Backend Redis : aucune écriture en base par code émis.
+    - qr:code:<code>        -> payload JSON, expire avec le code
+    - qr:employee:<id>      -> code actif de l'employé
+    """
+    code_key = 'qr:code:{}'
+    employee_key = 'qr:employee:{}'
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from django_redis import get_redis_connection
+            self._client = get_redis_connection('default')
+        return self._client
+
+    def issue(self, employee, purpose='check-in', ttl=QR_CODE_TTL):
+        code = str(uuid.uuid4())
+        expiry = timezone.now() + timedelta(seconds=ttl)
+        payload = json.dumps({
+            'employee_id': employee.pk,
+            'purpose': purpose,
+            'expiry': expiry.isoformat()
+        })
+
+        # Le code est écrit avant de devenir le code actif ; SET ... GET remplace
+        # atomiquement le pointeur et renvoie le code précédent à supprimer.
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self.code_key.format(code), payload, ex=ttl)
+        pipe.set(self.employee_key.format(employee.pk), code, ex=ttl, get=True)
+        _, previous = pipe.execute()
+
+        if previous:
+            if isinstance(previous, bytes):
+                previous = previous.decode()
+            self.client.delete(self.code_key.format(previous))
+
+        return QRToken(code, employee.pk, purpose, expiry)
+
+    def consume(self, code):
+        # GETDEL est atomique : un code ne peut être consommé qu'une fois
+        payload = self.client.getdel(self.code_key.format(code))
+        if payload is None:
+            return None
+
+        data = json.loads(payload)
+        return QRToken(
+            code,
+            data['employee_id'],
+            data['purpose'],
+            datetime.fromisoformat(data['expiry'])
+        )
+
+
+class SignedQRTokenStore(BaseQRTokenStore):
+    """
+    Codes signés (HMAC, clé serveur) portant employé, usage et expiration.
+    La vérification ne demande aucune lecture en base ; seul un ensemble
+    anti-rejeu, dont les clés expirent avec les codes, est partagé.
+    """
+    salt = 'attendance.qr'
+    used_key = 'qr:used:{}'
+
+    def issue(self, employee, purpose='check-in', ttl=QR_CODE_TTL):
+        expiry = timezone.now() + timedelta(seconds=ttl)
+        code = signing.dumps({
+            'e': employee.pk,
+            'p': purpose,
+            'x': int(expiry.timestamp()),
+            'n': secrets.token_urlsafe(6)
+        }, salt=self.salt)
+        return QRToken(code, employee.pk, purpose, expiry)
+
+    def verify(self, code):
+        """Vérifie signature et expiration, sans marquer le code comme utilisé"""
+        try:
+            data = signing.loads(code, salt=self.salt)
+        except (signing.BadSignature, TypeError):
+            return None
+
+        expiry = datetime.fromtimestamp(data['x'], tz=dt_timezone.utc)
+        if expiry <= timezone.now():
+            return None
+        return QRToken(code, data['e'], data['p'], expiry)
+
+    def consume(self, code):
+        token = self.verify(code)
+        if token is None:
+            return None
+
+        # cache.add est atomique : seul le premier scan enregistre la signature
+        remaining = int((token.expiry - timezone.now()).total_seconds()) + 1
+        signature = code.rsplit(':', 1)[-1]
+        if not cache.add(self.used_key.format(signature), 1, timeout=remaining):
+            return None
+        return token
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+def get_qr_store():
+    """Retourne le backend configuré par settings.QR_TOKEN_BACKEND"""
+    return _load_store(settings.QR_TOKEN_BACKEND)
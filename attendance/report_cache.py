@@ -0,0 +1,122 @@
+# attendance/report_cache.py
+"""
+Cache des rapports portant sur des jours clos.
+
+Un rapport dont la période se termine avant aujourd'hui est mis en cache
+longtemps sous une clé qui inclut la version de chaque jour couvert :
+
+    report:version:<date>       -> jeton changé à chaque modification du jour
+    report:version:global       -> jeton changé à chaque modification d'un département
+    report:<nom>:<empreinte>    -> rapport sérialisé (pickle)
+    report:sizes (Redis)        -> hash {clé du rapport: taille stockée}
+
+Toute écriture de présence ou de congé sur un jour passé change la
+version du jour (bump), les rapports qui le couvrent ne sont plus relus.
+Les rapports qui incluent aujourd'hui sont toujours calculés. La jauge
+report_cache.bytes somme la taille des rapports encore présents : une
+réécriture remplace la taille de la clé, les rapports expirés ou évincés
+sont retirés du hash à la lecture.
+"""
+import hashlib
+import pickle
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from attendance import live_counters
+from core import metrics
+
+GLOBAL_VERSION_KEY = 'report:version:global'
+SIZES_KEY = 'report:sizes'
+
+
+def stored_bytes():
+    """Taille des rapports encore en cache (0 sans Redis)"""
+    client = live_counters.get_client()
+    if client is None:
+        return 0
+    sizes = {_decode(key): int(size) for key, size in client.hgetall(SIZES_KEY).items()}
+    gone = [key for key in sizes if not cache.has_key(key)]
+    if gone:
+        client.hdel(SIZES_KEY, *gone)
+    return sum(size for key, size in sizes.items() if key not in gone)
+
+
+metrics.register_ratio('report_cache.hit_ratio', 'report_cache.hit', 'report_cache.miss')
+metrics.register_gauge('report_cache.bytes', stored_bytes)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _version_key(date):
+    return f'report:version:{date.isoformat()}'
+
+
+def _versions(keys):
+    found = cache.get_many(keys)
+    # Version absente (jamais créée ou évincée) : un nouveau jeton garantit
+    # qu'aucun rapport mis en cache auparavant ne sera relu.
+    for key in keys:
+        if key not in found:
+            version = uuid.uuid4().hex
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+            found[key] = version
+    return [found[key] for key in keys]
+
+
+def bump(*dates):
+    """Invalide les rapports couvrant ces jours (seuls les jours passés sont en cache)"""
+    today = timezone.localdate()
+    keys = {_version_key(date) for date in dates if date < today}
+    if keys:
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def bump_range(start, end):
+    end = min(end, timezone.localdate() - timedelta(days=1))
+    bump(*(start + timedelta(days=i) for i in range((end - start).days + 1)))
+
+
+def bump_all():
+    cache.set(GLOBAL_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def get_or_compute(name, params, start, end, compute):
+    """
+    Retourne compute() pour la période [start, end], depuis le cache si la
+    période est entièrement passée. params identifie les autres paramètres
+    du rapport (filtres).
+    """
+    if end >= timezone.localdate():
+        return compute()
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    versions = _versions([GLOBAL_VERSION_KEY, *(_version_key(day) for day in days)])
+    fingerprint = hashlib.sha256(
+        repr((sorted(params.items()), start, end, versions)).encode()
+    ).hexdigest()
+    key = f'report:{name}:{fingerprint}'
+
+    payload = cache.get(key)
+    if payload is not None:
+        metrics.incr('report_cache.hit')
+        return pickle.loads(payload)
+
+    metrics.incr('report_cache.miss')
+    data = compute()
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    cache.set(key, payload, timeout=settings.REPORT_CACHE_TTL)
+    client = live_counters.get_client()
+    if client is not None:
+        pipe = client.pipeline(transaction=False)
+        pipe.hset(SIZES_KEY, key, len(payload))
+        pipe.expire(SIZES_KEY, settings.REPORT_CACHE_TTL)
+        pipe.execute()
+    return data
+
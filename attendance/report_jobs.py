@@ -0,0 +1,204 @@
+# attendance/report_jobs.py
+"""
+Rapports longs calculés hors requête par une tâche Celery.
+
+    report-job:<id>             -> état du job (pending, running, done, failed)
+    report-job:<id>:result      -> résultat JSON compressé (zlib)
+    report-job:dedupe:<hash>    -> id du job en cours pour (type, paramètres)
+    MEDIA_ROOT/reports/<id>.json.gz -> résultat trop volumineux pour Redis
+
+Deux demandes identiques tant que le premier job n'est pas terminé
+partagent le même job.
+"""
+import calendar
+import gzip
+import hashlib
+import json
+import os
+import time
+import uuid
+import zlib
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from attendance import analytics, report_cache
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+ACTIVE_STATUSES = (PENDING, RUNNING)
+
+
+class ReportJobError(Exception):
+    pass
+
+
+def _int(params, name, default=None):
+    value = params.get(name, default)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ReportJobError(f'{name} doit être un entier')
+
+
+def _monthly_params(params):
+    today = timezone.localdate()
+    year, month = _int(params, 'year', today.year), _int(params, 'month', today.month)
+    if year is None or month is None or not 1 <= month <= 12:
+        raise ReportJobError('month doit être compris entre 1 et 12')
+    return {'year': year, 'month': month, 'department': _int(params, 'department')}
+
+
+def _trends_params(params):
+    days = _int(params, 'days', 30)
+    if days is None or not 0 < days <= analytics.TRENDS_MAX_DAYS:
+        raise ReportJobError(f'days doit être compris entre 1 et {analytics.TRENDS_MAX_DAYS}')
+    return {'days': days}
+
+
+def _yearly_params(params):
+    year = _int(params, 'year', timezone.localdate().year)
+    if year is None:
+        raise ReportJobError('year est requis')
+    return {'year': year, 'department': _int(params, 'department')}
+
+
+def _monthly(year, month, department):
+    _, last_day = calendar.monthrange(year, month)
+    start, end = date(year, month, 1), date(year, month, last_day)
+    # Même entrée de cache que MonthlyAnalyticsView
+    return report_cache.get_or_compute(
+        'monthly-analytics', {'department': str(department) if department else None},
+        start, end, lambda: analytics.monthly(year, month, department)
+    )
+
+
+def _yearly(year, department):
+    return analytics.yearly(year, department)
+
+
+# type -> (validation des paramètres, calcul)
+REPORTS = {
+    'monthly': (_monthly_params, _monthly),
+    'trends': (_trends_params, analytics.trends),
+    'yearly': (_yearly_params, _yearly),
+}
+
+
+def _job_key(job_id):
+    return f'report-job:{job_id}'
+
+
+def _result_path(job_id):
+    return os.path.join(settings.MEDIA_ROOT, 'reports', f'{job_id}.json.gz')
+
+
+def get(job_id):
+    return cache.get(_job_key(job_id))
+
+
+def _save(job):
+    cache.set(_job_key(job['id']), job, timeout=settings.REPORT_JOB_TTL)
+
+
+def submit(kind, params, enqueue):
+    """
+    Crée un job (ou retourne le job identique en cours). enqueue(job_id)
+    programme le calcul. Retourne (job, created).
+    """
+    if kind not in REPORTS:
+        raise ReportJobError(f"type de rapport inconnu, attendu : {', '.join(REPORTS)}")
+    params = REPORTS[kind][0](params)
+
+    fingerprint = hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+    dedupe_key = f'report-job:dedupe:{fingerprint}'
+    job = {
+        'id': uuid.uuid4().hex,
+        'kind': kind,
+        'params': params,
+        'status': PENDING,
+        'created_at': timezone.now().isoformat(),
+        'dedupe_key': dedupe_key,
+    }
+    if not cache.add(dedupe_key, job['id'], timeout=settings.REPORT_JOB_TTL):
+        existing = get(cache.get(dedupe_key))
+        if existing and existing['status'] in ACTIVE_STATUSES:
+            return existing, False
+        cache.set(dedupe_key, job['id'], timeout=settings.REPORT_JOB_TTL)
+
+    _save(job)
+    try:
+        enqueue(job['id'])
+    except Exception as exc:
+        _finish(job, FAILED, error=f'Mise en file impossible : {exc}')
+    return job, True
+
+
+def _finish(job, status, **values):
+    job.update(status=status, finished_at=timezone.now().isoformat(), **values)
+    _save(job)
+    # Une nouvelle demande identique recalculera le rapport
+    if cache.get(job['dedupe_key']) == job['id']:
+        cache.delete(job['dedupe_key'])
+
+
+def run(job_id):
+    """Calcule le rapport d'un job (tâche Celery)"""
+    job = get(job_id)
+    if job is None or job['status'] != PENDING:
+        return None
+    job['status'] = RUNNING
+    _save(job)
+
+    started = time.monotonic()
+    try:
+        result = REPORTS[job['kind']][1](**job['params'])
+        payload = json.dumps(result, cls=JSONEncoder).encode()
+    except Exception as exc:
+        _finish(job, FAILED, error=str(exc))
+        raise
+
+    # Petit résultat dans Redis, gros résultat en fichier compressé
+    compressed = zlib.compress(payload)
+    if len(compressed) <= settings.REPORT_JOB_INLINE_MAX_BYTES:
+        cache.set(f'{_job_key(job_id)}:result', compressed, timeout=settings.REPORT_JOB_TTL)
+        storage = 'cache'
+    else:
+        path = _result_path(job_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, 'wb') as f:
+            f.write(payload)
+        storage = 'file'
+
+    _finish(job, DONE, storage=storage, size=len(payload), seconds=round(time.monotonic() - started, 3))
+    return job_id
+
+
+def result(job):
+    """Résultat décodé d'un job terminé (None s'il a expiré)"""
+    if job['storage'] == 'cache':
+        compressed = cache.get(f'{_job_key(job["id"])}:result')
+        return json.loads(zlib.decompress(compressed)) if compressed is not None else None
+    try:
+        with gzip.open(_result_path(job['id']), 'rb') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def purge_files(max_age=None):
+    """Supprime les résultats fichiers plus anciens que max_age secondes. Retourne leur nombre"""
+    directory = os.path.join(settings.MEDIA_ROOT, 'reports')
+    max_age = settings.REPORT_JOB_TTL if max_age is None else max_age
+    limit = time.time() - max_age
+    removed = 0
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.stat().st_mtime < limit:
+                os.remove(entry.path)
+                removed += 1
+    return removed
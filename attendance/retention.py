@@ -0,0 +1,53 @@
+# attendance/retention.py
+"""
+Purge de la table TemporaryQRCode.
+
+Les codes expirés sont supprimés par plages de clés primaires bornées
+(chunk_size ids par DELETE) avec une pause entre deux plages, pour ne pas
+verrouiller la table ni faire prendre de retard aux réplicas. Un code
+utilisé expire au plus QR_CODE_TTL secondes après son émission : le
+critère d'expiration couvre donc aussi les codes consommés.
+"""
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from attendance.models import TemporaryQRCode
+from core import metrics
+
+metrics.register('qr_purge.deleted')
+
+
+def purge_qr_codes(chunk_size=5000, sleep=0.1, retention=0, max_seconds=None):
+    """
+    Supprime les codes expirés depuis plus de retention secondes.
+    Retourne {'deleted', 'chunks', 'seconds'}.
+    """
+    started = time.monotonic()
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    expired = TemporaryQRCode.objects.filter(expiry__lt=cutoff)
+
+    # Bornes de la plage à parcourir : lues sur l'index expiry, sans balayage
+    low = expired.order_by('id').values_list('id', flat=True).first()
+    high = expired.order_by('-expiry').values_list('id', flat=True).first()
+
+    deleted = chunks = 0
+    while low is not None and low <= high:
+        count, _ = expired.filter(id__gte=low, id__lt=low + chunk_size).delete()
+        deleted += count
+        chunks += 1
+        low += chunk_size
+
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            break
+        if sleep and low <= high:
+            time.sleep(sleep)
+
+    if deleted:
+        metrics.incr('qr_purge.deleted', deleted)
+    return {
+        'deleted': deleted,
+        'chunks': chunks,
+        'seconds': round(time.monotonic() - started, 3)
+    }
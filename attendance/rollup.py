@@ -0,0 +1,271 @@
+# attendance/rollup.py
+"""
+Agrégats journaliers de présence (DailyAttendanceSummary).
+
+Une ligne par (date, département) porte les compteurs par statut, les
+employés en congé, l'effectif actif et le temps travaillé. Les lignes d'un
+jour sont calculées depuis la base au premier besoin (premier pointage ou
+première lecture), puis chaque écriture sur une présence applique un delta
+par UPDATE ... SET n = n + d. Les rapports lisent ces lignes au lieu de
+recompter Attendance ; rebuild() recalcule une période.
+"""
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from accounts.models import Department, Employee
+from attendance import live_counters, report_cache
+from attendance.models import Attendance, DailyAttendanceSummary
+from leave.models import Leave
+
+FIELDS = ('present', 'late', 'absent', 'half_day', 'on_leave', 'headcount', 'worked_seconds')
+STATUS_FIELDS = {'PRESENT': 'present', 'LATE': 'late', 'ABSENT': 'absent', 'HALF_DAY': 'half_day'}
+SUMS = {field: Sum(field) for field in FIELDS}
+
+# Nombre de jours calculés par lot
+BUILD_CHUNK_DAYS = 92
+BUILD_LOCK = 'rollup:build:{}'
+BUILD_LOCK_TIMEOUT = 30
+BUILD_LOCK_WAIT = 0.05
+
+
+def contribution(status, check_in, check_out):
+    """Part d'une présence dans les compteurs de son jour"""
+    values = {}
+    field = STATUS_FIELDS.get(status)
+    if field:
+        values[field] = 1
+    if check_in and check_out and check_out > check_in:
+        values['worked_seconds'] = int((check_out - check_in).total_seconds())
+    return values
+
+
+def difference(new, old):
+    return {field: new.get(field, 0) - old.get(field, 0) for field in set(new) | set(old)}
+
+
+def _rows(date, department_id):
+    if department_id is None:
+        return DailyAttendanceSummary.objects.filter(date=date, department__isnull=True)
+    return DailyAttendanceSummary.objects.filter(date=date, department_id=department_id)
+
+
+def apply(date, department_id, changes):
+    """
+    Applique le delta d'une écriture déjà faite en base. Si la ligne du jour
+    n'existe pas encore, le jour est calculé depuis la base (écriture incluse).
+    """
+    changes = {field: value for field, value in changes.items() if value}
+    if not changes:
+        return
+    updated = _rows(date, department_id).update(
+        **{field: F(field) + value for field, value in changes.items()}
+    )
+    if not updated:
+        _build_row(date, department_id)
+    live_counters.incr([date], department_id, changes)
+
+
+@contextmanager
+def _build_lock(dates):
+    """
+    Verrou de calcul des jours donnés, pris dans l'ordre des dates. Un jour
+    dont le verrou reste pris BUILD_LOCK_TIMEOUT secondes est calculé quand
+    même : la contrainte d'unicité écarte alors les lignes en double.
+    """
+    deadline = time.monotonic() + BUILD_LOCK_TIMEOUT
+    held = []
+    try:
+        for date in sorted(set(dates)):
+            lock = BUILD_LOCK.format(date)
+            locked = cache.add(lock, 1, timeout=BUILD_LOCK_TIMEOUT)
+            while not locked and time.monotonic() < deadline:
+                time.sleep(BUILD_LOCK_WAIT)
+                locked = cache.add(lock, 1, timeout=BUILD_LOCK_TIMEOUT)
+            if locked:
+                held.append(lock)
+        yield
+    finally:
+        if held:
+            cache.delete_many(held)
+
+
+def _build_row(date, department_id):
+    """
+    Calcule depuis la base la ligne (jour, département) absente lors d'un
+    delta. Le calcul est fait sous verrou, en attendant un calcul concurrent
+    du même jour : celui-ci a pu créer la ligne sans voir notre écriture,
+    la ligne est donc recalculée (l'écriture, déjà faite, y est incluse).
+    """
+    with _build_lock([date]), transaction.atomic():
+        _rows(date, department_id).delete()
+        _create([date])
+
+
+def shift(department_id, field, value, start, end=None):
+    """Ajoute value à un compteur sur les lignes existantes d'une période (ouverte si end=None)"""
+    rows = DailyAttendanceSummary.objects.filter(date__gte=start)
+    if end is not None:
+        rows = rows.filter(date__lte=end)
+    if department_id is None:
+        rows = rows.filter(department__isnull=True)
+    else:
+        rows = rows.filter(department_id=department_id)
+    rows.update(**{field: F(field) + value})
+
+    # Compteurs live : seuls les jours récents sont tenus dans Redis
+    today = timezone.localdate()
+    first = max(start, today - timedelta(days=live_counters.WINDOW_DAYS))
+    last = today if end is None else min(end, today)
+    if first <= last:
+        live_counters.incr(_dates(first, last), department_id, {field: value})
+
+
+def _dates(start, end):
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _headcounts(dates):
+    """
+    Effectif par (date, département) : cumul des arrivées (date_joined)
+    moins les départs (date_left), sur les employés actifs ou partis.
+    """
+    events = {}
+    employees = Employee.objects.filter(
+        Q(status='ACTIVE') | Q(status='INACTIVE', date_left__isnull=False),
+        date_joined__lte=dates[-1]
+    )
+    for row in employees.values('department_id', 'date_joined').annotate(count=Count('id')).order_by():
+        changes = events.setdefault(row['department_id'], {})
+        changes[row['date_joined']] = changes.get(row['date_joined'], 0) + row['count']
+    for row in employees.filter(date_left__lte=dates[-1]).values(
+        'department_id', 'date_left'
+    ).annotate(count=Count('id')).order_by():
+        changes = events.setdefault(row['department_id'], {})
+        changes[row['date_left']] = changes.get(row['date_left'], 0) - row['count']
+
+    counts = {}
+    for department_id, changes in events.items():
+        days = sorted(changes)
+        totals = list(accumulate(changes[day] for day in days))
+        for date in dates:
+            position = bisect_right(days, date)
+            if position:
+                counts[(date, department_id)] = totals[position - 1]
+    return counts
+
+
+def _on_leave(dates):
+    """Employés en congé approuvé par (date, département)"""
+    employees = {}
+    wanted = set(dates)
+    for row in Leave.objects.filter(
+        status='APPROVED',
+        start_date__lte=dates[-1],
+        end_date__gte=dates[0]
+    ).values('employee_id', 'employee__department_id', 'start_date', 'end_date'):
+        day = max(row['start_date'], dates[0])
+        while day <= min(row['end_date'], dates[-1]):
+            if day in wanted:
+                employees.setdefault((day, row['employee__department_id']), set()).add(row['employee_id'])
+            day += timedelta(days=1)
+    return {key: len(ids) for key, ids in employees.items()}
+
+
+def compute(dates):
+    """Compteurs (date, département) calculés depuis la base pour une liste de jours"""
+    dates = sorted(set(dates))
+    departments = [None, *Department.objects.values_list('id', flat=True)]
+    counts = {(date, department_id): dict.fromkeys(FIELDS, 0) for date in dates for department_id in departments}
+
+    worked = ExpressionWrapper(F('check_out') - F('check_in'), output_field=DurationField())
+    for row in Attendance.objects.filter(date__in=dates).values('date', 'employee__department_id').annotate(
+        present=Count('id', filter=Q(status='PRESENT')),
+        late=Count('id', filter=Q(status='LATE')),
+        absent=Count('id', filter=Q(status='ABSENT')),
+        half_day=Count('id', filter=Q(status='HALF_DAY')),
+        worked=Sum(worked, filter=Q(check_out__gt=F('check_in')))
+    ).order_by():
+        values = counts.setdefault((row['date'], row['employee__department_id']), dict.fromkeys(FIELDS, 0))
+        for field in ('present', 'late', 'absent', 'half_day'):
+            values[field] = row[field]
+        values['worked_seconds'] = int(row['worked'].total_seconds()) if row['worked'] else 0
+
+    for field, source in (('headcount', _headcounts(dates)), ('on_leave', _on_leave(dates))):
+        for key, value in source.items():
+            counts.setdefault(key, dict.fromkeys(FIELDS, 0))[field] = value
+    return counts
+
+
+def _existing(dates):
+    return set(DailyAttendanceSummary.objects.filter(date__in=dates).values_list('date', 'department_id'))
+
+
+def _create(dates):
+    existing = _existing(dates)
+    DailyAttendanceSummary.objects.bulk_create([
+        DailyAttendanceSummary(date=date, department_id=department_id, **values)
+        for (date, department_id), values in compute(dates).items()
+        if (date, department_id) not in existing
+    ], ignore_conflicts=True)
+
+
+def build(dates):
+    """Crée les lignes manquantes des jours donnés, sous le verrou de calcul"""
+    dates = sorted(set(dates))
+    if not dates:
+        return
+    with _build_lock(dates):
+        _create(dates)
+
+
+def summaries(start, end):
+    """
+    Lignes d'agrégats d'une période, en calculant au passage les jours
+    passés (ou aujourd'hui) qui n'en ont pas encore.
+    """
+    last = min(end, timezone.localdate())
+    if start <= last:
+        known = set(DailyAttendanceSummary.objects.filter(
+            date__range=(start, last)
+        ).values_list('date', flat=True).distinct())
+        missing = [date for date in _dates(start, last) if date not in known]
+        for i in range(0, len(missing), BUILD_CHUNK_DAYS):
+            build(missing[i:i + BUILD_CHUNK_DAYS])
+    return DailyAttendanceSummary.objects.filter(date__range=(start, end))
+
+
+def totals(rows):
+    """Somme des compteurs d'un ensemble de lignes"""
+    values = rows.aggregate(**SUMS)
+    return {field: values[field] or 0 for field in FIELDS}
+
+
+def by_date(rows):
+    """Compteurs sommés par date : {date: {champ: valeur}}"""
+    return {row.pop('date'): row for row in rows.values('date').annotate(**SUMS).order_by('date')}
+
+
+def recorded(values):
+    """Nombre de présences enregistrées (tous statuts)"""
+    return values['present'] + values['late'] + values['absent'] + values['half_day']
+
+
+def rebuild(start, end):
+    """Recalcule entièrement les agrégats d'une période. Retourne le nombre de jours"""
+    dates = _dates(start, end)
+    for i in range(0, len(dates), BUILD_CHUNK_DAYS):
+        chunk = dates[i:i + BUILD_CHUNK_DAYS]
+        with _build_lock(chunk), transaction.atomic():
+            DailyAttendanceSummary.objects.filter(date__range=(chunk[0], chunk[-1])).delete()
+            _create(chunk)
+    report_cache.bump(*dates)
+    live_counters.discard(dates)
+    return len(dates)
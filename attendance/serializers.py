@@ -1,7 +1,12 @@
+import calendar
+from datetime import date
+
 from rest_framework import serializers
 from .models import Attendance, TemporaryQRCode
+from attendance import department_stats
 from accounts.models import Department, Employee
 from django.db.models import Count
+from django.utils import timezone
 
 class AttendanceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -55,9 +60,9 @@ class AttendanceAnalyticsReportSerializer(serializers.ModelSerializer):
     
     def get_work_duration(self, obj):
         if obj.check_in and obj.check_out:
-            duration = obj.check_out - obj.check_in
-            hours = duration.seconds // 3600
-            minutes = (duration.seconds % 3600) // 60
+            seconds = int((obj.check_out - obj.check_in).total_seconds())
+            hours = seconds // 3600
+            minutes = (seconds % 3600) // 60
             return f"{hours}h {minutes}min"
         return None
 
@@ -75,40 +80,25 @@ class DepartmentAttendanceAnalyticsSerializer(serializers.ModelSerializer):
             'late_count', 'absent_count', 'attendance_rate'
         ]
 
+    def _stats(self, obj):
+        # Sans date dans le contexte : statistiques du jour
+        date = self.context.get('date') or timezone.localdate()
+        return department_stats.from_context(self.context, date).get(obj.pk, date)
+
     def get_total_employees(self, obj):
-        return obj.employee_set.filter(status='ACTIVE').count()
+        return self._stats(obj)['total_employees']
 
     def get_present_count(self, obj):
-        date = self.context.get('date')
-        return Attendance.objects.filter(
-            employee__department=obj,
-            date=date,
-            status='PRESENT'
-        ).count()
+        return self._stats(obj)['present_count']
 
     def get_late_count(self, obj):
-        date = self.context.get('date')
-        return Attendance.objects.filter(
-            employee__department=obj,
-            date=date,
-            status='LATE'
-        ).count()
+        return self._stats(obj)['late_count']
 
     def get_absent_count(self, obj):
-        date = self.context.get('date')
-        present_and_late = Attendance.objects.filter(
-            employee__department=obj,
-            date=date,
-            status__in=['PRESENT', 'LATE']
-        ).count()
-        return self.get_total_employees(obj) - present_and_late
+        return self._stats(obj)['absent_count']
 
     def get_attendance_rate(self, obj):
-        total = self.get_total_employees(obj)
-        if total == 0:
-            return 0
-        present_and_late = self.get_present_count(obj) + self.get_late_count(obj)
-        return round((present_and_late / total) * 100, 1)
+        return self._stats(obj)['attendance_rate']
 
 class MonthlyAnalyticsStatsSerializer(serializers.Serializer):
     date = serializers.DateField()
@@ -120,7 +110,7 @@ class MonthlyAnalyticsStatsSerializer(serializers.Serializer):
 
 class EmployeeAttendanceAnalyticsSerializer(serializers.ModelSerializer):
     full_name = serializers.CharField(source='user.get_full_name')
-    department_name = serializers.CharField(source='department.name')
+    department_name = serializers.CharField(source='department.name', allow_null=True)
     attendance_stats = serializers.SerializerMethodField()
     
     class Meta:
@@ -128,34 +118,15 @@ class EmployeeAttendanceAnalyticsSerializer(serializers.ModelSerializer):
         fields = ['id', 'employee_id', 'full_name', 'department_name', 'attendance_stats']
     
     def get_attendance_stats(self, obj):
-        month = self.context.get('month')
-        year = self.context.get('year')
-        
-        attendances = obj.attendance_set.filter(
-            date__year=year,
-            date__month=month
-        )
-        
-        total_days = attendances.count()
-        present_days = attendances.filter(status='PRESENT').count()
-        late_days = attendances.filter(status='LATE').count()
-        absent_days = total_days - (present_days + late_days)
-        
-        return {
-            'present_days': present_days,
-            'late_days': late_days,
-            'absent_days': absent_days,
-            'attendance_rate': round(((present_days + late_days) / total_days * 100), 1) if total_days > 0 else 0,
-            'total_work_hours': self._calculate_total_work_hours(attendances)
-        }
-    
-    def _calculate_total_work_hours(self, attendances):
-        total_seconds = 0
-        for attendance in attendances:
-            if attendance.check_in and attendance.check_out:
-                duration = attendance.check_out - attendance.check_in
-                total_seconds += duration.seconds
-        
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        return f"{hours}h {minutes}min"
\ No newline at end of file
+        # Statistiques précalculées pour tous les employés (attendance.analytics.employee_stats)
+        stats = self.context.get('stats')
+        if stats is None:
+            from attendance.analytics import employee_stats
+
+            _, last_day = calendar.monthrange(self.context['year'], self.context['month'])
+            _, stats = employee_stats(
+                Employee.objects.filter(pk=obj.pk),
+                date(self.context['year'], self.context['month'], 1),
+                date(self.context['year'], self.context['month'], last_day)
+            )
+        return stats[obj.pk]
@@ -0,0 +1,179 @@
+# attendance/signals.py
+"""
+Maintien des agrégats journaliers et des versions du cache des rapports
+pour les écritures faites par l'ORM (admin, API de gestion). Le moteur de
+pointage applique ses propres deltas.
+"""
+from datetime import timedelta
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import Department, Employee
+from attendance import live_counters, occupancy, report_cache, rollup
+from attendance.models import Attendance
+from leave import alerts
+from leave.models import Leave
+
+
+def _department_id(employee_id):
+    return Employee.objects.filter(pk=employee_id).values_list('department_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Attendance)
+def remember_attendance(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Attendance.objects.filter(pk=instance.pk).values(
+            'employee_id', 'employee__department_id', 'date', 'status', 'check_in', 'check_out'
+        ).first()
+
+
+@receiver(post_save, sender=Attendance)
+def update_summary_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    new = rollup.contribution(instance.status, instance.check_in, instance.check_out)
+
+    if previous and previous['employee_id'] == instance.employee_id:
+        department_id = previous['employee__department_id']
+    else:
+        department_id = _department_id(instance.employee_id)
+
+    if previous:
+        old = rollup.contribution(previous['status'], previous['check_in'], previous['check_out'])
+        old_key = (previous['date'], previous['employee__department_id'])
+        if old_key != (instance.date, department_id):
+            rollup.apply(*old_key, rollup.difference({}, old))
+            old = {}
+        report_cache.bump(previous['date'])
+        if (previous['employee_id'], previous['date']) != (instance.employee_id, instance.date):
+            occupancy.update(previous['date'], [(previous['employee_id'], previous['employee__department_id'], False)])
+    else:
+        old = {}
+    rollup.apply(instance.date, department_id, rollup.difference(new, old))
+    report_cache.bump(instance.date)
+    occupancy.update(instance.date, [
+        (instance.employee_id, department_id, bool(instance.check_in and not instance.check_out))
+    ])
+
+
+@receiver(post_delete, sender=Attendance)
+def update_summary_on_delete(sender, instance, **kwargs):
+    old = rollup.contribution(instance.status, instance.check_in, instance.check_out)
+    department_id = _department_id(instance.employee_id)
+    rollup.apply(instance.date, department_id, rollup.difference({}, old))
+    report_cache.bump(instance.date)
+    occupancy.update(instance.date, [(instance.employee_id, department_id, False)])
+
+
+@receiver(pre_save, sender=Leave)
+def remember_leave(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Leave.objects.filter(pk=instance.pk).values(
+            'employee__department_id', 'status', 'start_date', 'end_date'
+        ).first()
+
+
+def _shift_leave(department_id, start_date, end_date, value):
+    rollup.shift(department_id, 'on_leave', value, start_date, end_date)
+
+
+@receiver(post_save, sender=Leave)
+def update_summary_on_leave_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous and previous['status'] == 'APPROVED':
+        _shift_leave(previous['employee__department_id'], previous['start_date'], previous['end_date'], -1)
+    if instance.status == 'APPROVED':
+        _shift_leave(_department_id(instance.employee_id), instance.start_date, instance.end_date, 1)
+        # Absences matérialisées (attendance.absences) couvertes par un congé accordé après coup
+        Attendance.objects.filter(
+            employee_id=instance.employee_id,
+            date__range=(instance.start_date, instance.end_date),
+            status='ABSENT',
+            check_in__isnull=True
+        ).delete()
+    if previous:
+        report_cache.bump_range(previous['start_date'], previous['end_date'])
+    report_cache.bump_range(instance.start_date, instance.end_date)
+
+
+@receiver(post_delete, sender=Leave)
+def update_summary_on_leave_delete(sender, instance, **kwargs):
+    if instance.status == 'APPROVED':
+        _shift_leave(_department_id(instance.employee_id), instance.start_date, instance.end_date, -1)
+    report_cache.bump_range(instance.start_date, instance.end_date)
+
+
+def _counted_days(status, date_joined, date_left):
+    """
+    Jours où l'employé compte dans l'effectif, selon les règles de
+    rollup._headcounts : (premier jour, dernier jour ou None), ou None.
+    """
+    if status != 'ACTIVE' and not (status == 'INACTIVE' and date_left):
+        return None
+    if date_left is None:
+        return date_joined, None
+    if date_left <= date_joined:
+        return None
+    return date_joined, date_left - timedelta(days=1)
+
+
+def _shift_headcount(department_id, days, value):
+    if days:
+        rollup.shift(department_id, 'headcount', value, *days)
+
+
+@receiver(post_save, sender=Employee)
+def update_summary_headcount(sender, instance, **kwargs):
+    # Les agrégats déjà calculés suivent l'effectif sur toute la période
+    # concernée (arrivée ou départ antidatés compris), comme un rebuild
+    previous = getattr(instance, '_previous', None)
+    old = previous and _counted_days(previous['status'], previous['date_joined'], previous['date_left'])
+    old_department = previous['department_id'] if previous else None
+    new = _counted_days(instance.status, instance.date_joined, instance.date_left)
+
+    if old == new and old_department == instance.department_id:
+        return
+    _shift_headcount(old_department, old, -1)
+    _shift_headcount(instance.department_id, new, 1)
+
+
+@receiver(post_save, sender=Employee)
+def update_occupancy_department(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous and previous['department_id'] != instance.department_id:
+        occupancy.move(instance.pk, previous['department_id'], instance.department_id)
+
+
+@receiver(post_delete, sender=Employee)
+def update_summary_headcount_on_delete(sender, instance, **kwargs):
+    _shift_headcount(
+        instance.department_id, _counted_days(instance.status, instance.date_joined, instance.date_left), -1
+    )
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_reports(sender, **kwargs):
+    # Noms, départements et effectifs apparaissent dans tous les rapports
+    report_cache.bump_all()
+
+
+@receiver(post_save, sender=Department)
+def update_live_department(sender, instance, **kwargs):
+    live_counters.set_department(instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Department)
+def remove_live_department(sender, instance, **kwargs):
+    live_counters.set_department(instance.pk)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_alerts(sender, **kwargs):
+    # Noms et seuils d'alerte
+    alerts.invalidate()
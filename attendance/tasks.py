@@ -0,0 +1,41 @@
+# attendance/tasks.py
+from celery import shared_task
+from django.conf import settings
+
+from attendance import absences, live_counters, occupancy, report_jobs, retention
+
+
+@shared_task
+def purge_qr_codes():
+    return retention.purge_qr_codes(
+        chunk_size=settings.QR_PURGE_CHUNK_SIZE,
+        sleep=settings.QR_PURGE_SLEEP,
+        retention=settings.QR_PURGE_RETENTION,
+        max_seconds=settings.QR_PURGE_MAX_SECONDS
+    )
+
+
+@shared_task
+def run_report_job(job_id):
+    return report_jobs.run(job_id)
+
+
+@shared_task
+def purge_report_files():
+    return report_jobs.purge_files()
+
+
+@shared_task
+def reconcile_live_counters():
+    return live_counters.reconcile()
+
+
+@shared_task
+def reconcile_occupancy():
+    return occupancy.reconcile()
+
+
+@shared_task
+def materialize_absences():
+    results = absences.materialize_recent(settings.ABSENCE_LOOKBACK_DAYS)
+    return {day.isoformat(): created for day, created in results.items()}
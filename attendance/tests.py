@@ -1,3 +1,1621 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts import schedule_cache
+from accounts.models import Department, Employee, Schedule, User
+from attendance.models import Attendance, DailyAttendanceSummary, TemporaryQRCode
+from attendance import (
+    absences, export, live_counters, live_stream, occupancy, punch, report_cache, report_jobs, retention, rollup
+)
+from attendance.tasks import run_report_job
+from leave import alerts
+from leave.tasks import refresh_dashboard_alerts as run_refresh_alerts
+from core import metrics
+from leave.models import Leave
+from attendance.qr_store import DatabaseQRTokenStore, RedisQRTokenStore, SignedQRTokenStore
+
+
+def make_employee(username, **extra):
+    user = User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='password123',
+        first_name=username.capitalize(),
+        last_name='Test'
+    )
+    return Employee.objects.create(**{
+        'user': user,
+        'employee_id': f'EMP-{username}',
+        'position': 'Agent',
+        'gender': 'O',
+        'date_of_birth': date(1990, 1, 1),
+        'date_joined': date(2020, 1, 1),
+        **extra
+    })
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheTestCase(TestCase):
+    """Tests sans serveur Redis : cache local, vidé avant chaque test"""
+
+    def setUp(self):
+        cache.clear()
+
+
+class FakeRedis:
+    """Client Redis minimal en mémoire (SET/GETDEL/DELETE, hashes, sets, listes, pipeline)"""
+
+    def __init__(self):
+        self.data = {}
+        self.published = []
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def hincrby(self, name, key, amount=1):
+        values = self.data.setdefault(name, {})
+        key = self._bytes(key)
+        values[key] = self._bytes(int(values.get(key, 0)) + amount)
+        return int(values[key])
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        values = self.data.setdefault(name, {})
+        mapping = dict(mapping or {})
+        if key is not None:
+            mapping[key] = value
+        for field, field_value in mapping.items():
+            values[self._bytes(field)] = self._bytes(field_value)
+        return len(mapping)
+
+    def hgetall(self, name):
+        return dict(self.data.get(name, {}))
+
+    def hdel(self, name, *keys):
+        values = self.data.get(name, {})
+        return sum(1 for key in keys if values.pop(self._bytes(key), None) is not None)
+
+    def expire(self, name, seconds):
+        return name in self.data
+
+    def sadd(self, name, *values):
+        members = self.data.setdefault(name, set())
+        added = {self._bytes(value) for value in values} - members
+        members |= added
+        return len(added)
+
+    def srem(self, name, *values):
+        members = self.data.get(name, set())
+        removed = {self._bytes(value) for value in values} & members
+        members -= removed
+        return len(removed)
+
+    def smembers(self, name):
+        return set(self.data.get(name, set()))
+
+    def smove(self, source, destination, value):
+        if not self.srem(source, value):
+            return False
+        self.sadd(destination, value)
+        return True
+
+    def rpush(self, name, *values):
+        items = self.data.setdefault(name, [])
+        items.extend(self._bytes(value) for value in values)
+        return len(items)
+
+    def llen(self, name):
+        return len(self.data.get(name, []))
+
+    def lrange(self, name, start, end):
+        items = self.data.get(name, [])
+        return list(items[start:] if end == -1 else items[start:end + 1])
+
+    def set(self, name, value, ex=None, get=False):
+        previous = self.data.get(name)
+        self.data[name] = value.encode() if isinstance(value, str) else value
+        return previous if get else True
+
+    def getdel(self, name):
+        return self.data.pop(name, None)
+
+    def delete(self, *names):
+        return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePubSub:
+    """Abonnement asynchrone alimenté par une asyncio.Queue"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def subscribe(self, *channels):
+        self.channels = channels
+
+    async def listen(self):
+        yield {'type': 'subscribe', 'data': 1}
+        while True:
+            yield {'type': 'message', 'data': await self.queue.get()}
+
+    async def aclose(self):
+        pass
+
+
+class FakeAsyncRedis:
+    def __init__(self, queue):
+        self.queue = queue
+
+    def pubsub(self):
+        return FakePubSub(self.queue)
+
+    async def aclose(self):
+        pass
+
+
+class FakePipeline:
+    """Pipeline en file ; après watch() les commandes sont immédiates jusqu'à multi()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+        self.watching = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.watching = False
+        self.calls = []
+
+    def watch(self, *names):
+        self.watching = True
+
+    def multi(self):
+        self.watching = False
+
+    def __getattr__(self, name):
+        if self.watching:
+            return getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+        self.calls = []
+        return results
+
+
+class RedisQRTokenStoreTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('alice')
+        self.store = RedisQRTokenStore(client=FakeRedis())
+
+    def test_issue_does_not_write_to_database(self):
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.store.issue(self.employee)
+        self.assertFalse(TemporaryQRCode.objects.exists())
+
+    def test_code_can_only_be_consumed_once(self):
+        token = self.store.issue(self.employee)
+
+        consumed = self.store.consume(token.code)
+        self.assertEqual(consumed.employee_id, self.employee.pk)
+        self.assertEqual(consumed.purpose, 'check-in')
+        self.assertIsNone(self.store.consume(token.code))
+
+    def test_one_active_code_per_employee(self):
+        first = self.store.issue(self.employee)
+        second = self.store.issue(self.employee)
+
+        self.assertIsNone(self.store.consume(first.code))
+        self.assertIsNotNone(self.store.consume(second.code))
+
+
+class DatabaseQRTokenStoreTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('bob')
+        self.store = DatabaseQRTokenStore()
+
+    def test_code_can_only_be_consumed_once(self):
+        token = self.store.issue(self.employee)
+
+        self.assertEqual(self.store.consume(token.code).employee_id, self.employee.pk)
+        self.assertIsNone(self.store.consume(token.code))
+
+    def test_expired_code_is_rejected(self):
+        token = self.store.issue(self.employee)
+        TemporaryQRCode.objects.filter(code=token.code).update(
+            expiry=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertIsNone(self.store.consume(token.code))
+
+    def test_new_code_invalidates_previous_one(self):
+        first = self.store.issue(self.employee)
+        self.store.issue(self.employee)
+
+        self.assertIsNone(self.store.consume(first.code))
+
+
+@override_settings(QR_TOKEN_BACKEND='attendance.qr_store.DatabaseQRTokenStore')
+class QRCheckViewTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('carol')
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee.user)
+
+    def test_issued_code_checks_in_once(self):
+        response = self.client.post('/api/qr/save/')
+        self.assertEqual(response.status_code, 201)
+        code = response.data['data']['code']
+
+        response = self.client.post('/api/attendance/check/', {'code': code})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Attendance.objects.filter(employee=self.employee).exists())
+
+        response = self.client.post('/api/attendance/check/', {'code': code})
+        self.assertEqual(response.status_code, 400)
+
+
+class SignedQRTokenStoreTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('dave')
+        self.store = SignedQRTokenStore()
+
+    def test_consume_needs_no_database_access(self):
+        token = self.store.issue(self.employee, purpose='check-out')
+
+        with self.assertNumQueries(0):
+            consumed = self.store.consume(token.code)
+        self.assertEqual(consumed.employee_id, self.employee.pk)
+        self.assertEqual(consumed.purpose, 'check-out')
+
+    def test_replayed_code_is_rejected(self):
+        token = self.store.issue(self.employee)
+
+        self.assertIsNotNone(self.store.consume(token.code))
+        self.assertIsNone(self.store.consume(token.code))
+
+    def test_tampered_or_expired_code_is_rejected(self):
+        token = self.store.issue(self.employee)
+        self.assertIsNone(self.store.consume(token.code + 'x'))
+
+        expired = self.store.issue(self.employee, ttl=-1)
+        self.assertIsNone(self.store.consume(expired.code))
+
+
+class QRCodePurgeTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('noah')
+        now = timezone.now()
+        for i in range(7):
+            TemporaryQRCode.objects.create(
+                employee=self.employee,
+                code=f'expired-{i}',
+                purpose='check-in',
+                expiry=now - timedelta(hours=2),
+                is_used=i % 2 == 0
+            )
+        TemporaryQRCode.objects.create(
+            employee=self.employee, code='active', purpose='check-in', expiry=now + timedelta(seconds=30)
+        )
+
+    def test_purge_deletes_expired_codes_by_chunks(self):
+        report = retention.purge_qr_codes(chunk_size=3, sleep=0)
+
+        self.assertEqual(report['deleted'], 7)
+        self.assertEqual(report['chunks'], 3)
+        self.assertEqual(list(TemporaryQRCode.objects.values_list('code', flat=True)), ['active'])
+        self.assertEqual(metrics.read('qr_purge.deleted')['qr_purge.deleted'], 7)
+
+    def test_retention_keeps_recent_codes(self):
+        self.assertEqual(retention.purge_qr_codes(retention=3 * 3600, sleep=0)['deleted'], 0)
+
+    def test_command_reports_deleted_rows(self):
+        out = StringIO()
+        call_command('purge_qr_codes', '--chunk-size=4', '--sleep=0', '--retention=0', stdout=out)
+        self.assertIn('7 QR codes supprimés en 2 plages', out.getvalue())
+
+
+class PunchEngineTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('erin')
+        self.now = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        Schedule.objects.create(
+            employee=self.employee,
+            day_of_week=self.now.weekday(),
+            start_time=time(8, 30),
+            end_time=time(17, 0)
+        )
+
+    def test_check_in_costs_four_queries(self):
+        schedule_cache.get_weekly_schedule(self.employee.pk)
+        rollup.summaries(self.now.date(), self.now.date())
+        # ligne existante, upsert, relecture, agrégat du jour
+        with self.assertNumQueries(4):
+            attendance = punch.check_in(self.employee.pk, 'NFC', now=self.now)
+
+        self.assertEqual(attendance.check_in, self.now)
+        self.assertEqual(attendance.status, 'LATE')
+        self.assertEqual(attendance.attendance_type, 'NFC')
+
+    def test_check_in_rejects_an_unknown_type(self):
+        for attendance_type in ('BOGUS', None, ''):
+            with self.assertRaises(punch.PunchError) as error:
+                punch.check_in(self.employee.pk, attendance_type, now=self.now)
+            self.assertEqual(error.exception.status_code, 400)
+        self.assertFalse(Attendance.objects.exists())
+
+        client = APIClient()
+        client.force_authenticate(self.employee.user)
+        response = client.post('/api/attendance/check-in/', {'employee_id': self.employee.pk, 'type': 'BOGUS'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_check_in_replaces_a_counted_status(self):
+        # Absence matérialisée (sans signal, comme attendance.absences)
+        Attendance.objects.bulk_create([
+            Attendance(employee=self.employee, date=self.now.date(), attendance_type='NFC', status='ABSENT')
+        ])
+        rollup.rebuild(self.now.date(), self.now.date())
+        punch.check_in(self.employee.pk, 'NFC', now=self.now)
+
+        totals = rollup.totals(rollup.summaries(self.now.date(), self.now.date()))
+        self.assertEqual((totals['absent'], totals['late']), (0, 1))
+
+    def test_check_in_before_start_time_is_present(self):
+        attendance = punch.check_in(self.employee.pk, 'QR', now=self.now.replace(hour=8))
+        self.assertEqual(attendance.status, 'PRESENT')
+
+    @override_settings(TIME_ZONE='America/Port-au-Prince')
+    def test_day_and_lateness_use_local_time(self):
+        # 2026-10-20T02:00Z : 22:00 le lundi 19 à Port-au-Prince (UTC-4)
+        Schedule.objects.all().delete()
+        schedule_cache.invalidate(self.employee.pk)
+        Schedule.objects.create(
+            employee=self.employee, day_of_week=0, start_time=time(21, 0), end_time=time(23, 0)
+        )
+        evening = datetime(2026, 10, 20, 2, 0, tzinfo=dt_timezone.utc)
+        attendance = punch.check_in(self.employee.pk, 'NFC', now=evening - timedelta(minutes=45))
+        # 21:15 locale après un début à 21:00 (01:15 en UTC serait à l'heure)
+        self.assertEqual((attendance.date, attendance.status), (date(2026, 10, 19), 'LATE'))
+
+        attendance = punch.check_out(self.employee.pk, now=evening)
+        self.assertEqual(attendance.date, date(2026, 10, 19))
+        self.assertEqual(Attendance.objects.get().check_out, evening)
+
+    @override_settings(TIME_ZONE='America/Port-au-Prince')
+    def test_reports_default_to_the_local_day(self):
+        evening = datetime(2026, 10, 20, 2, 0, tzinfo=dt_timezone.utc)
+        client = APIClient()
+        client.force_authenticate(self.employee.user)
+        with mock.patch('django.utils.timezone.now', return_value=evening):
+            response = client.get('/api/attendance/daily-report/')
+        self.assertEqual(response.data['date'], date(2026, 10, 19))
+
+    def test_second_check_in_is_rejected_without_overwriting(self):
+        punch.check_in(self.employee.pk, 'NFC', now=self.now)
+
+        with self.assertRaises(punch.PunchError) as ctx:
+            punch.check_in(self.employee.pk, 'FACE', now=self.now + timedelta(minutes=1))
+        self.assertEqual(ctx.exception.message, 'Already checked in today')
+
+        attendance = Attendance.objects.get(employee=self.employee)
+        self.assertEqual(attendance.check_in, self.now)
+        self.assertEqual(attendance.attendance_type, 'NFC')
+
+    def test_check_in_without_schedule_or_employee(self):
+        Schedule.objects.all().delete()
+        with self.assertRaises(punch.PunchError) as ctx:
+            punch.check_in(self.employee.pk, 'NFC', now=self.now)
+        self.assertEqual(ctx.exception.status_code, 404)
+        self.assertEqual(ctx.exception.message, 'No schedule found for today')
+
+        with self.assertRaises(punch.PunchError) as ctx:
+            punch.check_in(self.employee.pk + 100, 'NFC', now=self.now)
+        self.assertEqual(ctx.exception.message, 'Employee not found')
+
+    def test_check_out_costs_three_queries(self):
+        punch.check_in(self.employee.pk, 'NFC', now=self.now)
+        later = self.now + timedelta(hours=8)
+
+        with self.assertNumQueries(3):
+            attendance = punch.check_out(self.employee.pk, now=later)
+        self.assertEqual(attendance.check_out, later)
+
+        with self.assertRaises(punch.PunchError) as ctx:
+            punch.check_out(self.employee.pk, now=later)
+        self.assertEqual(ctx.exception.message, 'Already checked out today')
+
+    def test_check_out_without_check_in(self):
+        with self.assertRaises(punch.PunchError) as ctx:
+            punch.check_out(self.employee.pk, now=self.now)
+        self.assertEqual(ctx.exception.message, 'No check-in found for today')
+
+    def test_check_in_view_rejects_duplicate_with_400(self):
+        client = APIClient()
+        client.force_authenticate(self.employee.user)
+        payload = {'employee_id': self.employee.pk, 'type': 'NFC'}
+
+        self.assertEqual(client.post('/api/attendance/check-in/', payload).status_code, 200)
+        response = client.post('/api/attendance/check-in/', payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Already checked in today')
+
+
+class LiveCountersTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        live_counters.set_client(self.redis)
+        self.addCleanup(live_counters.set_client, None)
+
+        self.sales = Department.objects.create(name='Sales')
+        self.ops = Department.objects.create(name='Ops')
+        self.alice = make_employee('alice', department=self.sales)
+        self.bob = make_employee('bob', department=self.ops)
+        self.now = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.today = self.now.date()
+        for employee in (self.alice, self.bob):
+            Schedule.objects.create(
+                employee=employee, day_of_week=self.today.weekday(),
+                start_time=time(8, 30), end_time=time(17, 0)
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice.user)
+
+    def live(self):
+        return live_counters._parse(self.redis.hgetall(live_counters.DAY_KEY.format(self.today.isoformat())))
+
+    def test_snapshot_is_served_from_redis(self):
+        self.client.get('/api/dashboard/snapshot/')
+        punch.check_in(self.alice.pk, 'NFC', now=self.now.replace(hour=8))
+        punch.check_in(self.bob.pk, 'NFC', now=self.now)
+        run_refresh_alerts()
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/dashboard/snapshot/')
+        stats = response.data['stats']
+        self.assertEqual((stats['total_employees'], stats['present_today'], stats['total_late']), (2, 2, 1))
+        self.assertEqual(len(response.data['weekly']), 5)
+        self.assertEqual(
+            [(alert['type'], alert['department']) for alert in response.data['alerts']], [('late', 'Ops')]
+        )
+
+    def test_counters_follow_writes_and_match_a_rebuild(self):
+        live_counters.read([self.today])
+        punch.check_in(self.alice.pk, 'NFC', now=self.now.replace(hour=8))
+        punch.check_out(self.alice.pk, now=self.now + timedelta(hours=8))
+        attendance = Attendance.objects.create(
+            employee=self.bob, date=self.today, attendance_type='QR', status='ABSENT'
+        )
+        attendance.status = 'HALF_DAY'
+        attendance.save()
+        Leave.objects.create(
+            employee=self.bob, leave_type='ANNUAL', start_date=self.today, end_date=self.today,
+            reason='Congé', status='APPROVED'
+        )
+        make_employee('carla', department=self.ops)
+
+        live = self.live()
+        self.assertEqual((live[self.ops.pk]['half_day'], live[self.ops.pk]['absent']), (1, 0))
+        self.assertEqual((live[self.ops.pk]['on_leave'], live[self.ops.pk]['headcount']), (1, 2))
+        self.assertEqual(live, live_counters.rebuild([self.today])[self.today])
+
+    def test_missing_day_is_rebuilt_from_database(self):
+        punch.check_in(self.alice.pk, 'NFC', now=self.now.replace(hour=8))
+        self.redis.data.clear()
+        days, names = live_counters.read([self.today])
+        self.assertEqual(days[self.today][self.sales.pk]['present'], 1)
+        self.assertEqual(names[self.sales.pk], 'Sales')
+        with self.assertNumQueries(0):
+            live_counters.read([self.today])
+
+
+class AlertEngineTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.sales = Department.objects.create(name='Sales', late_rate_alert=40, absence_alert=1)
+        self.ops = Department.objects.create(name='Ops')
+        self.sales_team = [make_employee(f'sales{i}', department=self.sales) for i in range(4)]
+        self.ops_team = [make_employee(f'ops{i}', department=self.ops) for i in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.sales_team[0].user)
+
+    def mark(self, employees, status):
+        for employee in employees:
+            Attendance.objects.create(employee=employee, date=self.today, attendance_type='NFC', status=status)
+
+    def test_thresholds_per_department_and_defaults(self):
+        # Sales : 1 retard sur 4 (25 % <= 40 %), 1 absence (<= 1) ; Ops : seuils par défaut (0)
+        self.mark(self.sales_team[:1], 'LATE')
+        self.mark(self.sales_team[1:2], 'ABSENT')
+        self.mark(self.ops_team[:1], 'LATE')
+        self.assertEqual([(a['type'], a['department']) for a in alerts.compute()], [('late', 'Ops')])
+
+        self.mark(self.sales_team[2:4], 'LATE')
+        with override_settings(ALERT_LATE_RATE=50):
+            found = {(a['type'], a['department']): a for a in alerts.compute()}
+        self.assertEqual(set(found), {('late', 'Sales')})
+        self.assertEqual(found[('late', 'Sales')]['count'], 3)
+        self.assertIn('75 %', found[('late', 'Sales')]['message'])
+
+    def test_endpoint_returns_the_precomputed_list(self):
+        self.mark(self.ops_team, 'ABSENT')
+        # Agrégats du jour (sans Redis) et seuils des départements
+        with self.assertNumQueries(3):
+            self.assertEqual(run_refresh_alerts(), 1)
+
+        self.mark(self.sales_team[:2], 'ABSENT')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/dashboard/alerts/')
+        self.assertEqual([(a['type'], a['department'], a['count']) for a in response.data], [('absence', 'Ops', 2)])
+
+        # Un changement de seuil invalide la liste
+        self.sales.absence_alert = 0
+        self.sales.save()
+        response = self.client.get('/api/dashboard/alerts/')
+        self.assertEqual([a['department'] for a in response.data], ['Sales', 'Ops'])
+
+
+class LiveStreamTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        live_counters.set_client(self.redis)
+        self.addCleanup(live_counters.set_client, None)
+        self.sales = Department.objects.create(name='Sales')
+        self.alice = make_employee('alice', department=self.sales)
+        self.now = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        Schedule.objects.create(
+            employee=self.alice, day_of_week=self.now.weekday(),
+            start_time=time(8, 30), end_time=time(17, 0)
+        )
+        self.token = str(AccessToken.for_user(self.alice.user))
+
+    def published(self):
+        return [json.loads(message) for _, message in self.redis.published]
+
+    def test_punches_publish_events_and_absolute_counters(self):
+        live_counters.read([self.now.date()])
+        self.redis.published.clear()
+        punch.check_in(self.alice.pk, 'NFC', now=self.now)
+        punch.check_out(self.alice.pk, now=self.now + timedelta(hours=8))
+
+        events = self.published()
+        self.assertEqual(
+            [(event['type'], event.get('action')) for event in events],
+            [('counters', None), ('punch', 'check-in'), ('counters', None), ('punch', 'check-out')]
+        )
+        self.assertEqual(events[0]['counters'], {'late': 1})
+        self.assertEqual(events[1]['department'], self.sales.pk)
+        self.assertEqual(events[2]['counters'], {'worked_seconds': 8 * 3600})
+
+    def test_slow_subscriber_gets_coalesced_updates(self):
+        subscriber = live_stream.Subscriber(max_events=2)
+        for value in range(1, 4):
+            subscriber.put({'type': 'counters', 'date': '2024-01-01', 'department': 1,
+                            'counters': {'present': value}})
+            subscriber.put({'type': 'punch', 'employee': value})
+        subscriber.put({'type': 'counters', 'date': '2024-01-01', 'department': 1, 'counters': {'late': 5}})
+
+        events = subscriber.drain()
+        self.assertEqual(
+            events,
+            [
+                {'type': 'punch', 'employee': 2},
+                {'type': 'punch', 'employee': 3},
+                {'type': 'dropped', 'count': 1},
+                {'type': 'counters', 'date': '2024-01-01', 'department': 1,
+                 'counters': {'present': 3, 'late': 5}},
+            ]
+        )
+        self.assertEqual(subscriber.drain(), [])
+
+    def run_stream(self, headers=(), query_string=b'', feed=()):
+        """Ouvre le flux, publie feed par l'abonnement Redis puis ferme la connexion"""
+        sent = []
+
+        async def scenario():
+            queue = asyncio.Queue()
+            broadcaster = live_stream.Broadcaster(connect=lambda: FakeAsyncRedis(queue))
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if len(sent) == 2:
+                    for message in feed:
+                        queue.put_nowait(message)
+                if len(sent) == (3 if feed else 2):
+                    disconnect.set()
+
+            scope = {'type': 'http', 'method': 'GET', 'path': live_stream.STREAM_PATH,
+                     'headers': list(headers), 'query_string': query_string}
+            with mock.patch.object(live_stream, 'FLUSH_INTERVAL', 0):
+                await asyncio.wait_for(live_stream.stream(scope, receive, send, broadcaster), 5)
+            return broadcaster
+
+        broadcaster = async_to_sync(scenario)()
+        self.assertEqual(broadcaster.subscribers, set())
+        return sent
+
+    def test_listener_survives_bad_messages_and_lost_connections(self):
+        class BrokenPubSub(FakePubSub):
+            async def subscribe(self, *channels):
+                raise ConnectionError('Redis indisponible')
+
+        async def scenario():
+            queue = asyncio.Queue()
+            clients = iter([mock.Mock(pubsub=lambda: BrokenPubSub(queue), aclose=mock.AsyncMock())])
+            broadcaster = live_stream.Broadcaster(connect=lambda: next(clients, FakeAsyncRedis(queue)))
+            with mock.patch.object(live_stream, 'RECONNECT_DELAY', 0):
+                subscriber = broadcaster.subscribe()
+                for message in (b'{not json', b'[1, 2]', json.dumps({'type': 'punch', 'employee': 1})):
+                    queue.put_nowait(message)
+                await asyncio.wait_for(subscriber.ready.wait(), 5)
+                self.assertFalse(broadcaster.task.done())
+                broadcaster.unsubscribe(subscriber)
+            return subscriber.drain()
+
+        with self.assertLogs('attendance.live_stream', 'WARNING'):
+            self.assertEqual(async_to_sync(scenario)(), [{'type': 'punch', 'employee': 1}])
+
+    def test_stream_requires_a_valid_token(self):
+        sent = self.run_stream(headers=[(b'authorization', b'Bearer invalid')])
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_stream_sends_current_counters_then_feed(self):
+        self.redis.published.clear()
+        punch.check_in(self.alice.pk, 'NFC', now=self.now)
+        feed = [message for _, message in self.redis.published]
+
+        ticket = live_stream.issue_ticket(self.alice.user.pk)
+        sent = self.run_stream(query_string=f'ticket={ticket}'.encode(), feed=feed)
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        initial = sent[1]['body'].decode()
+        self.assertTrue(initial.startswith('event: counters\n'))
+        self.assertIn('"late": 1', initial)
+        update = sent[2]['body'].decode()
+        self.assertEqual(update.count('event: punch\n'), 1)
+        self.assertEqual(update.count('event: counters\n'), 1)
+
+
+    def test_stream_ticket_is_single_use(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        ticket = client.post('/api/dashboard/stream/ticket/').data['ticket']
+
+        self.assertEqual(self.run_stream(query_string=f'ticket={ticket}'.encode())[0]['status'], 200)
+        self.assertEqual(self.run_stream(query_string=f'ticket={ticket}'.encode())[0]['status'], 401)
+        # Le jeton d'accès n'est plus accepté dans l'URL
+        self.assertEqual(self.run_stream(query_string=f'token={self.token}'.encode())[0]['status'], 401)
+
+    def test_stream_applies_the_cors_policy(self):
+        headers = [(b'authorization', f'Bearer {self.token}'.encode()), (b'origin', b'http://localhost')]
+        sent = self.run_stream(headers=headers)
+        self.assertIn((b'access-control-allow-origin', b'http://localhost'), sent[0]['headers'])
+        self.assertIn((b'access-control-allow-credentials', b'true'), sent[0]['headers'])
+
+        sent = self.run_stream(headers=[(b'origin', b'http://evil.example')])
+        self.assertEqual(sent[0]['status'], 401)
+        self.assertNotIn(b'access-control-allow-origin', dict(sent[0]['headers']))
+
+    def test_stream_answers_cors_preflight(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'OPTIONS', 'path': live_stream.STREAM_PATH,
+                 'headers': [(b'origin', b'http://localhost')], 'query_string': b''}
+        async_to_sync(live_stream.stream)(scope, None, send)
+        headers = dict(sent[0]['headers'])
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(headers[b'access-control-allow-origin'], b'http://localhost')
+        self.assertIn(b'authorization', headers[b'access-control-allow-headers'])
+
+
+class OccupancyTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        live_counters.set_client(self.redis)
+        self.addCleanup(live_counters.set_client, None)
+        occupancy.invalidate()
+        self.addCleanup(occupancy.invalidate)
+
+        self.sales = Department.objects.create(name='Sales')
+        self.ops = Department.objects.create(name='Ops')
+        self.alice = make_employee('alice', department=self.sales)
+        self.bob = make_employee('bob', department=self.ops)
+        self.carla = make_employee('carla', department=self.sales)
+        self.now = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.today = self.now.date()
+        for employee in (self.alice, self.bob, self.carla):
+            Schedule.objects.create(
+                employee=employee, day_of_week=self.today.weekday(),
+                start_time=time(8, 30), end_time=time(17, 0)
+            )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.alice.user)}')
+
+    def test_index_follows_punches_and_serves_roll_call(self):
+        occupancy.snapshot()
+        for employee in (self.alice, self.bob, self.carla):
+            punch.check_in(employee.pk, 'NFC', now=self.now)
+        punch.check_out(self.bob.pk, now=self.now + timedelta(hours=8))
+
+        self.assertEqual(occupancy.counts(), {self.sales.pk: 2})
+        self.client.get('/api/attendance/occupancy/roll-call/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/attendance/occupancy/')
+            roll_call = self.client.get('/api/attendance/occupancy/roll-call/')
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['departments'][0], {
+            'department_id': self.sales.pk, 'department': 'Sales', 'count': 2
+        })
+        self.assertEqual(
+            [(person['name'], person['department']) for person in roll_call.data['results']],
+            [('Alice Test', 'Sales'), ('Carla Test', 'Sales')]
+        )
+        filtered = self.client.get(f'/api/attendance/occupancy/roll-call/?department_id={self.ops.pk}')
+        self.assertEqual(filtered.data['count'], 0)
+
+    def test_bulk_punches_orm_writes_and_department_moves(self):
+        occupancy.snapshot()
+        timestamp = self.now.isoformat()
+        punch.ingest_events([
+            {'idempotency_key': f'k{employee.pk}', 'employee_id': employee.pk, 'action': 'check-in',
+             'timestamp': timestamp, 'type': 'NFC'}
+            for employee in (self.alice, self.bob)
+        ])
+        Attendance.objects.create(
+            employee=self.carla, date=self.today, check_in=self.now, attendance_type='QR', status='PRESENT'
+        )
+        self.alice.department = self.ops
+        self.alice.save()
+        Attendance.objects.filter(employee=self.bob).get().delete()
+
+        self.assertEqual(occupancy.snapshot(), {
+            self.sales.pk: frozenset({self.carla.pk}), self.ops.pk: frozenset({self.alice.pk})
+        })
+        self.assertEqual(occupancy.snapshot(), occupancy.rebuild())
+
+    def test_unknown_day_is_loaded_and_reconciled_from_database(self):
+        punch.check_in(self.alice.pk, 'NFC', now=self.now)
+        self.redis.data.clear()
+        occupancy.invalidate()
+        self.assertEqual(occupancy.counts(), {self.sales.pk: 1})
+
+        # Écart (écriture hors ORM) corrigé par la réconciliation
+        Attendance.objects.filter(employee=self.alice).update(check_out=self.now + timedelta(hours=1))
+        self.assertEqual(occupancy.reconcile(), 0)
+        self.assertEqual(occupancy.counts(), {})
+
+    def test_rebuild_replays_punches_made_while_reading_the_database(self):
+        punch.check_in(self.alice.pk, 'NFC', now=self.now)
+        punch.check_in(self.bob.pk, 'NFC', now=self.now)
+        read = occupancy._from_database
+
+        def read_then_punch(date):
+            # Pointages arrivés entre la lecture de la base et le remplacement de l'index
+            present = read(date)
+            occupancy.update(date, [(self.alice.pk, self.sales.pk, False), (self.carla.pk, self.sales.pk, True)])
+            return present
+
+        with mock.patch.object(occupancy, '_from_database', side_effect=read_then_punch):
+            occupancy.rebuild(self.today)
+        self.assertEqual(occupancy._read(self.today), {
+            self.sales.pk: frozenset({self.carla.pk}), self.ops.pk: frozenset({self.bob.pk})
+        })
+        # Journal vidé par le remplacement
+        self.assertEqual(self.redis.llen(occupancy.JOURNAL_KEY.format(self.today.isoformat())), 0)
+
+    def test_night_shift_stays_on_site_after_midnight(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        Attendance.objects.create(
+            employee=self.bob, date=yesterday, check_in=self.now - timedelta(days=1),
+            attendance_type='NFC', status='PRESENT'
+        )
+        with override_settings(OCCUPANCY_CARRY_OVER_HOUR=24):
+            self.assertEqual(occupancy.counts(), {self.ops.pk: 1})
+            self.assertEqual(occupancy.reconcile(), 1)
+        with override_settings(OCCUPANCY_CARRY_OVER_HOUR=0):
+            occupancy.invalidate()
+            self.assertEqual(occupancy.counts(), {})
+        with override_settings(OCCUPANCY_CARRY_OVER_HOUR=24):
+            # Check-out de la veille saisi après minuit
+            attendance = Attendance.objects.get(employee=self.bob)
+            attendance.check_out = self.now
+            attendance.save()
+            self.assertEqual(occupancy.counts(), {})
+
+
+class AbsenceMaterializationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate() - timedelta(days=1)
+        self.sales = Department.objects.create(name='Sales')
+
+    def scheduled(self, username, **extra):
+        employee = make_employee(username, department=self.sales, **extra)
+        Schedule.objects.create(
+            employee=employee, day_of_week=self.day.weekday(), start_time=time(8, 30), end_time=time(17, 0)
+        )
+        return employee
+
+    def absent(self):
+        return set(Attendance.objects.filter(date=self.day, status='ABSENT').values_list('employee__user__username', flat=True))
+
+    def test_only_expected_employees_without_punch_or_leave_are_marked_absent(self):
+        self.scheduled('missing')
+        self.scheduled('punched')
+        Attendance.objects.create(
+            employee=Employee.objects.get(user__username='punched'), date=self.day,
+            attendance_type='NFC', status='PRESENT'
+        )
+        Leave.objects.create(
+            employee=self.scheduled('on_leave'), leave_type='ANNUAL', start_date=self.day,
+            end_date=self.day, reason='Congé', status='APPROVED'
+        )
+        self.scheduled('joined_later', date_joined=self.day + timedelta(days=1))
+        self.scheduled('left', status='INACTIVE', date_left=self.day)
+        make_employee('unscheduled', department=self.sales)
+
+        self.assertEqual(absences.materialize(self.day, chunk_size=1), 1)
+        self.assertEqual(self.absent(), {'missing'})
+        summary = rollup.totals(rollup.summaries(self.day, self.day))
+        self.assertEqual((summary['absent'], summary['present'], summary['on_leave']), (1, 1, 1))
+
+        # Idempotent : l'anti-jointure exclut les absences déjà créées
+        self.assertEqual(absences.materialize(self.day), 0)
+        with self.assertRaises(ValueError):
+            absences.materialize(timezone.localdate())
+
+    def test_rows_skipped_on_conflict_are_not_counted(self):
+        present = self.scheduled('present')
+        missing = self.scheduled('missing')
+        Attendance.objects.create(employee=present, date=self.day, attendance_type='NFC', status='PRESENT')
+        rows = [
+            Attendance(employee=employee, date=self.day, status='ABSENT', attendance_type=None)
+            for employee in (present, missing)
+        ]
+        self.assertEqual(absences._insert(self.day, rows), 1)
+        self.assertIsNone(Attendance.objects.get(employee=missing, date=self.day).attendance_type)
+
+    def test_query_count_does_not_depend_on_headcount(self):
+        for i in range(3):
+            self.scheduled(f'a{i}')
+        with CaptureQueriesContext(connection) as small:
+            absences.materialize(self.day)
+        Attendance.objects.filter(date=self.day).delete()
+        for i in range(30):
+            self.scheduled(f'b{i}')
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(absences.materialize(self.day), 33)
+        self.assertEqual(len(small), len(large))
+
+    def test_late_punch_or_leave_replaces_the_absence(self):
+        alice = self.scheduled('alice')
+        bob = self.scheduled('bob')
+        call_command('materialize_absences', stdout=StringIO())
+        self.assertEqual(self.absent(), {'alice', 'bob'})
+
+        punch.ingest_events([{
+            'idempotency_key': 'late-1', 'employee_id': alice.pk, 'action': 'check-in',
+            'timestamp': timezone.make_aware(datetime.combine(self.day, time(8))).isoformat(), 'type': 'NFC'
+        }])
+        Leave.objects.create(
+            employee=bob, leave_type='SICK', start_date=self.day, end_date=self.day,
+            reason='Maladie', status='APPROVED'
+        )
+
+        self.assertEqual(self.absent(), set())
+        summary = rollup.totals(rollup.summaries(self.day, self.day))
+        self.assertEqual((summary['absent'], summary['present'], summary['on_leave']), (0, 1, 1))
+
+
+class DailySummaryTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sales = Department.objects.create(name='Sales')
+        self.ops = Department.objects.create(name='Ops')
+        self.alice = make_employee('alice', department=self.sales)
+        self.bob = make_employee('bob', department=self.sales)
+        self.carl = make_employee('carl', department=self.ops)
+        self.now = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.today = self.now.date()
+        for employee in (self.alice, self.bob, self.carl):
+            Schedule.objects.create(
+                employee=employee,
+                day_of_week=self.today.weekday(),
+                start_time=time(8, 30),
+                end_time=time(17, 0)
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice.user)
+
+    def stored(self):
+        return {
+            (row.date, row.department_id): {field: getattr(row, field) for field in rollup.FIELDS}
+            for row in DailyAttendanceSummary.objects.all()
+        }
+
+    def test_delta_is_kept_when_a_concurrent_build_holds_the_lock(self):
+        lock = f'rollup:build:{self.today}'
+        cache.add(lock, 1)
+        # Écriture déjà faite en base (sans signal), dont le delta reste à appliquer
+        Attendance.objects.bulk_create([
+            Attendance(employee=self.alice, date=self.today, attendance_type='NFC', status='PRESENT')
+        ])
+
+        def concurrent_build(seconds):
+            # L'autre calcul a lu la table avant l'écriture puis libère le verrou
+            DailyAttendanceSummary.objects.create(date=self.today, department=self.sales, headcount=2)
+            cache.delete(lock)
+
+        with mock.patch('attendance.rollup.time.sleep', side_effect=concurrent_build):
+            rollup.apply(self.today, self.sales.pk, {'present': 1})
+
+        row = DailyAttendanceSummary.objects.get(date=self.today, department=self.sales)
+        self.assertEqual((row.present, row.headcount), (1, 2))
+        self.assertIsNone(cache.get(lock))
+
+    def test_concurrent_builds_do_not_count_a_day_twice(self):
+        make_employee('dora')
+        rollup.build([self.today])
+        # Second calcul qui n'a pas vu les lignes du premier
+        with mock.patch.object(rollup, '_existing', return_value=set()):
+            rollup.build([self.today])
+        self.assertEqual(DailyAttendanceSummary.objects.filter(date=self.today, department__isnull=True).count(), 1)
+        self.assertEqual(rollup.totals(rollup.summaries(self.today, self.today))['headcount'], 4)
+
+    def test_build_waits_for_the_build_lock(self):
+        lock = f'rollup:build:{self.today}'
+        cache.add(lock, 1)
+
+        def concurrent_build(seconds):
+            rollup.compute([self.today])
+            DailyAttendanceSummary.objects.create(date=self.today, department=None, headcount=1)
+            cache.delete(lock)
+
+        with mock.patch('attendance.rollup.time.sleep', side_effect=concurrent_build) as sleep:
+            rollup.summaries(self.today, self.today)
+        sleep.assert_called_once()
+        self.assertEqual(DailyAttendanceSummary.objects.filter(date=self.today, department__isnull=True).count(), 1)
+        self.assertIsNone(cache.get(lock))
+
+    def test_incremental_updates_match_a_rebuild(self):
+        punch.check_in(self.alice.pk, 'NFC', now=self.now.replace(hour=8))
+        punch.check_in(self.bob.pk, 'NFC', now=self.now)
+        punch.check_out(self.bob.pk, now=self.now + timedelta(hours=8))
+        Attendance.objects.create(
+            employee=self.carl, date=self.today - timedelta(days=1), attendance_type='QR', status='ABSENT'
+        )
+        attendance = Attendance.objects.get(employee=self.alice)
+        attendance.status = 'HALF_DAY'
+        attendance.save()
+        Leave.objects.create(
+            employee=self.carl, leave_type='ANNUAL', start_date=self.today, end_date=self.today,
+            reason='Congé', status='APPROVED'
+        )
+
+        incremental = self.stored()
+        sales = incremental[(self.today, self.sales.pk)]
+        self.assertEqual((sales['half_day'], sales['late'], sales['headcount']), (1, 1, 2))
+        self.assertEqual(sales['worked_seconds'], 8 * 3600)
+        self.assertEqual(incremental[(self.today, self.ops.pk)]['on_leave'], 1)
+
+        rollup.rebuild(self.today - timedelta(days=1), self.today)
+        self.assertEqual(self.stored(), incremental)
+
+    def test_headcount_follows_employee_status(self):
+        rollup.summaries(self.today, self.today)
+        self.carl.status = 'INACTIVE'
+        self.carl.save()
+        self.assertEqual(DailyAttendanceSummary.objects.get(date=self.today, department=self.ops).headcount, 0)
+
+    def test_backdated_headcount_changes_match_a_rebuild(self):
+        start = self.today - timedelta(days=3)
+        rollup.summaries(start, self.today)
+        dora = make_employee('dora', department=self.sales, date_joined=self.today - timedelta(days=2))
+        self.carl.status = 'INACTIVE'
+        self.carl.date_left = self.today - timedelta(days=1)
+        self.carl.save()
+        incremental = self.stored()
+
+        rollup.rebuild(start, self.today)
+        self.assertEqual(incremental, self.stored())
+
+        dora.delete()
+        incremental = self.stored()
+        rollup.rebuild(start, self.today)
+        self.assertEqual(incremental, self.stored())
+
+    def test_reports_read_from_summary(self):
+        punch.check_in(self.alice.pk, 'NFC', now=self.now.replace(hour=8))
+        punch.check_in(self.bob.pk, 'NFC', now=self.now)
+
+        response = self.client.get('/api/attendance/daily-report/', {'date': self.today.isoformat()})
+        self.assertEqual((response.data['present'], response.data['late']), (1, 1))
+        self.assertEqual(response.data['by_department'][0]['employee__department__name'], 'Sales')
+
+        stats = self.client.get('/api/dashboard/stats/').data
+        self.assertEqual((stats['total_employees'], stats['present_today'], stats['total_late']), (3, 2, 1))
+
+        alerts = self.client.get('/api/dashboard/alerts/').data
+        self.assertEqual([(alert['type'], alert['department']) for alert in alerts], [('late', 'Sales')])
+
+    def test_trend_is_a_range_scan(self):
+        self.client.get('/api/analytics/trends/', {'days': 90})
+
+        # jours connus, lignes par date, lignes par département
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/analytics/trends/', {'days': 90})
+        self.assertEqual(len(response.data['daily_trends']), 91)
+
+    def test_trend_headcount_series_counts_departures(self):
+        self.carl.status = 'INACTIVE'
+        self.carl.save()
+        self.assertEqual(self.carl.date_left, self.today)
+        Employee.objects.filter(pk=self.carl.pk).update(date_left=self.today - timedelta(days=3))
+
+        trends = self.client.get('/api/analytics/trends/', {'days': 7}).data['daily_trends']
+        headcounts = [trend['headcount'] for trend in trends]
+        self.assertEqual(headcounts, [3, 3, 3, 3, 2, 2, 2, 2])
+
+    def test_long_trend_costs_the_same_queries_as_a_short_one(self):
+        for days in (7, 365):
+            self.client.get('/api/analytics/trends/', {'days': days})
+            with self.assertNumQueries(3):
+                self.client.get('/api/analytics/trends/', {'days': days})
+        self.assertEqual(self.client.get('/api/analytics/trends/', {'days': 5000}).status_code, 400)
+
+    def test_rebuild_command(self):
+        Attendance.objects.create(employee=self.alice, date=self.today, attendance_type='QR', status='PRESENT')
+        DailyAttendanceSummary.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_attendance_summary', stdout=out)
+        self.assertIn('1 jours recalculés', out.getvalue())
+        self.assertEqual(DailyAttendanceSummary.objects.get(date=self.today, department=self.sales).present, 1)
+
+
+class MonthlyAnalyticsTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.department = Department.objects.create(name='Sales')
+        self.now = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.client = APIClient()
+        self.client.force_authenticate(make_employee('gina', department=self.department).user)
+
+    def add_employees(self, count):
+        for i in range(count):
+            employee = make_employee(f'month{Employee.objects.count()}', department=self.department)
+            Attendance.objects.create(
+                employee=employee,
+                date=self.now.date(),
+                check_in=self.now,
+                check_out=self.now + timedelta(days=1, hours=1),
+                attendance_type='NFC',
+                status='PRESENT' if i % 2 else 'LATE'
+            )
+
+    def monthly(self):
+        return self.client.get('/api/analytics/monthly/', {'year': self.now.year, 'month': self.now.month})
+
+    def test_query_count_does_not_grow_with_headcount(self):
+        # départements, jours connus, date x département, date, employés annotés
+        self.add_employees(2)
+        self.monthly()
+        with self.assertNumQueries(5):
+            self.monthly()
+
+        self.add_employees(8)
+        with self.assertNumQueries(5):
+            response = self.monthly()
+
+        today = response.data['daily_stats'][-1]
+        self.assertEqual(today['date'], self.now.date())
+        self.assertEqual((today['total_present'], today['total_late'], today['total_absent']), (5, 5, 1))
+        self.assertEqual(today['department_breakdown'][0]['total_employees'], 11)
+        self.assertEqual(len(response.data['best_attendance']), 5)
+        best = response.data['best_attendance'][0]['attendance_stats']
+        self.assertEqual(best['total_work_hours'], '25h 0min')
+        self.assertEqual(best['total_work_seconds'], 25 * 3600)
+        self.assertEqual(response.data['worst_attendance'][-1]['full_name'], 'Gina Test')
+        self.assertEqual(response.data['worst_attendance'][-1]['attendance_stats']['attendance_rate'], 0)
+
+
+class DepartmentStatsTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.now().date()
+        self.departments = [Department.objects.create(name=f'Dept {i}') for i in range(4)]
+        for i, department in enumerate(self.departments):
+            for j in range(i + 1):
+                employee = make_employee(f'dept{i}x{j}', department=department)
+                Attendance.objects.create(
+                    employee=employee, date=self.today, attendance_type='NFC',
+                    status='LATE' if j else 'PRESENT'
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(make_employee('hana').user)
+
+    def test_department_serializers_share_one_provider(self):
+        from accounts.serializers import DepartmentDetailSerializer
+        from attendance.serializers import DepartmentAttendanceAnalyticsSerializer
+
+        rollup.summaries(self.today, self.today)
+        # jours connus, lignes du jour
+        with self.assertNumQueries(2):
+            data = DepartmentAttendanceAnalyticsSerializer(
+                self.departments, many=True, context={'date': self.today}
+            ).data
+        self.assertEqual(
+            [(d['total_employees'], d['present_count'], d['late_count'], d['absent_count']) for d in data],
+            [(1, 1, 0, 0), (2, 1, 1, 0), (3, 1, 2, 0), (4, 1, 3, 0)]
+        )
+
+        with self.assertNumQueries(2):
+            data = DepartmentDetailSerializer(self.departments, many=True).data
+        self.assertEqual([d['employee_count'] for d in data], [1, 2, 3, 4])
+        self.assertEqual(data[0]['attendance_rate'], 100.0)
+
+    def test_serializer_without_date_uses_today(self):
+        from attendance.serializers import DepartmentAttendanceAnalyticsSerializer
+
+        data = DepartmentAttendanceAnalyticsSerializer(self.departments, many=True).data
+        self.assertEqual([d['present_count'] for d in data], [1, 1, 1, 1])
+
+    def test_daily_analytics_breakdown_does_not_grow_with_departments(self):
+        self.client.get('/api/analytics/daily/')
+        with self.assertNumQueries(7):
+            response = self.client.get('/api/analytics/daily/')
+        self.assertEqual(len(response.data['department_breakdown']), 4)
+
+        Department.objects.create(name='Dept 4')
+        with self.assertNumQueries(7):
+            response = self.client.get('/api/analytics/daily/')
+        self.assertEqual(len(response.data['department_breakdown']), 5)
+
+
+class ReportCacheTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+        self.employee = make_employee('ines', department=Department.objects.create(name='Ventes'))
+        self.attendance = Attendance.objects.create(
+            employee=self.employee, date=self.yesterday, attendance_type='NFC', status='PRESENT'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee.user)
+        self.url = f'/api/attendance/daily-report/?date={self.yesterday.isoformat()}'
+
+    def test_past_day_is_served_from_cache(self):
+        self.assertEqual(self.client.get(self.url).data['present'], 1)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['present'], 1)
+
+        counters = metrics.read()
+        self.assertEqual((counters['report_cache.hit'], counters['report_cache.miss']), (1, 1))
+        self.assertEqual(counters['report_cache.hit_ratio'], 0.5)
+
+    def test_edit_on_past_day_bumps_its_version(self):
+        self.client.get(self.url)
+        self.attendance.status = 'LATE'
+        self.attendance.save()
+        response = self.client.get(self.url)
+        self.assertEqual((response.data['present'], response.data['late']), (0, 1))
+
+    def test_leave_on_past_day_bumps_its_version(self):
+        url = f'/api/analytics/daily/?date={self.yesterday.isoformat()}'
+        self.client.get(url)
+        self.client.get(url)
+        Leave.objects.create(
+            employee=self.employee, leave_type='ANNUAL', status='APPROVED',
+            start_date=self.yesterday, end_date=self.yesterday, reason='Congé'
+        )
+        self.client.get(url)
+        counters = metrics.read('report_cache.hit', 'report_cache.miss')
+        self.assertEqual(counters, {'report_cache.hit': 1, 'report_cache.miss': 2})
+
+    def test_employee_change_invalidates_every_report(self):
+        self.client.get(self.url)
+        self.employee.department = Department.objects.create(name='Achats')
+        self.employee.save()
+        self.client.get(self.url)
+        self.assertEqual(metrics.read('report_cache.miss')['report_cache.miss'], 2)
+
+    def test_stored_bytes_follow_overwrites_and_evictions(self):
+        redis = FakeRedis()
+        live_counters.set_client(redis)
+        self.addCleanup(live_counters.set_client, None)
+        self.client.get(self.url)
+        size = metrics.read('report_cache.bytes')['report_cache.bytes']
+        self.assertGreater(size, 0)
+
+        # Réécriture de la même clé : taille remplacée, pas ajoutée
+        key = next(iter(redis.hgetall(report_cache.SIZES_KEY))).decode()
+        cache.delete(key)
+        self.client.get(self.url)
+        self.assertEqual(metrics.read('report_cache.bytes')['report_cache.bytes'], size)
+
+        # Rapport expiré ou évincé : retiré de la jauge
+        cache.delete(key)
+        self.assertEqual(metrics.read('report_cache.bytes')['report_cache.bytes'], 0)
+        self.assertEqual(redis.hgetall(report_cache.SIZES_KEY), {})
+
+    def test_employee_rename_invalidates_every_report(self):
+        self.client.get(self.url)
+        user = self.employee.user
+        user.save(update_fields=['last_login'])
+        user.save()
+        self.client.get(self.url)
+        user.last_name = 'Renommée'
+        user.save()
+        self.client.get(self.url)
+        counters = metrics.read('report_cache.hit', 'report_cache.miss')
+        self.assertEqual(counters, {'report_cache.hit': 1, 'report_cache.miss': 2})
+
+    def test_today_is_computed_live(self):
+        url = '/api/attendance/monthly-report/'
+        self.client.get(url)
+        self.client.get(url)
+        counters = metrics.read('report_cache.hit', 'report_cache.miss')
+        self.assertEqual(counters, {'report_cache.hit': 0, 'report_cache.miss': 0})
+
+
+class KeysetPaginationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employees = [make_employee(f'page{i}') for i in range(2)]
+        for offset in range(3):
+            for employee in self.employees:
+                Attendance.objects.create(
+                    employee=employee, date=date(2024, 5, 1) + timedelta(days=offset),
+                    attendance_type='NFC', status='PRESENT'
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.employees[0].user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_history_pages_follow_date_then_id(self):
+        expected = list(Attendance.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/attendance/history/?page_size=4'), expected)
+        # Les lignes d'une même date sont réparties sur deux pages
+        self.assertEqual(self.walk('/api/attendance/history/?page_size=3'), expected)
+
+        employee = self.employees[1]
+        self.assertEqual(
+            self.walk(f'/api/attendance/history/?page_size=2&employee_id={employee.pk}'),
+            list(employee.attendance_set.order_by('-date').values_list('id', flat=True))
+        )
+
+    def test_leave_list_pages_by_creation(self):
+        for offset in range(3):
+            Leave.objects.create(
+                employee=self.employees[0], leave_type='ANNUAL', reason='Congé',
+                start_date=date(2024, 6, 1) + timedelta(days=offset),
+                end_date=date(2024, 6, 1) + timedelta(days=offset)
+            )
+        self.assertEqual(
+            self.walk('/api/leaves/?page_size=2'),
+            list(Leave.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        )
+        self.assertEqual(self.client.get('/api/leaves/?cursor=invalide').status_code, 404)
+
+    def test_tampered_cursor_is_rejected(self):
+        for position in ([[1], [2]], ['2024-13-01', 1], ['2024-06-01', 'abc'], [None, 1], [True, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+            with self.subTest(position=position):
+                response = self.client.get('/api/attendance/history/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class AttendanceExportTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        department = Department.objects.create(name='Paie')
+        self.employees = [make_employee(f'paie{i}', department=department) for i in range(3)]
+        self.day = date(2024, 3, 4)
+        check_in = timezone.make_aware(timezone.datetime(2024, 3, 4, 8, 0))
+        for employee in self.employees:
+            Attendance.objects.create(
+                employee=employee, date=self.day, attendance_type='NFC', status='PRESENT',
+                check_in=check_in, check_out=check_in + timedelta(hours=8, minutes=30)
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.employees[0].user)
+        self.url = '/api/attendance/export/{}/?start_date=2024-03-01&end_date=2024-03-31'
+
+    def test_csv_is_streamed_in_keyset_batches(self):
+        response = self.client.get(self.url.format('csv'))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        # Paquets de 2 lignes : 3 lignes, 2 requêtes
+        with mock.patch.object(export, 'CHUNK_SIZE', 2), self.assertNumQueries(2):
+            response = self.client.get(self.url.format('csv'))
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(export.HEADER))
+        self.assertEqual(len(lines), 4)
+        self.assertIn('Paie0 Test,Paie,2024-03-04', lines[1])
+        self.assertIn(',8.5,NFC,PRESENT', lines[1])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        response = self.client.get(self.url.format('xlsx'))
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 4)
+        self.assertIn('<t>Paie2 Test</t>', sheet)
+        self.assertEqual(self.client.get(self.url.format('pdf')).status_code, 400)
+
+
+class ReportJobTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        employee = make_employee('karim', department=Department.objects.create(name='Atelier'))
+        Attendance.objects.create(
+            employee=employee, date=timezone.localdate(), attendance_type='NFC', status='PRESENT'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(employee.user)
+        self.queued = []
+
+    def post(self, kind, **params):
+        with mock.patch.object(run_report_job, 'delay', self.queued.append):
+            return self.client.post('/api/reports/jobs/', {'kind': kind, 'params': params}, format='json')
+
+    def test_identical_requests_share_one_job(self):
+        first = self.post('trends', days=7)
+        second = self.post('trends', days='7')
+        self.assertEqual((first.status_code, second.status_code), (202, 200))
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(self.queued, [first.data['id']])
+
+        report_jobs.run(first.data['id'])
+        response = self.client.get(f"/api/reports/jobs/{first.data['id']}/")
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['storage'], 'cache')
+        self.assertEqual(response.data['result'], self.client.get('/api/analytics/trends/?days=7').json())
+
+        # Le job terminé ne capte plus les nouvelles demandes
+        self.assertEqual(self.post('trends', days=7).status_code, 202)
+
+    def test_large_result_is_written_to_media_root(self):
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root, REPORT_JOB_INLINE_MAX_BYTES=0):
+            job_id = self.post('yearly').data['id']
+            report_jobs.run(job_id)
+            response = self.client.get(f'/api/reports/jobs/{job_id}/')
+            self.assertEqual(response.data['storage'], 'file')
+            self.assertEqual(response.data['result']['year'], timezone.now().year)
+            self.assertEqual(response.data['result']['monthly_stats'][-1]['present'], 1)
+
+            self.assertEqual(report_jobs.purge_files(max_age=-1), 1)
+            self.assertIsNone(self.client.get(f'/api/reports/jobs/{job_id}/').data['result'])
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.post('weekly').status_code, 400)
+        self.assertEqual(self.post('monthly', month=13).status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/jobs/unknown/').status_code, 404)
+        self.assertEqual(self.queued, [])
+
+
+class BulkPunchTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employees = [make_employee(f'bulk{i}') for i in range(3)]
+        self.day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        for employee in self.employees:
+            Schedule.objects.create(
+                employee=employee,
+                day_of_week=self.day.weekday(),
+                start_time=time(8, 30),
+                end_time=time(17, 0)
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.employees[0].user)
+
+    def event(self, key, employee, action, hour, minute=0):
+        return {
+            'idempotency_key': key,
+            'employee_id': employee.pk,
+            'action': action,
+            'timestamp': self.day.replace(hour=hour, minute=minute).isoformat(),
+            'type': 'NFC'
+        }
+
+    def test_bare_list_body_is_accepted(self):
+        event = self.event('list-1', self.employees[0], 'check-in', 8)
+        response = self.client.post('/api/attendance/punches/bulk/', [event], format='json')
+        self.assertEqual((response.status_code, response.data['applied']), (200, 1))
+
+        response = self.client.post('/api/attendance/punches/bulk/', 'events', format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(TIME_ZONE='America/Port-au-Prince')
+    def test_late_evening_events_use_local_day(self):
+        # 02:00Z le mardi 20 : 22:00 le lundi 19 à Port-au-Prince (UTC-4)
+        employee = make_employee('evening')
+        Schedule.objects.create(employee=employee, day_of_week=0, start_time=time(21, 0), end_time=time(23, 30))
+        results = punch.ingest_events([{
+            'idempotency_key': 'evening-1', 'employee_id': employee.pk, 'action': 'check-in',
+            'timestamp': '2026-10-20T02:00:00Z', 'type': 'NFC'
+        }])
+        self.assertEqual(results[0]['status'], 'applied')
+        attendance = Attendance.objects.get(employee=employee)
+        self.assertEqual((attendance.date, attendance.status), (date(2026, 10, 19), 'LATE'))
+
+    def test_batch_is_applied_with_per_event_status(self):
+        a, b, c = self.employees
+        events = [
+            self.event('k1', a, 'check-in', 8),
+            self.event('k2', b, 'check-in', 9),
+            self.event('k3', a, 'check-out', 17),
+            self.event('k4', c, 'check-out', 17),
+            self.event('k5', a, 'check-in', 10),
+            {'idempotency_key': 'k6', 'action': 'check-in'},
+        ]
+
+        response = self.client.post('/api/attendance/punches/bulk/', {'events': events}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['applied', 'applied', 'applied', 'rejected', 'rejected', 'invalid'])
+
+        first = Attendance.objects.get(employee=a)
+        self.assertEqual(first.date, self.day.date())
+        self.assertEqual(first.status, 'PRESENT')
+        self.assertIsNotNone(first.check_out)
+        self.assertEqual(Attendance.objects.get(employee=b).status, 'LATE')
+
+    def test_replayed_batch_is_idempotent(self):
+        events = [self.event('r1', self.employees[0], 'check-in', 8)]
+        self.client.post('/api/attendance/punches/bulk/', {'events': events}, format='json')
+
+        response = self.client.post('/api/attendance/punches/bulk/', {'events': events}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'duplicate')
+        self.assertEqual(response.data['results'][0]['result'], 'applied')
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        events = [
+            self.event(f'q{i}-{action}', employee, action, 8 if action == 'check-in' else 17)
+            for i, employee in enumerate(self.employees)
+            for action in ('check-in', 'check-out')
+        ]
+        rollup.summaries(self.day.date(), self.day.date())
+        # clés, employés, plannings, présences, savepoint, insertions, relecture
+        # des insertions, agrégat du jour
+        with self.assertNumQueries(10):
+            punch.ingest_events(events)
+
+    def test_batch_only_writes_the_fields_it_changed(self):
+        a = self.employees[0]
+        punch.ingest_events([self.event('f1', a, 'check-in', 8)])
+        original = rollup.contribution
+
+        def concurrent_edit(*args):
+            # Correction faite pendant le lot, après la lecture des présences
+            if concurrent_edit.pending:
+                concurrent_edit.pending = False
+                Attendance.objects.filter(employee=a).update(status='HALF_DAY')
+            return original(*args)
+        concurrent_edit.pending = True
+
+        with mock.patch.object(rollup, 'contribution', side_effect=concurrent_edit):
+            punch.ingest_events([self.event('f2', a, 'check-out', 17)])
+        attendance = Attendance.objects.get(employee=a)
+        self.assertEqual(attendance.status, 'HALF_DAY')
+        self.assertIsNotNone(attendance.check_out)
+
+    def test_row_created_by_a_concurrent_punch_is_not_overwritten(self):
+        b = self.employees[1]
+        online = self.day.replace(hour=7)
+
+        def concurrent_check_in(start_time, check_in_time):
+            # Pointage en ligne validé entre la lecture et l'écriture du lot
+            if not Attendance.objects.filter(employee=b).exists():
+                Attendance.objects.bulk_create([Attendance(
+                    employee=b, date=self.day.date(), check_in=online, attendance_type='QR', status='PRESENT'
+                )])
+            return 'LATE'
+
+        key, employee_pk, action, timestamp, attendance_type = punch._parse_event(self.event('c1', b, 'check-in', 9))
+        parsed = [(0, key, employee_pk, action, timestamp, attendance_type)]
+        weeks = schedule_cache.get_weekly_schedules({b.pk})
+        with transaction.atomic(), mock.patch.object(punch, 'classify', side_effect=concurrent_check_in):
+            # La transaction du lot est annulée puis le lot rejoué
+            with self.assertRaises(punch._Conflict):
+                punch._apply_events(parsed, {}, {b.pk}, weeks, [None])
+            attendance = Attendance.objects.get(employee=b)
+            self.assertEqual((attendance.check_in, attendance.attendance_type), (online, 'QR'))
+
+        # Au nouvel essai la présence est lue (et verrouillée) : le pointage est refusé
+        self.assertEqual(punch.ingest_events([self.event('c1', b, 'check-in', 9)])[0]['error'],
+                         'Already checked in today')
+
+
+class IdempotencyKeyTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = make_employee('frank')
+        Schedule.objects.create(
+            employee=self.employee,
+            day_of_week=timezone.now().weekday(),
+            start_time=time(8, 30),
+            end_time=time(17, 0)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer token-frank', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+    def test_retry_replays_first_response_without_queries(self):
+        payload = {'employee_id': self.employee.pk, 'type': 'NFC'}
+        first = self.client.post('/api/attendance/check-in/', payload)
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            retry = self.client.post('/api/attendance/check-in/', payload)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(metrics.read('idempotency.hit', 'idempotency.miss'), {
+            'idempotency.hit': 1,
+            'idempotency.miss': 1
+        })
+
+    def test_key_reused_with_other_payload_is_rejected(self):
+        self.client.post('/api/attendance/check-in/', {'employee_id': self.employee.pk, 'type': 'NFC'})
+
+        response = self.client.post('/api/attendance/check-in/', {'employee_id': self.employee.pk, 'type': 'QR'})
+        self.assertEqual(response.status_code, 422)
 
-# Create your tests here.
@@ -1,19 +1,28 @@
 # attendance/urls.py
 from django.urls import path
-from .views import ValidateAttendanceView,  DailyReportView,AttendanceStatsView,CheckInView, CheckOutView ,AttendanceCheckViewqr,SaveQRCodeView,    AttendanceHistoryView, MonthlyReportView
+from .views import ValidateAttendanceView,  DailyReportView,AttendanceStatsView,CheckInView, CheckOutView ,BulkPunchView,AttendanceCheckViewqr,SaveQRCodeView,    AttendanceHistoryView, MonthlyReportView
 from attendance.views import (
     DailyAnalyticsView,
     MonthlyAnalyticsView,
-    AttendanceTrendsAnalyticsView
+    AttendanceTrendsAnalyticsView,
+    AttendanceExportView,
+    ReportJobCreateView,
+    ReportJobDetailView,
+    OccupancyView,
+    RollCallView
 )
 
 urlpatterns = [
     path('attendance/validate/', ValidateAttendanceView.as_view()),
     path('attendance/check-in/', CheckInView.as_view()),
     path('attendance/check-out/', CheckOutView.as_view()),
+    path('attendance/punches/bulk/', BulkPunchView.as_view(), name='bulk_punches'),
     path('qr/save/', SaveQRCodeView.as_view(), name='save_qr'),
     path('attendance/check/', AttendanceCheckViewqr.as_view(), name='attendance_check'),
     path('attendance/history/', AttendanceHistoryView.as_view(), name='attendance_history'),
+    path('attendance/export/<str:file_format>/', AttendanceExportView.as_view(), name='attendance_export'),
+    path('attendance/occupancy/', OccupancyView.as_view(), name='attendance_occupancy'),
+    path('attendance/occupancy/roll-call/', RollCallView.as_view(), name='attendance_roll_call'),
     path('attendance/stats/', AttendanceStatsView.as_view(), name='attendance_stats'),
     path('attendance/daily-report/', DailyReportView.as_view(), name='daily_report'),
     path('attendance/monthly-report/', MonthlyReportView.as_view(), name='monthly_report'),
@@ -31,4 +40,8 @@ urlpatterns = [
     path('analytics/trends/', 
          AttendanceTrendsAnalyticsView.as_view(), 
          name='attendance-trends-analytics'),
+
+    # Rapports asynchrones
+    path('reports/jobs/', ReportJobCreateView.as_view(), name='report-job-create'),
+    path('reports/jobs/<str:job_id>/', ReportJobDetailView.as_view(), name='report-job-detail'),
 ]
\ No newline at end of file
@@ -3,20 +3,25 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from attendance.serializers import AttendanceSerializer,AttendanceStatsSerializer, AttendanceHistorySerializer,TemporaryQRCodeSerializer
-from accounts.models import Employee, Schedule
+from attendance.serializers import AttendanceSerializer,AttendanceStatsSerializer, AttendanceHistorySerializer
 from attendance.serializers import (
     AttendanceAnalyticsReportSerializer,
-    DepartmentAttendanceAnalyticsSerializer,
-    MonthlyAnalyticsStatsSerializer,
-    EmployeeAttendanceAnalyticsSerializer
+    DepartmentAttendanceAnalyticsSerializer
 )
-from accounts.models import Employee, Department
-from attendance.models import Attendance, TemporaryQRCode
+from accounts.models import Department
+from attendance.models import Attendance
+from attendance.qr_store import QR_CODE_TTL, get_qr_store
+from attendance.department_stats import DepartmentStatsProvider
+from attendance.report_jobs import ReportJobError
+from attendance.tasks import run_report_job
+from attendance import analytics, export, live_counters, occupancy, punch, report_cache, report_jobs, rollup
+from accounts import credentials
+from core.pagination import DateKeysetPagination
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
 from django.db.models import Count, Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from datetime import datetime, timedelta
-import uuid
+from datetime import datetime
 import calendar
 
 
@@ -24,111 +29,87 @@ import calendar
 class ValidateAttendanceView(APIView):
     def post(self, request):
         auth_type = request.data.get('type')  # 'QR', 'NFC', 'FACE'
-        auth_data = request.data.get('data')
+        auth_data = request.data.get('data') or {}
         
         if auth_type == 'QR':
             # Validation du QR déjà fait côté client
-            employee_id = auth_data.get('employee_id')
+            entry = credentials.resolve('pk', auth_data.get('employee_id'))
         elif auth_type == 'NFC':
-            employee_id = auth_data.get('nfc_id')
+            entry = credentials.resolve('nfc', auth_data.get('nfc_id'))
         elif auth_type == 'FACE':
-            employee_id = auth_data.get('face_id')
+            entry = credentials.resolve('face', auth_data.get('face_id'))
         else:
             return Response({'error': 'Invalid authentication type'}, 
                           status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            employee = Employee.objects.get(id=employee_id)
-            return Response({
-                'employee_id': employee.id,
-                'name': employee.user.get_full_name(),
-                'valid': True
-            })
-        except Employee.DoesNotExist:
+        # Résolution depuis l'index des identifiants (Redis), sans requête SQL
+        if entry is None:
             return Response({'error': 'Invalid credentials'}, 
                           status=status.HTTP_404_NOT_FOUND)
+        if entry['status'] == 'INACTIVE':
+            return Response({'error': 'Employee is inactive'}, 
+                          status=status.HTTP_403_FORBIDDEN)
+
+        return Response({
+            'employee_id': entry['employee_id'],
+            'name': entry['name'],
+            'valid': True
+        })
 
 class CheckInView(APIView):
+    idempotent = True
+
     def post(self, request):
         employee_id = request.data.get('employee_id')
         attendance_type = request.data.get('type')
 
         try:
-            employee = Employee.objects.get(id=employee_id)
-            
-            # Vérifier s'il n'y a pas déjà un check-in aujourd'hui
-            today = timezone.now().date()
-            existing_attendance = Attendance.objects.filter(
-                employee=employee,
-                date=today
-            ).first()
-
-            if existing_attendance and existing_attendance.check_in:
-                return Response({
-                    'error': 'Already checked in today'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Calculer le statut (en retard ou non)
-            schedule = Schedule.objects.get(
-                employee=employee,
-                day_of_week=today.weekday()
-            )
-            
-            now = timezone.now()
-            status = 'PRESENT'
-            if now.time() > schedule.start_time:
-                status = 'LATE'
-
-            # Créer ou mettre à jour l'attendance
-            attendance = existing_attendance or Attendance.objects.create(
-                employee=employee,
-                date=today
-            )
-            
-            attendance.check_in = now
-            attendance.attendance_type = attendance_type
-            attendance.status = status
-            attendance.save()
-
-            return Response(AttendanceSerializer(attendance).data)
+            # Upsert atomique : statut (en retard ou non) calculé par la base
+            attendance = punch.check_in(employee_id, attendance_type)
+        except punch.PunchError as e:
+            return Response({'error': e.message}, status=e.status_code)
 
-        except Employee.DoesNotExist:
-            return Response({'error': 'Employee not found'}, 
-                          status=status.HTTP_404_NOT_FOUND)
-        except Schedule.DoesNotExist:
-            return Response({'error': 'No schedule found for today'}, 
-                          status=status.HTTP_404_NOT_FOUND)
+        return Response(AttendanceSerializer(attendance).data)
 
 class CheckOutView(APIView):
+    idempotent = True
+
     def post(self, request):
         employee_id = request.data.get('employee_id')
         
         try:
-            employee = Employee.objects.get(id=employee_id)
-            today = timezone.now().date()
-            attendance = Attendance.objects.get(
-                employee=employee,
-                date=today
-            )
+            attendance = punch.check_out(employee_id)
+        except punch.PunchError as e:
+            return Response({'error': e.message}, status=e.status_code)
 
-            if attendance.check_out:
-                return Response({
-                    'error': 'Already checked out today'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(AttendanceSerializer(attendance).data)
+            
+            
 
-            attendance.check_out = timezone.now()
-            attendance.save()
 
-            return Response(AttendanceSerializer(attendance).data)
+class BulkPunchView(APIView):
+    """Ingestion des pointages bufferisés par les terminaux hors ligne"""
+    idempotent = True
 
-        except Employee.DoesNotExist:
-            return Response({'error': 'Employee not found'}, 
-                          status=status.HTTP_404_NOT_FOUND)
-        except Attendance.DoesNotExist:
-            return Response({'error': 'No check-in found for today'}, 
-                          status=status.HTTP_404_NOT_FOUND)
-            
-            
+    def post(self, request):
+        # {"events": [...]} ou directement la liste des événements
+        events = request.data.get('events') if isinstance(request.data, dict) else request.data
+        if not isinstance(events, list):
+            return Response({'error': 'events must be a list'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        if len(events) > punch.MAX_BATCH_EVENTS:
+            return Response({'error': f'At most {punch.MAX_BATCH_EVENTS} events per batch'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = punch.ingest_events(events)
+        except punch.PunchError as e:
+            return Response({'error': e.message}, status=e.status_code)
+        return Response({
+            'processed': len(results),
+            'applied': sum(1 for result in results if result['status'] == 'applied'),
+            'results': results
+        })
 
 
 class SaveQRCodeView(APIView):
@@ -139,26 +120,11 @@ class SaveQRCodeView(APIView):
             # L'employé est automatiquement obtenu via l'utilisateur connecté
             employee = request.user.employee
             
-            # Génération d'un code unique
-            unique_code = str(uuid.uuid4())
-            
-            # Création du QR code avec timezone
-            expiry = timezone.now() + timezone.timedelta(seconds=30)
-            
-            # Désactiver les anciens QR codes de l'employé
-            TemporaryQRCode.objects.filter(
-                employee=employee,
-                is_used=False,
-                expiry__gt=timezone.now()
-            ).update(is_used=True)
-            
-            # Créer le nouveau QR code
-            qr_code = TemporaryQRCode.objects.create(
-                employee=employee,
-                code=unique_code,
+            # Génération du code via le backend configuré (Redis ou base de données)
+            qr_code = get_qr_store().issue(
+                employee,
                 purpose='check-in',
-                expiry=expiry,
-                is_used=False
+                ttl=QR_CODE_TTL
             )
 
             return Response({
@@ -167,7 +133,7 @@ class SaveQRCodeView(APIView):
                 'data': {
                     'code': qr_code.code,
                     'expiry': qr_code.expiry.isoformat(),
-                    'expiry_seconds': 30
+                    'expiry_seconds': QR_CODE_TTL
                 }
             }, status=status.HTTP_201_CREATED)
 
@@ -178,41 +144,35 @@ class SaveQRCodeView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 class AttendanceCheckViewqr(APIView):
+    idempotent = True
+
     def post(self, request):
-        try:
-            # Récupérer le QR code
-            qr_code = TemporaryQRCode.objects.get(code=request.data['code'])
-            
-            # Créer l'attendance
-            attendance_data = {
-                'employee': qr_code.employee.id,
-                'attendance_type': 'QR',
-                'status': 'PRESENT'
-            }
-            
-            if qr_code.purpose == 'check-in':
-                attendance_data['check_in'] = timezone.now()
-            else:
-                attendance_data['check_out'] = timezone.now()
-
-            # Sauvegarder l'attendance
-            serializer = AttendanceSerializer(data=attendance_data)
-            if serializer.is_valid():
-                serializer.save()
-                
-                # Marquer le QR code comme utilisé
-                qr_code.is_used = True
-                qr_code.used_at = timezone.now()
-                qr_code.save()
-                
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            
-        except TemporaryQRCode.DoesNotExist:
+        # Consommer le QR code (usage unique, expiré = invalide)
+        qr_code = get_qr_store().consume(request.data.get('code'))
+        if qr_code is None:
             return Response(
                 {'error': 'QR Code invalide'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        # Créer l'attendance
+        attendance_data = {
+            'employee': qr_code.employee_id,
+            'attendance_type': 'QR',
+            'status': 'PRESENT'
+        }
+        
+        if qr_code.purpose == 'check-in':
+            attendance_data['check_in'] = timezone.now()
+        else:
+            attendance_data['check_out'] = timezone.now()
+
+        # Sauvegarder l'attendance
+        serializer = AttendanceSerializer(data=attendance_data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
             
 ###########
@@ -233,16 +193,53 @@ class AttendanceHistoryView(APIView):
         if end_date:
             queryset = queryset.filter(date__lte=end_date)
 
-        queryset = queryset.order_by('-date')
-        serializer = AttendanceHistorySerializer(queryset, many=True)
-        return Response(serializer.data)
+        paginator = DateKeysetPagination()
+        page = paginator.paginate_queryset(queryset.select_related('employee__user'), request, self)
+        serializer = AttendanceHistorySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class AttendanceExportView(APIView):
+    """Historique de présence pour la paie, en flux CSV ou XLSX"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, file_format):
+        if file_format not in export.FORMATS:
+            return Response(
+                {'error': f"Format inconnu, attendu : {', '.join(export.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            today = timezone.localdate()
+            start_date = request.query_params.get('start_date')
+            end_date = request.query_params.get('end_date')
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else today.replace(day=1)
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else today
+        except ValueError:
+            return Response(
+                {'error': 'Format de date invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = Attendance.objects.filter(date__range=(start_date, end_date))
+        if request.query_params.get('employee_id'):
+            queryset = queryset.filter(employee_id=request.query_params['employee_id'])
+        if request.query_params.get('department_id'):
+            queryset = queryset.filter(employee__department_id=request.query_params['department_id'])
+
+        stream, content_type = export.FORMATS[file_format]
+        response = StreamingHttpResponse(stream(export.batches(queryset)), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="attendance_{start_date}_{end_date}.{file_format}"'
+        )
+        return response
 
 class AttendanceStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        start_date = request.query_params.get('start_date', timezone.now().date())
-        end_date = request.query_params.get('end_date', timezone.now().date())
+        start_date = request.query_params.get('start_date', timezone.localdate())
+        end_date = request.query_params.get('end_date', timezone.localdate())
         employee_id = request.query_params.get('employee_id')
 
         queryset = Attendance.objects.filter(date__range=[start_date, end_date])
@@ -265,34 +262,53 @@ class DailyReportView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        date = request.query_params.get('date', timezone.now().date())
+        date_str = request.query_params.get('date')
+        try:
+            date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else timezone.localdate()
+        except ValueError:
+            return Response(
+                {'error': 'Format de date invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         department_id = request.query_params.get('department_id')
 
-        queryset = Attendance.objects.filter(date=date)
-        if department_id:
-            queryset = queryset.filter(employee__department_id=department_id)
-
-        report = {
-            'date': date,
-            'total_employees': queryset.count(),
-            'present': queryset.filter(status='PRESENT').count(),
-            'late': queryset.filter(status='LATE').count(),
-            'absent': queryset.filter(status='ABSENT').count(),
-            'by_department': queryset.values('employee__department__name').annotate(
-                count=Count('id'),
-                present=Count('id', filter=Q(status='PRESENT')),
-                late=Count('id', filter=Q(status='LATE')),
-                absent=Count('id', filter=Q(status='ABSENT'))
-            )
-        }
+        def compute():
+            summaries = rollup.summaries(date, date)
+            if department_id:
+                summaries = summaries.filter(department_id=department_id)
+            totals = rollup.totals(summaries)
+
+            by_department = []
+            for row in summaries.values('department__name').annotate(**rollup.SUMS).order_by('department__name'):
+                if rollup.recorded(row):
+                    by_department.append({
+                        'employee__department__name': row['department__name'],
+                        'count': rollup.recorded(row),
+                        'present': row['present'],
+                        'late': row['late'],
+                        'absent': row['absent']
+                    })
+
+            return {
+                'date': date,
+                'total_employees': rollup.recorded(totals),
+                'present': totals['present'],
+                'late': totals['late'],
+                'absent': totals['absent'],
+                'by_department': by_department
+            }
+
+        report = report_cache.get_or_compute(
+            'daily-report', {'department_id': department_id}, date, date, compute
+        )
         return Response(report)
 
 class MonthlyReportView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        year = int(request.query_params.get('year', timezone.now().year))
-        month = int(request.query_params.get('month', timezone.now().month))
+        year = int(request.query_params.get('year', timezone.localdate().year))
+        month = int(request.query_params.get('month', timezone.localdate().month))
         employee_id = request.query_params.get('employee_id')
 
         # Obtenir le premier et dernier jour du mois
@@ -300,21 +316,27 @@ class MonthlyReportView(APIView):
         start_date = datetime(year, month, 1)
         end_date = datetime(year, month, last_day)
 
-        queryset = Attendance.objects.filter(date__range=[start_date, end_date])
-        if employee_id:
-            queryset = queryset.filter(employee_id=employee_id)
+        def compute():
+            queryset = Attendance.objects.filter(date__range=[start_date, end_date])
+            if employee_id:
+                queryset = queryset.filter(employee_id=employee_id)
+
+            return {
+                'year': year,
+                'month': month,
+                'total_days': last_day,
+                'total_employees': queryset.values('employee').distinct().count(),
+                'attendance_by_day': list(queryset.values('date').annotate(
+                    present=Count('id', filter=Q(status='PRESENT')),
+                    late=Count('id', filter=Q(status='LATE')),
+                    absent=Count('id', filter=Q(status='ABSENT'))
+                ).order_by('date'))
+            }
 
-        report = {
-            'year': year,
-            'month': month,
-            'total_days': last_day,
-            'total_employees': queryset.values('employee').distinct().count(),
-            'attendance_by_day': queryset.values('date').annotate(
-                present=Count('id', filter=Q(status='PRESENT')),
-                late=Count('id', filter=Q(status='LATE')),
-                absent=Count('id', filter=Q(status='ABSENT'))
-            ).order_by('date')
-        }
+        report = report_cache.get_or_compute(
+            'monthly-report', {'employee_id': employee_id},
+            start_date.date(), end_date.date(), compute
+        )
         return Response(report)
     
 class DailyAnalyticsView(APIView):
@@ -323,7 +345,7 @@ class DailyAnalyticsView(APIView):
     def get(self, request):
         date_str = request.query_params.get('date')
         try:
-            date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else timezone.now().date()
+            date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else timezone.localdate()
         except ValueError:
             return Response(
                 {'error': 'Format de date invalide'},
@@ -334,176 +356,165 @@ class DailyAnalyticsView(APIView):
         status_filter = request.query_params.get('status')
         search = request.query_params.get('search', '').strip()
 
-        queryset = Attendance.objects.filter(date=date)
-
-        if department_id:
-            queryset = queryset.filter(employee__department_id=department_id)
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        if search:
-            queryset = queryset.filter(
-                Q(employee__user__first_name__icontains=search) |
-                Q(employee__user__last_name__icontains=search) |
-                Q(employee__employee_id__icontains=search)
-            )
-
-        total_employees = Employee.objects.filter(status='ACTIVE').count()
-        total_present = queryset.filter(status='PRESENT').count()
-        total_late = queryset.filter(status='LATE').count()
-        total_absent = total_employees - (total_present + total_late)
-
-        departments = Department.objects.all()
-        department_stats = DepartmentAttendanceAnalyticsSerializer(
-            departments,
-            many=True,
-            context={'date': date}
-        ).data
-
-        attendance_details = AttendanceAnalyticsReportSerializer(
-            queryset,
-            many=True
-        ).data
+        def compute():
+            queryset = Attendance.objects.filter(date=date).select_related('employee__user', 'employee__department')
+
+            if department_id:
+                queryset = queryset.filter(employee__department_id=department_id)
+            if status_filter:
+                queryset = queryset.filter(status=status_filter)
+            if search:
+                queryset = queryset.filter(
+                    Q(employee__user__first_name__icontains=search) |
+                    Q(employee__user__last_name__icontains=search) |
+                    Q(employee__employee_id__icontains=search)
+                )
+
+            summaries = rollup.summaries(date, date)
+            total_employees = rollup.totals(summaries)['headcount']
+            if status_filter or search:
+                total_present = queryset.filter(status='PRESENT').count()
+                total_late = queryset.filter(status='LATE').count()
+            else:
+                if department_id:
+                    summaries = summaries.filter(department_id=department_id)
+                totals = rollup.totals(summaries)
+                total_present = totals['present']
+                total_late = totals['late']
+            total_absent = total_employees - (total_present + total_late)
+
+            departments = Department.objects.all()
+            department_stats = DepartmentAttendanceAnalyticsSerializer(
+                departments,
+                many=True,
+                context={'date': date, 'department_stats': DepartmentStatsProvider(date)}
+            ).data
+
+            attendance_details = AttendanceAnalyticsReportSerializer(
+                queryset,
+                many=True
+            ).data
+
+            return {
+                'date': date,
+                'summary': {
+                    'total_employees': total_employees,
+                    'present': total_present,
+                    'late': total_late,
+                    'absent': total_absent,
+                    'attendance_rate': round(((total_present + total_late) / total_employees * 100), 1) if total_employees else 0
+                },
+                'department_breakdown': department_stats,
+                'attendance_details': attendance_details
+            }
 
-        return Response({
-            'date': date,
-            'summary': {
-                'total_employees': total_employees,
-                'present': total_present,
-                'late': total_late,
-                'absent': total_absent,
-                'attendance_rate': round(((total_present + total_late) / total_employees * 100), 1)
-            },
-            'department_breakdown': department_stats,
-            'attendance_details': attendance_details
-        })
+        return Response(report_cache.get_or_compute(
+            'daily-analytics',
+            {'department': department_id, 'status': status_filter, 'search': search},
+            date, date, compute
+        ))
 
 class MonthlyAnalyticsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        year = int(request.query_params.get('year', timezone.now().year))
-        month = int(request.query_params.get('month', timezone.now().month))
+        year = int(request.query_params.get('year', timezone.localdate().year))
+        month = int(request.query_params.get('month', timezone.localdate().month))
         department_id = request.query_params.get('department')
 
         _, last_day = calendar.monthrange(year, month)
-        departments = Department.objects.all()
-        if department_id:
-            departments = departments.filter(id=department_id)
-
-        daily_stats = []
-        for day in range(1, last_day + 1):
-            date = datetime(year, month, day).date()
-            if date <= timezone.now().date():
-                attendances = Attendance.objects.filter(date=date)
-                total_employees = Employee.objects.filter(
-                    status='ACTIVE',
-                    date_joined__lte=date
-                ).count()
-
-                if total_employees > 0:
-                    present = attendances.filter(status='PRESENT').count()
-                    late = attendances.filter(status='LATE').count()
-                    absent = total_employees - (present + late)
-
-                    department_breakdown = DepartmentAttendanceAnalyticsSerializer(
-                        departments,
-                        many=True,
-                        context={'date': date}
-                    ).data
-
-                    daily_stats.append({
-                        'date': date,
-                        'total_present': present,
-                        'total_late': late,
-                        'total_absent': absent,
-                        'attendance_rate': round(((present + late) / total_employees * 100), 1),
-                        'department_breakdown': department_breakdown
-                    })
+        return Response(report_cache.get_or_compute(
+            'monthly-analytics', {'department': department_id},
+            datetime(year, month, 1).date(), datetime(year, month, last_day).date(),
+            lambda: analytics.monthly(year, month, department_id)
+        ))
+
+class AttendanceTrendsAnalyticsView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        employee_stats = EmployeeAttendanceAnalyticsSerializer(
-            Employee.objects.filter(status='ACTIVE'),
-            many=True,
-            context={'year': year, 'month': month}
-        ).data
+    max_days = analytics.TRENDS_MAX_DAYS
 
-        sorted_employees = sorted(
-            employee_stats,
-            key=lambda x: x['attendance_stats']['attendance_rate'],
-            reverse=True
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response(
+                {'error': 'days doit être un entier'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < days <= self.max_days:
+            return Response(
+                {'error': f'days doit être compris entre 1 et {self.max_days}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(analytics.trends(days))
+
+
+def _report_job_data(job):
+    data = {key: value for key, value in job.items() if key != 'dedupe_key'}
+    if job['status'] == report_jobs.DONE:
+        data['result'] = report_jobs.result(job)
+    return data
+
+
+class ReportJobCreateView(APIView):
+    """Lance un rapport long (monthly, trends, yearly) calculé par Celery"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            job, created = report_jobs.submit(
+                request.data.get('kind'),
+                request.data.get('params') or {},
+                run_report_job.delay
+            )
+        except ReportJobError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            _report_job_data(job),
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
         )
 
+
+class ReportJobDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = report_jobs.get(job_id)
+        if job is None:
+            return Response({'error': 'Job introuvable ou expiré'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(_report_job_data(job))
+
+
+class OccupancyView(APIView):
+    """Présents sur site (check-in sans check-out) par département, depuis l'index Redis"""
+    authentication_classes = [JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        counts = occupancy.counts()
+        names = live_counters.department_names()
         return Response({
-            'year': year,
-            'month': month,
-            'daily_stats': daily_stats,
-            'best_attendance': sorted_employees[:5],
-            'worst_attendance': sorted_employees[-5:] if len(sorted_employees) > 5 else []
+            'date': timezone.localdate(),
+            'total': sum(counts.values()),
+            'departments': [
+                {'department_id': department_id, 'department': names.get(department_id, ''), 'count': count}
+                for department_id, count in sorted(counts.items(), key=lambda item: -item[1])
+            ]
         })
 
-class AttendanceTrendsAnalyticsView(APIView):
+
+class RollCallView(APIView):
+    """Liste d'appel d'évacuation : présents sur site, filtrables par département"""
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        days = int(request.query_params.get('days', 30))
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=days)
-        
-        trends_data = []
-        current_date = start_date
-
-        while current_date <= end_date:
-            attendances = Attendance.objects.filter(date=current_date)
-            total_employees = Employee.objects.filter(
-                status='ACTIVE',
-                date_joined__lte=current_date
-            ).count()
-
-            if total_employees > 0:
-                present = attendances.filter(status='PRESENT').count()
-                late = attendances.filter(status='LATE').count()
-                absent = total_employees - (present + late)
-
-                trends_data.append({
-                    'date': current_date,
-                    'attendance_rate': round(((present + late) / total_employees * 100), 1),
-                    'present': present,
-                    'late': late,
-                    'absent': absent
-                })
-
-            current_date += timedelta(days=1)
-
-        department_trends = []
-        for department in Department.objects.all():
-            dept_attendances = Attendance.objects.filter(
-                date__range=[start_date, end_date],
-                employee__department=department
-            )
-            total_possible = Employee.objects.filter(
-                department=department,
-                status='ACTIVE'
-            ).count() * days
-
-            if total_possible > 0:
-                present_late = dept_attendances.filter(
-                    status__in=['PRESENT', 'LATE']
-                ).count()
-                
-                department_trends.append({
-                    'department': department.name,
-                    'average_attendance': round((present_late / total_possible * 100), 1)
-                })
-
-        return Response({
-            'period': {
-                'start_date': start_date,
-                'end_date': end_date,
-                'days': days
-            },
-            'daily_trends': trends_data,
-            'department_trends': sorted(
-                department_trends,
-                key=lambda x: x['average_attendance'],
-                reverse=True
-            )
-        })
\ No newline at end of file
+        department_id = request.query_params.get('department_id')
+        if department_id is not None:
+            try:
+                department_id = int(department_id)
+            except ValueError:
+                return Response({'error': 'department_id invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        people = occupancy.roll_call(department_id)
+        return Response({'date': timezone.localdate(), 'count': len(people), 'results': people})
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importé après le chargement de Django (réglages, applications)
+from attendance import live_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Flux SSE des tableaux de bord servi hors de Django, le reste par Django"""
+    if scope['type'] == 'http' and scope['path'] == live_stream.STREAM_PATH:
+        return await live_stream.stream(scope, receive, send)
+    return await django_application(scope, receive, send)
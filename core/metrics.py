@@ -0,0 +1,52 @@
+# core/metrics.py
+"""
+Compteurs applicatifs partagés entre workers (stockés dans le cache Redis).
+Chaque module déclare ses compteurs avec register() et ses jauges (valeurs
+calculées à la lecture) avec register_gauge() ; ils sont exposés par
+l'endpoint api/metrics/.
+"""
+from django.core.cache import cache
+
+KEY_PREFIX = 'metrics:'
+
+COUNTERS = []
+# Taux calculés à la lecture : {nom: (succès, échecs)}
+RATIOS = {}
+# Jauges : {nom: fonction sans argument}
+GAUGES = {}
+
+
+def register(*names):
+    for name in names:
+        if name not in COUNTERS:
+            COUNTERS.append(name)
+
+
+def register_ratio(name, hits, misses):
+    register(hits, misses)
+    RATIOS[name] = (hits, misses)
+
+
+def register_gauge(name, read):
+    GAUGES[name] = read
+
+
+def incr(name, amount=1):
+    key = KEY_PREFIX + name
+    if not cache.add(key, amount, timeout=None):
+        cache.incr(key, amount)
+
+
+def read(*names):
+    ratios = not names
+    names = names or [*COUNTERS, *GAUGES]
+    values = cache.get_many([KEY_PREFIX + name for name in names if name not in GAUGES])
+    counters = {
+        name: GAUGES[name]() if name in GAUGES else values.get(KEY_PREFIX + name, 0)
+        for name in names
+    }
+    if ratios:
+        for name, (hits, misses) in RATIOS.items():
+            total = counters[hits] + counters[misses]
+            counters[name] = round(counters[hits] / total, 4) if total else 0
+    return counters
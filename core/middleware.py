@@ -0,0 +1,111 @@
+# core/middleware.py
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+from core import metrics
+from core.queries import QueryCounter
+
+logger = logging.getLogger(__name__)
+
+metrics.register('idempotency.hit', 'idempotency.miss', 'idempotency.conflict')
+metrics.register('query_budget.exceeded')
+
+
+class QueryBudgetMiddleware:
+    """
+    Compte les requêtes SQL et le temps base de chaque requête HTTP. Avec
+    QUERY_BUDGET_HEADERS, les expose dans X-DB-Queries et Server-Timing ;
+    au-delà de QUERY_BUDGET requêtes, journalise l'endpoint. Le corps d'une
+    réponse en flux est produit après le comptage.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+
+        if settings.QUERY_BUDGET_HEADERS:
+            response['X-DB-Queries'] = str(counter.count)
+            timing = f'db;dur={counter.duration * 1000:.1f};desc="{counter.count} queries"'
+            if response.has_header('Server-Timing'):
+                timing = f"{response['Server-Timing']}, {timing}"
+            response['Server-Timing'] = timing
+
+        if settings.QUERY_BUDGET and counter.count > settings.QUERY_BUDGET:
+            metrics.incr('query_budget.exceeded')
+            match = getattr(request, 'resolver_match', None)
+            logger.warning(
+                'Budget de requêtes dépassé : %s %s (%s) %d requêtes en %.1f ms (budget %d)',
+                request.method, request.path, match.route if match else '-',
+                counter.count, counter.duration * 1000, settings.QUERY_BUDGET
+            )
+        return response
+
+
+class IdempotencyMiddleware:
+    """
+    Rejoue la première réponse d'un POST portant un en-tête Idempotency-Key.
+    Ne s'applique qu'aux vues déclarant `idempotent = True`. La clé est
+    rattachée au chemin et à l'en-tête Authorization, et la réponse est servie
+    depuis Redis sans authentification ni requête MySQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        cache_key = getattr(request, '_idempotency_cache_key', None)
+        if cache_key:
+            if response.status_code < 500:
+                cache.set(cache_key, {
+                    'fingerprint': request._idempotency_fingerprint,
+                    'status': response.status_code,
+                    'content': response.content,
+                    'content_type': response.get('Content-Type'),
+                }, settings.IDEMPOTENCY_TTL)
+            cache.delete(cache_key + ':lock')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        key = request.headers.get('Idempotency-Key')
+        view_class = getattr(view_func, 'view_class', None)
+        if request.method != 'POST' or not key or not getattr(view_class, 'idempotent', False):
+            return None
+
+        scope = '\0'.join([request.path, request.headers.get('Authorization', ''), key])
+        cache_key = 'idempotency:' + hashlib.sha256(scope.encode()).hexdigest()
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        stored = cache.get(cache_key)
+        if stored is not None:
+            if stored['fingerprint'] != fingerprint:
+                return JsonResponse(
+                    {'error': 'Idempotency-Key already used with a different payload'},
+                    status=422
+                )
+            metrics.incr('idempotency.hit')
+            response = HttpResponse(
+                stored['content'],
+                status=stored['status'],
+                content_type=stored['content_type']
+            )
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        # Verrou court : une seule exécution concurrente par clé
+        if not cache.add(cache_key + ':lock', 1, timeout=30):
+            metrics.incr('idempotency.conflict')
+            return JsonResponse({'error': 'Request already in progress'}, status=409)
+
+        metrics.incr('idempotency.miss')
+        request._idempotency_cache_key = cache_key
+        request._idempotency_fingerprint = fingerprint
+        return None
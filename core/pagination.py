@@ -0,0 +1,132 @@
+# core/pagination.py
+"""
+Pagination par curseur sur clé composée (keyset).
+
+La page suivante reprend après la dernière ligne lue par un filtre
+(date, id) < (d, i) au lieu d'un OFFSET : le coût d'une page reste constant
+quelle que soit la profondeur. Les champs du tri doivent être non nuls, se
+terminer par l'id et être couverts par un index composé dans le même ordre.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    ordering = ('-id',)
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Curseur invalide'
+
+    def get_ordering(self, view):
+        """Tri de la vue (get_keyset_ordering) ou tri par défaut de la pagination"""
+        get_ordering = getattr(view, 'get_keyset_ordering', None)
+        return tuple(get_ordering()) if get_ordering else self.ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request, model):
+        """
+        Position du curseur, chaque valeur convertie au type de son champ de
+        tri (NotFound si le curseur est altéré)
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return [self.parse_value(model, field, value) for field, value in zip(self.ordering, position)]
+
+    def parse_value(self, model, field, value):
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise NotFound(self.invalid_cursor_message)
+        *path, name = field.lstrip('-').split('__')
+        for part in path:
+            model = model._meta.get_field(part).related_model
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item):
+        position = []
+        for field in self.ordering:
+            value = item
+            for part in field.lstrip('-').split('__'):
+                value = getattr(value, part)
+            position.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def after(self, position):
+        """Lignes strictement après position dans l'ordre du tri"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        # Une ligne de plus indique s'il existe une page suivante
+        items = list(queryset[:size + 1])
+        self.next_cursor = self.encode_cursor(items[size - 1]) if len(items) > size else None
+        return items[:size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class DateKeysetPagination(KeysetPagination):
+    """Historiques datés, du plus récent au plus ancien"""
+    ordering = ('-date', '-id')
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    """Listes par date de création, de la plus récente à la plus ancienne"""
+    ordering = ('-created_at', '-id')
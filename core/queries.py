@@ -0,0 +1,42 @@
+# core/queries.py
+"""
+Comptage des requêtes SQL et du temps passé en base, sur toutes les
+connexions, sans dépendre de DEBUG (execute_wrapper). Utilisé par
+QueryBudgetMiddleware et par les tests de nombre de requêtes.
+
+Seules les max_statements premières requêtes sont conservées (aucune par
+défaut) : le middleware ne garde qu'un compteur, quelle que soit la taille
+de la requête HTTP.
+"""
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+
+class QueryCounter:
+    def __init__(self, max_statements=0):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.max_statements = max_statements
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+            if len(self.statements) < self.max_statements:
+                self.statements.append(sql)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta
+from celery.schedules import crontab
 from pathlib import Path
 from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -54,6 +56,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     'django.middleware.locale.LocaleMiddleware',
+    'core.middleware.IdempotencyMiddleware',
 ]
 
 # URLs and templates
@@ -182,6 +185,89 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'purge-qr-codes': {
+        'task': 'attendance.tasks.purge_qr_codes',
+        'schedule': int(os.environ.get('QR_PURGE_INTERVAL', 3600)),
+    },
+    'purge-report-files': {
+        'task': 'attendance.tasks.purge_report_files',
+        'schedule': 3600,
+    },
+    'reconcile-live-counters': {
+        'task': 'attendance.tasks.reconcile_live_counters',
+        'schedule': int(os.environ.get('LIVE_COUNTERS_RECONCILE_INTERVAL', 900)),
+    },
+    'refresh-dashboard-alerts': {
+        'task': 'leave.tasks.refresh_dashboard_alerts',
+        'schedule': int(os.environ.get('ALERTS_REFRESH_INTERVAL', 60)),
+    },
+    'materialize-absences': {
+        'task': 'attendance.tasks.materialize_absences',
+        'schedule': crontab(hour=int(os.environ.get('ABSENCE_MATERIALIZE_HOUR', 1)), minute=30),
+    },
+    'reconcile-occupancy': {
+        'task': 'attendance.tasks.reconcile_occupancy',
+        # Heures ouvrées : l'écart de la journée est corrigé pendant qu'on lit l'index
+        'schedule': crontab(
+            minute=os.environ.get('OCCUPANCY_RECONCILE_MINUTE', '*/30'),
+            hour=os.environ.get('OCCUPANCY_RECONCILE_HOURS', '6-21'),
+        ),
+    },
+}
+
+# QR codes temporaires : RedisQRTokenStore, SignedQRTokenStore (sans stockage)
+# ou DatabaseQRTokenStore (table TemporaryQRCode)
+QR_TOKEN_BACKEND = os.environ.get(
+    'QR_TOKEN_BACKEND',
+    'attendance.qr_store.RedisQRTokenStore'
+)
+
+# Purge des QR codes expirés (table TemporaryQRCode)
+QR_PURGE_CHUNK_SIZE = int(os.environ.get('QR_PURGE_CHUNK_SIZE', 5000))
+QR_PURGE_SLEEP = float(os.environ.get('QR_PURGE_SLEEP', 0.1))
+QR_PURGE_RETENTION = int(os.environ.get('QR_PURGE_RETENTION', 3600))
+QR_PURGE_MAX_SECONDS = float(os.environ.get('QR_PURGE_MAX_SECONDS', 600))
+
+# Identification faciale (index des empreintes mappé en mémoire)
+FACE_INDEX_DIR = os.environ.get('FACE_INDEX_DIR', str(BASE_DIR / 'face_index'))
+FACE_EMBEDDING_DIM = int(os.environ.get('FACE_EMBEDDING_DIM', 128))
+FACE_INDEX_DTYPE = os.environ.get('FACE_INDEX_DTYPE', 'float32')
+FACE_MATCH_THRESHOLD = float(os.environ.get('FACE_MATCH_THRESHOLD', 0.6))
+
+# Idempotency-Key : durée de conservation des réponses (en secondes)
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))
+
+# Budget de requêtes SQL par requête HTTP (0 : désactivé) et en-têtes
+# X-DB-Queries / Server-Timing (par défaut en mode debug)
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 30))
+QUERY_BUDGET_HEADERS = os.environ.get('QUERY_BUDGET_HEADERS', str(DEBUG)) == 'True'
+
+# Cache des rapports sur jours passés (en secondes)
+REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 30 * 24 * 3600))
+
+# Rapports asynchrones : conservation des jobs et résultats (en secondes),
+# taille compressée au-delà de laquelle le résultat est écrit dans MEDIA_ROOT
+REPORT_JOB_TTL = int(os.environ.get('REPORT_JOB_TTL', 24 * 3600))
+REPORT_JOB_INLINE_MAX_BYTES = int(os.environ.get('REPORT_JOB_INLINE_MAX_BYTES', 512 * 1024))
+
+# Durée de l'instantané en mémoire de l'index de présence sur site (en secondes)
+OCCUPANCY_SNAPSHOT_TTL = float(os.environ.get('OCCUPANCY_SNAPSHOT_TTL', 2))
+# Heure jusqu'à laquelle les présents de la veille sans check-out restent sur site
+OCCUPANCY_CARRY_OVER_HOUR = int(os.environ.get('OCCUPANCY_CARRY_OVER_HOUR', 12))
+
+# Validité d'un ticket d'ouverture du flux live (en secondes, usage unique)
+STREAM_TICKET_TTL = int(os.environ.get('STREAM_TICKET_TTL', 30))
+
+# Seuils d'alerte par défaut des départements : taux de retards (%) et
+# nombre d'absences au-delà desquels une alerte est levée
+ALERT_LATE_RATE = int(os.environ.get('ALERT_LATE_RATE', 0))
+ALERT_ABSENCES = int(os.environ.get('ALERT_ABSENCES', 0))
+# Durée de vie de la liste d'alertes précalculée (en secondes)
+ALERTS_CACHE_TTL = int(os.environ.get('ALERTS_CACHE_TTL', 300))
+
+# Absences matérialisées chaque nuit : jours révolus repris (nuits manquées)
+ABSENCE_LOOKBACK_DAYS = int(os.environ.get('ABSENCE_LOOKBACK_DAYS', 3))
 
 # Caching
 CACHES = {
@@ -0,0 +1,52 @@
+# core/settings_test.py
+"""
+Réglages des tests : SQLite en mémoire et cache local, sans MySQL, Redis
+ni fichier .env.
+
+    python manage.py test --settings=core.settings_test
+"""
+import os
+
+for name, value in {
+    'SECRET_KEY': 'test',
+    'ALLOWED_HOSTS': '*',
+    'MYSQL_URL': 'sqlite://:memory:',
+    'TIME_ZONE': 'UTC',
+    'STATIC_URL': '/static/',
+    'STATICFILES_DIR': 'static',
+    'STATIC_ROOT': 'staticfiles',
+    'MEDIA_URL': '/media/',
+    'MEDIA_ROOT': 'media',
+    'JWT_ACCESS_TOKEN_LIFETIME': '300',
+    'JWT_REFRESH_TOKEN_LIFETIME': '3600',
+    'JWT_SECRET_KEY': 'test',
+    'CORS_ALLOWED_ORIGINS': 'http://localhost',
+    'CORS_ALLOW_CREDENTIALS': 'True',
+    'CORS_ALLOW_ALL_ORIGINS': 'False',
+    'CSRF_TRUSTED_ORIGINS': 'http://localhost',
+    'CORS_ALLOW_HEADERS': 'authorization',
+    'EMAIL_HOST': 'localhost',
+    'EMAIL_PORT': '25',
+    'EMAIL_HOST_USER': '',
+    'EMAIL_HOST_PASSWORD': '',
+    'EMAIL_USE_TLS': 'False',
+    'REDIS_URL': 'redis://localhost:6379/0',
+    'CELERY_BROKER_URL': 'memory://',
+    'CELERY_RESULT_BACKEND': 'cache+memory://',
+}.items():
+    os.environ.setdefault(name, value)
+
+from core.settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,30 @@
+# core/testing.py
+"""Outils de test : nombre de requêtes SQL d'un appel et stabilité quand les données grossissent"""
+from core.queries import QueryCounter
+
+# Requêtes affichées dans le message d'échec
+MAX_STATEMENTS = 100
+
+
+class QueryCountMixin:
+    def count_queries(self, func):
+        with QueryCounter(max_statements=MAX_STATEMENTS) as counter:
+            func()
+        return counter
+
+    def assertConstantQueries(self, func, grow):
+        """
+        func() exécute le même nombre de requêtes avant et après grow().
+        Chaque mesure suit un premier appel qui remplit les caches.
+        """
+        func()
+        before = self.count_queries(func)
+        grow()
+        func()
+        after = self.count_queries(func)
+        if after.count != before.count:
+            self.fail(
+                f'{before.count} requêtes avant, {after.count} après :\n'
+                + '\n'.join(after.statements)
+            )
+        return after.count
@@ -0,0 +1,99 @@
+from datetime import time, timedelta
+from itertools import count
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Department, Schedule
+from attendance.models import Attendance
+from attendance.tests import CacheTestCase, make_employee
+from core.queries import QueryCounter
+from core.testing import QueryCountMixin
+from leave.models import Leave, LeaveBalance
+
+# Endpoints de lecture dont le nombre de requêtes ne doit pas dépendre de l'effectif
+ENDPOINTS = (
+    '/api/employees/',
+    '/api/employee-management/',
+    '/api/departments/',
+    '/api/department-management/',
+    '/api/attendance/history/',
+    '/api/attendance/stats/',
+    '/api/attendance/daily-report/',
+    '/api/attendance/monthly-report/',
+    '/api/analytics/daily/',
+    '/api/analytics/monthly/',
+    '/api/analytics/trends/?days=7',
+    '/api/leaves/',
+    '/api/dashboard/stats/',
+    '/api/dashboard/weekly-attendance/',
+    '/api/dashboard/alerts/',
+    '/api/sync/changes/',
+)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryCountTests(QueryCountMixin, CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sequence = count()
+        admin = make_employee('admin')
+        admin.user.is_staff = True
+        admin.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(admin.user)
+        self.seed(3)
+
+    def seed(self, n):
+        """n employés répartis sur de nouveaux départements, avec présences, congés et planning"""
+        today = timezone.localdate()
+        now = timezone.now()
+        department = None
+        for i in range(n):
+            number = next(self.sequence)
+            if department is None or i % 2:
+                department = Department.objects.create(name=f'Service {number}')
+            employee = make_employee(f'seed{number}', department=department)
+            Schedule.objects.create(
+                employee=employee, day_of_week=today.weekday(), start_time=time(8), end_time=time(17)
+            )
+            for day, status in ((today, 'LATE' if i % 2 else 'PRESENT'), (today - timedelta(days=1), 'PRESENT')):
+                Attendance.objects.create(
+                    employee=employee, date=day, attendance_type='NFC', status=status,
+                    check_in=now, check_out=now + timedelta(hours=8)
+                )
+            Leave.objects.create(
+                employee=employee, leave_type='ANNUAL', reason='Congé', status='APPROVED',
+                start_date=today + timedelta(days=7), end_date=today + timedelta(days=8)
+            )
+            LeaveBalance.objects.create(employee=employee, leave_type='ANNUAL', year=today.year, total_days=20)
+
+    def test_query_count_does_not_grow_with_employees(self):
+        for url in ENDPOINTS:
+            with self.subTest(url=url):
+                def get():
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                self.assertConstantQueries(get, lambda: self.seed(4))
+
+    @override_settings(QUERY_BUDGET_HEADERS=True, QUERY_BUDGET=1)
+    def test_budget_headers_and_log(self):
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            response = self.client.get('/api/analytics/daily/')
+        self.assertGreater(int(response['X-DB-Queries']), 1)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('/api/analytics/daily/', logs.output[0])
+
+        with self.assertNoLogs('core.middleware', 'WARNING'):
+            response = self.client.get('/api/attendance/history/')
+        self.assertEqual(response['X-DB-Queries'], '1')
+
+    def test_counter_keeps_only_the_first_statements(self):
+        with QueryCounter() as counter:
+            list(Department.objects.all())
+        self.assertEqual((counter.count, counter.statements), (1, []))
+
+        with QueryCounter(max_statements=2) as counter:
+            for _ in range(3):
+                list(Department.objects.all())
+        self.assertEqual((counter.count, len(counter.statements)), (3, 2))
@@ -17,10 +17,12 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from core.views import MetricsView
 
 urlpatterns = [
    path('admin/', admin.site.urls),
    path('api/', include('accounts.urls')),
    path('api/', include('attendance.urls')),
    path('api/', include('leave.urls')),
+   path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,99 @@
+# leave/alerts.py
+"""
+Alertes du tableau de bord par département, selon les seuils de chaque
+département (Department.late_rate_alert / absence_alert, à défaut
+ALERT_LATE_RATE et ALERT_ABSENCES).
+
+Les compteurs du jour viennent des compteurs live (Redis, ou une lecture
+groupée des agrégats) et les seuils d'une seule requête sur Department.
+La tâche refresh_dashboard_alerts recalcule la liste périodiquement et la
+met en cache ; les vues ne font que la relire.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from accounts.models import Department
+from attendance import live_counters
+
+CACHE_KEY = 'dashboard:alerts'
+
+
+def _late(counters, late_rate, absences):
+    headcount = counters.get('headcount', 0)
+    count = counters.get('late', 0)
+    rate = count / headcount * 100 if headcount > 0 else 0
+    if count and rate > late_rate:
+        return count, f'{count} retards signalés ({rate:.0f} %, seuil {late_rate} %)'
+
+
+def _absence(counters, late_rate, absences):
+    count = counters.get('absent', 0)
+    if count > absences:
+        return count, f'{count} absences non justifiées (seuil {absences})'
+
+
+# Règles évaluées pour chaque département, dans l'ordre d'affichage
+RULES = (
+    ('absence', _absence),
+    ('late', _late),
+)
+
+
+def evaluate(departments, thresholds, now=None):
+    """
+    Alertes des compteurs du jour {département: compteurs} selon
+    thresholds {département: (nom, taux de retards, absences)}, les plus
+    nombreuses d'abord.
+    """
+    now = now or timezone.now()
+    alerts = []
+    for alert_type, rule in RULES:
+        for department_id, (name, late_rate, absences) in sorted(thresholds.items()):
+            found = rule(
+                departments.get(department_id, {}),
+                settings.ALERT_LATE_RATE if late_rate is None else late_rate,
+                settings.ALERT_ABSENCES if absences is None else absences,
+            )
+            if found:
+                count, message = found
+                alerts.append({
+                    'type': alert_type,
+                    'message': message,
+                    'department': name,
+                    'date': now,
+                    'count': count
+                })
+    alerts.sort(key=lambda alert: alert['count'], reverse=True)
+    return alerts
+
+
+def compute():
+    today = timezone.localdate()
+    days, _ = live_counters.read([today], names=False)
+    thresholds = {
+        pk: (name, late_rate, absences)
+        for pk, name, late_rate, absences in Department.objects.values_list(
+            'pk', 'name', 'late_rate_alert', 'absence_alert'
+        )
+    }
+    return evaluate(days[today], thresholds)
+
+
+def refresh():
+    """Recalcule et met en cache les alertes du jour (tâche périodique)"""
+    alerts = compute()
+    cache.set(CACHE_KEY, (timezone.localdate(), alerts), timeout=settings.ALERTS_CACHE_TTL)
+    return alerts
+
+
+def current():
+    """Alertes du jour en cache, calculées à la première lecture si besoin"""
+    cached = cache.get(CACHE_KEY)
+    if cached is not None and cached[0] == timezone.localdate():
+        return cached[1]
+    return refresh()
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
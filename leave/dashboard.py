@@ -0,0 +1,79 @@
+# leave/dashboard.py
+"""
+Tableau de bord d'administration : statistiques du jour, série de la
+semaine depuis les compteurs live (attendance.live_counters) et alertes
+précalculées (leave.alerts), sans requête MySQL quand Redis est chargé.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from attendance import live_counters, rollup
+from leave import alerts
+from leave.serializers import AlertSerializer, DashboardStatsSerializer, WeeklyAttendanceSerializer
+
+
+def _percentage(count, total):
+    return (count / total * 100) if total > 0 else 0
+
+
+def day_totals(departments):
+    totals = dict.fromkeys(rollup.FIELDS, 0)
+    for counters in departments.values():
+        for field in rollup.FIELDS:
+            totals[field] += counters.get(field, 0)
+    return totals
+
+
+def week_dates(today):
+    """Lundi à vendredi de la semaine de today"""
+    week_start = today - timedelta(days=today.weekday())
+    return [week_start + timedelta(days=i) for i in range(5)]
+
+
+def stats(totals):
+    total_employees = totals['headcount']
+    present_count = totals['present'] + totals['late']
+    late_count = totals['late']
+    absent_count = total_employees - present_count
+    on_leave_count = totals['on_leave']
+    return {
+        'total_employees': total_employees,
+        'present_today': present_count,
+        'present_percentage': _percentage(present_count, total_employees),
+        'total_late': late_count,
+        'late_percentage': _percentage(late_count, total_employees),
+        'total_absent': absent_count,
+        'absent_percentage': _percentage(absent_count, total_employees),
+        'on_leave': on_leave_count,
+        'leave_percentage': _percentage(on_leave_count, total_employees),
+    }
+
+
+def weekly(days, total_employees):
+    weekly_stats = []
+    for date, departments in sorted(days.items()):
+        totals = day_totals(departments)
+        present_count = totals['present'] + totals['late']
+        weekly_stats.append({
+            'day': date.strftime('%a'),  # Abréviation du jour
+            'present': present_count,
+            'absent': total_employees - present_count
+        })
+    return weekly_stats
+
+
+def snapshot():
+    """Statistiques du jour, série de la semaine et alertes en cache"""
+    today = timezone.localdate()
+    dates = week_dates(today)
+    days, _ = live_counters.read(sorted({today, *dates}), names=False)
+    totals = day_totals(days[today])
+    return {
+        'date': today,
+        'stats': DashboardStatsSerializer(stats(totals)).data,
+        'weekly': WeeklyAttendanceSerializer(
+            weekly({date: days[date] for date in dates}, totals['headcount']), many=True
+        ).data,
+        'alerts': AlertSerializer(alerts.current(), many=True).data,
+    }
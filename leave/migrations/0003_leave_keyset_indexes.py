@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_employee_keyset_indexes'),
+        ('leave', '0002_alter_leave_options_alter_leavebalance_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leave',
+            index=models.Index(fields=['created_at', 'id'], name='leave_leave_created_cdfb16_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leave',
+            index=models.Index(fields=['employee', 'created_at', 'id'], name='leave_leave_employe_dc1caa_idx'),
+        ),
+    ]
@@ -62,6 +62,9 @@ class Leave(models.Model):
         indexes = [
             models.Index(fields=['employee', 'status', 'start_date']),
             models.Index(fields=['leave_type', 'status']),
+            # Pagination par curseur (core.pagination)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['employee', 'created_at', 'id']),
         ]
 
     def __str__(self):
@@ -0,0 +1,9 @@
+# leave/tasks.py
+from celery import shared_task
+
+from leave import alerts
+
+
+@shared_task
+def refresh_dashboard_alerts():
+    return len(alerts.refresh())
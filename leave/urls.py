@@ -7,7 +7,9 @@ from .views import (
     LeaveRejectView,
     LeaveBalanceView,LeaveCreateView,   DashboardStatsView,
     WeeklyAttendanceStatsView,
-    RecentAlertsView
+    RecentAlertsView,
+    DashboardSnapshotView,
+    DashboardStreamTicketView
 )
 
 urlpatterns = [
@@ -20,4 +22,6 @@ urlpatterns = [
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
     path('dashboard/weekly-attendance/', WeeklyAttendanceStatsView.as_view(), name='weekly-attendance'),
     path('dashboard/alerts/', RecentAlertsView.as_view(), name='recent-alerts'),
+    path('dashboard/snapshot/', DashboardSnapshotView.as_view(), name='dashboard-snapshot'),
+    path('dashboard/stream/ticket/', DashboardStreamTicketView.as_view(), name='dashboard-stream-ticket'),
 ]
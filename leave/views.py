@@ -1,16 +1,18 @@
 # leaves/views.py
-from datetime import datetime, timedelta
+from datetime import datetime
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from .models import Leave, LeaveBalance
-from attendance.models import Attendance
-from django.db.models import Count, Q
-from accounts.models import Employee, Department
+from attendance import live_counters, live_stream
+from leave import alerts, dashboard
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
 from .serializers import LeaveSerializer, LeaveBalanceSerializer,DashboardStatsSerializer, WeeklyAttendanceSerializer, AlertSerializer
+from django.conf import settings
 from django.utils import timezone
+from core.pagination import CreatedAtKeysetPagination
 
 
 class LeaveCreateView(APIView):
@@ -82,11 +84,13 @@ class LeaveListCreateView(APIView):
 
     def get(self, request):
         employee_id = request.query_params.get('employee_id')
-        queryset = Leave.objects.all()
+        queryset = Leave.objects.select_related('employee__user')
         if employee_id:
             queryset = queryset.filter(employee_id=employee_id)
-        serializer = LeaveSerializer(queryset, many=True)
-        return Response(serializer.data)
+        paginator = CreatedAtKeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = LeaveSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         serializer = LeaveSerializer(data=request.data)
@@ -162,7 +166,7 @@ class LeaveBalanceView(APIView):
     def get(self, request, employee_id):
         balances = LeaveBalance.objects.filter(
             employee_id=employee_id,
-            year=timezone.now().year
+            year=timezone.localdate().year
         )
         serializer = LeaveBalanceSerializer(balances, many=True)
         return Response(serializer.data)
@@ -172,66 +176,21 @@ class DashboardStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        today = timezone.now().date()
-        
-        # Récupérer les statistiques de base
-        total_employees = Employee.objects.filter(status='ACTIVE').count()
-        
-        # Présences du jour
-        today_attendance = Attendance.objects.filter(date=today)
-        present_count = today_attendance.filter(
-            Q(status='PRESENT') | Q(status='LATE')
-        ).count()
-        
-        late_count = today_attendance.filter(status='LATE').count()
-        absent_count = total_employees - present_count
-        
-        # Employés en congé
-        on_leave_count = Leave.objects.filter(
-            start_date__lte=today,
-            end_date__gte=today,
-            status='APPROVED'
-        ).count()
-
-        # Calculer les pourcentages
-        stats = {
-            'total_employees': total_employees,
-            'present_today': present_count,
-            'present_percentage': (present_count / total_employees * 100) if total_employees > 0 else 0,
-            'total_late': late_count,
-            'late_percentage': (late_count / total_employees * 100) if total_employees > 0 else 0,
-            'total_absent': absent_count,
-            'absent_percentage': (absent_count / total_employees * 100) if total_employees > 0 else 0,
-            'on_leave': on_leave_count,
-            'leave_percentage': (on_leave_count / total_employees * 100) if total_employees > 0 else 0,
-        }
-
-        serializer = DashboardStatsSerializer(stats)
+        today = timezone.localdate()
+        days, _ = live_counters.read([today], names=False)
+        serializer = DashboardStatsSerializer(dashboard.stats(dashboard.day_totals(days[today])))
         return Response(serializer.data)
 
 class WeeklyAttendanceStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        today = timezone.now().date()
-        week_start = today - timedelta(days=today.weekday())
-        dates = [week_start + timedelta(days=i) for i in range(5)]  # Lundi à Vendredi
-
-        weekly_stats = []
-        for date in dates:
-            total_employees = Employee.objects.filter(status='ACTIVE').count()
-            day_attendance = Attendance.objects.filter(date=date)
-            present_count = day_attendance.filter(
-                Q(status='PRESENT') | Q(status='LATE')
-            ).count()
-            absent_count = total_employees - present_count
-
-            weekly_stats.append({
-                'day': date.strftime('%a'),  # Abréviation du jour
-                'present': present_count,
-                'absent': absent_count
-            })
+        today = timezone.localdate()
+        dates = dashboard.week_dates(today)  # Lundi à Vendredi
+        days, _ = live_counters.read(sorted({today, *dates}), names=False)
+        total_employees = dashboard.day_totals(days[today])['headcount']
 
+        weekly_stats = dashboard.weekly({date: days[date] for date in dates}, total_employees)
         serializer = WeeklyAttendanceSerializer(weekly_stats, many=True)
         return Response(serializer.data)
 
@@ -239,47 +198,32 @@ class RecentAlertsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        today = timezone.now().date()
-        
-        # Alertes pour les absences
-        absence_alerts = []
-        departments = Department.objects.all()
-        for dept in departments:
-            absent_count = Attendance.objects.filter(
-                employee__department=dept,
-                date=today,
-                status='ABSENT'
-            ).count()
-            
-            if absent_count > 0:
-                absence_alerts.append({
-                    'type': 'absence',
-                    'message': f'{absent_count} absences non justifiées',
-                    'department': dept.name,
-                    'date': timezone.now(),
-                    'count': absent_count
-                })
-
-        # Alertes pour les retards
-        late_alerts = []
-        for dept in departments:
-            late_count = Attendance.objects.filter(
-                employee__department=dept,
-                date=today,
-                status='LATE'
-            ).count()
-            
-            if late_count > 0:
-                late_alerts.append({
-                    'type': 'late',
-                    'message': f'{late_count} retards signalés',
-                    'department': dept.name,
-                    'date': timezone.now(),
-                    'count': late_count
-                })
-
-        all_alerts = absence_alerts + late_alerts
-        all_alerts.sort(key=lambda x: x['count'], reverse=True)
-        
-        serializer = AlertSerializer(all_alerts, many=True)
+        # Liste précalculée par la tâche refresh_dashboard_alerts
+        serializer = AlertSerializer(alerts.current(), many=True)
         return Response(serializer.data)
+
+
+class DashboardSnapshotView(APIView):
+    """
+    Statistiques, série hebdomadaire et alertes en une réponse, lues dans
+    Redis. L'utilisateur est pris dans le jeton JWT, sans requête MySQL.
+    """
+    authentication_classes = [JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(dashboard.snapshot())
+
+class DashboardStreamTicketView(APIView):
+    """
+    Ticket à usage unique pour ouvrir le flux live (EventSource, sans
+    en-tête Authorization) : GET /api/dashboard/stream/?ticket=<ticket>.
+    """
+    authentication_classes = [JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response({
+            'ticket': live_stream.issue_ticket(request.user.id),
+            'expires_in': settings.STREAM_TICKET_TTL
+        })